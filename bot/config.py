@@ -34,3 +34,31 @@ MONEY_ID = int(os.getenv("MONEY_ID"))
 if not MONEY_ID:
     raise RuntimeError("MONEY_ID .env faylda topilmadi!")
 
+
+# ==============================
+# Essay pipeline
+# ==============================
+
+# AI natija adminga qabul qilingandan keyin qancha vaqtda ko‘rsatiladi (sekund).
+# Tekshiruv darhol boshlanadi, kechikish faqat yetkazishga qo‘llanadi.
+ESSAY_REVEAL_DELAY_SECONDS = int(os.getenv("ESSAY_REVEAL_DELAY_SECONDS", "30"))
+
+# 1 — AI natija adminga hosil bo‘layotgan paytda (bo‘laklab, xabarni tahrirlab) yuboriladi.
+# Reveal delay saqlanadi: ko‘rsatish reveal_at dan boshlanadi, keyin jonli davom etadi.
+ESSAY_STREAM_TO_ADMIN = os.getenv("ESSAY_STREAM_TO_ADMIN", "0").strip().lower() in ("1", "true", "yes")
+# Stream paytida admin xabarlari necha sekundda bir yangilanadi
+ESSAY_STREAM_INTERVAL_SECONDS = float(os.getenv("ESSAY_STREAM_INTERVAL_SECONDS", "3"))
+
+# 0 — esselarni alohida processlar tekshiradi (python -m bot.worker),
+# bot.main faqat update'larni qabul qilib navbatga yozadi
+ESSAY_WORKERS_IN_PROCESS = os.getenv("ESSAY_WORKERS_IN_PROCESS", "1").strip().lower() not in ("0", "false", "no")
+
+
+# ==============================
+# Ingress
+# ==============================
+
+# "polling" — dp.start_polling; "webhook" — aiohttp server (bot/webhook.py)
+BOT_MODE = os.getenv("BOT_MODE", "polling").strip().lower()
+if BOT_MODE not in ("polling", "webhook"):
+    raise RuntimeError("BOT_MODE faqat 'polling' yoki 'webhook' bo‘lishi mumkin!")
@@ -65,7 +65,13 @@ async def _handle_payment_decision(callback: CallbackQuery, *, approved: bool):
 
     if approved:
         # 💳 Balance update
-        await add_balance(user_id, amount)
+        await add_balance(
+            user_id,
+            amount,
+            idempotency_key=f"payment:{payment_id}",
+            reason="payment",
+            ref=payment_id,
+        )
 
         await _safe_edit_caption(callback, "✅ To‘lov tasdiqlandi.")
 
@@ -0,0 +1,61 @@
+# bot/handlers/admin_grading.py
+
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+
+from bot.config import ADMIN_ID
+from bot.services.batch_grading import (
+    BATCH_MAX_WAIT_SECONDS,
+    BATCH_MIN_ESSAYS,
+    GRADING_MODES,
+    batch_stats,
+    get_grading_mode,
+    set_grading_mode,
+)
+
+router = Router()
+
+
+def _is_essay_admin(message: Message) -> bool:
+    return bool(message.from_user and message.from_user.id == ADMIN_ID)
+
+
+# =========================
+# /grading_mode [realtime|batch]
+# =========================
+
+@router.message(Command("grading_mode"))
+async def grading_mode_handler(message: Message, command: CommandObject):
+    if not _is_essay_admin(message):
+        return
+
+    arg = (command.args or "").strip().lower()
+
+    if arg:
+        if arg not in GRADING_MODES:
+            await message.answer("❌ Foydalanish: /grading_mode realtime | batch")
+            return
+        await set_grading_mode(arg)
+
+    mode = await get_grading_mode()
+    stats = await batch_stats()
+
+    if mode == "batch":
+        hint = (
+            "📦 Yangi esselar Batch API orqali tekshiriladi (arzonroq, 24 soatgacha).\n"
+            f"Batch {BATCH_MIN_ESSAYS} ta esse yig‘ilganda yoki eng eskisi "
+            f"{BATCH_MAX_WAIT_SECONDS // 60} daqiqa kutganda yuboriladi."
+        )
+    else:
+        hint = "⚡️ Yangi esselar darhol tekshiriladi."
+
+    await message.answer(
+        f"{'✅ O‘zgartirildi' if arg else 'ℹ️ Joriy rejim'}: {mode}\n\n"
+        f"{hint}\n\n"
+        "📦 Batch navbati:\n"
+        f"• yig‘ilmoqda: {stats['waiting']}\n"
+        f"• OpenAI'da: {stats['submitted']}\n"
+        f"• ochiq batch'lar: {stats['open_batches']}\n\n"
+        "Rejim faqat yangi esselarga ta’sir qiladi — navbatdagilar o‘z rejimida qoladi."
+    )
@@ -5,6 +5,8 @@ from aiogram.types import Message
 
 from bot.config import ADMIN_ID
 from bot.services.db import require_pool
+from bot.services.grading_cache import bypass_next
+from bot.services.reconciler import reconcile_pipeline
 from bot.services.locks import unlock
 
 router = Router()
@@ -132,7 +134,8 @@ async def cancel_voice(message: Message):
             voice_file_id = NULL,
             voice_sent_at = NULL,
             voice_sent_by = NULL,
-            voice_msg_id = NULL
+            voice_msg_id = NULL,
+            user_unlocked_at = now()
         WHERE essay_id = $1
         RETURNING user_id
         """,
@@ -143,5 +146,38 @@ async def cancel_voice(message: Message):
         await message.answer("❌ Essay topilmadi.")
         return
 
-    unlock(row["user_id"])
+    await unlock(row["user_id"])
     await message.answer(f"❌ Ovoz bekor qilindi: {essay_id}")
+
+
+# =========================
+# /nocache <user_id>
+# =========================
+
+@router.message(lambda m: m.text and m.text.startswith("/nocache "))
+async def nocache_next_essay(message: Message):
+    if not _is_essay_admin(message):
+        return
+
+    arg = message.text.split(maxsplit=1)[1].strip()
+    if not arg.isdigit():
+        await message.answer("❌ Format: /nocache <user_id>")
+        return
+
+    await bypass_next(int(arg))
+    await message.answer(
+        f"♻️ User {arg} ning keyingi essesi cache'siz (qaytadan) tekshiriladi."
+    )
+
+
+# =========================
+# /reconcile
+# =========================
+
+@router.message(lambda m: m.text == "/reconcile")
+async def reconcile_now(message: Message):
+    if not _is_essay_admin(message):
+        return
+
+    report = await reconcile_pipeline()
+    await message.answer(f"🧹 Reconcile tugadi.\n\n{report}")
@@ -0,0 +1,154 @@
+# bot/handlers/admin_stats.py
+
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+
+from bot.config import ADMIN_ID, ESSAY_WORKERS_IN_PROCESS
+from bot.middlewares.outbound import outbound_throttle
+from bot.services.duplicates import duplicate_stats
+from bot.services.essay_checker import hedge_stats
+from bot.services.fsm_storage import fsm_storage
+from bot.services.grading_calls import cost_by_day, review_stats, stage_stats
+from bot.services.grading_cache import cache_stats
+from bot.services.openai_client import openai_stats
+from bot.services.prescreen import prescreen_stats
+from bot.services.subscription import subscription_cache_stats
+
+router = Router()
+
+
+def _is_essay_admin(message: Message) -> bool:
+    return bool(message.from_user and message.from_user.id == ADMIN_ID)
+
+
+# =========================
+# /stats
+# =========================
+
+@router.message(Command("stats"))
+async def stats_handler(message: Message):
+    if not _is_essay_admin(message):
+        return
+
+    cache = cache_stats()
+    ai = openai_stats()
+    subs = subscription_cache_stats()
+    out = outbound_throttle.stats()
+    pre = prescreen_stats()
+    dup = duplicate_stats()
+    hedge = hedge_stats()
+
+    try:
+        stages = await stage_stats(hours=24)
+        reviews = await review_stats(hours=24)
+        fsm_active = (await fsm_storage.stats())["active"]
+    except Exception as e:
+        print(f"⚠️ /stats DB ERROR: {e}")
+        stages = []
+        reviews = None
+        fsm_active = "?"
+
+    stage_lines = ""
+    for st in stages:
+        stops = f" (STOP: {st['stops']})" if st["stage"] == "triage" else ""
+        if st["stage"] == "hedge":
+            stops = f" (yutdi: {st['won']})"
+        stage_lines += (
+            f"• {st['stage']}: {st['calls']} ta{stops}, {st['avg_latency_ms']} ms, "
+            f"{st['avg_input_tokens']}+{st['avg_output_tokens']} token, "
+            f"qayta: {st['retries']}\n"
+        )
+    if not stage_lines:
+        stage_lines = "• ma’lumot yo‘q\n"
+
+    if reviews is not None:
+        review_lines = (
+            f"• tekshirildi: {reviews['reviewed']}\n"
+            f"• OpenAI'siz (STOP / cache): {reviews['without_openai']}\n"
+            f"• o‘xshash topildi: {reviews['duplicates']}\n"
+            f"• cache: {reviews['cache_entries']} yozuv, {reviews['cache_used']} tasi ishlatildi\n"
+        )
+    else:
+        review_lines = "• ma’lumot yo‘q\n"
+
+    # tekshiruv hisoblagichlari xotirada — faqat workerlar shu processda bo‘lsa ma’noli
+    if ESSAY_WORKERS_IN_PROCESS:
+        worker_lines = (
+            "♻️ Grading cache (shu process):\n"
+            f"• yoqilgan: {'ha' if cache['enabled'] else 'yo‘q'}\n"
+            f"• LRU hit: {cache['lru_hits']}\n"
+            f"• DB hit: {cache['db_hits']}\n"
+            f"• miss: {cache['misses']}\n"
+            f"• hit ratio: {cache['hit_ratio']:.0%}\n"
+            f"• LRU hajmi: {cache['lru_size']}\n"
+            f"• bypass: {cache['bypassed']}\n\n"
+            "🛑 Lokal STOP tekshiruvi (shu process):\n"
+            f"• tekshirildi: {pre['checked']}\n"
+            f"• OpenAI'siz yakunlandi: {pre['stopped']}\n\n"
+            "🔍 O‘xshash esselar (shu process):\n"
+            f"• indeksda: {dup['indexed']}\n"
+            f"• tekshirildi: {dup['checks']}\n"
+            f"• topildi: {dup['flagged']}\n"
+            f"• qidiruv: {dup['avg_lookup_us']:.0f} µs\n\n"
+            "🤖 OpenAI (shu process):\n"
+            f"• limit: {ai['limit']}/{ai['max_limit']}\n"
+            f"• ishlayapti: {ai['in_flight']}\n"
+            f"• navbatda: {ai['waiting']}\n"
+            f"• 429: {ai['rate_limited']}\n"
+            f"• qayta urinish: {ai['retries']}\n"
+            f"• hedge: {hedge['hedged']}/{hedge['calls']} "
+            f"(yutdi: {hedge['hedge_won']}, "
+            f"{'p' + format(hedge['percentile'], 'g') if hedge['enabled'] else 'o‘chiq'})\n\n"
+        )
+    else:
+        worker_lines = (
+            "ℹ️ Tekshiruv python -m bot.worker processlarida — cache / STOP / OpenAI "
+            "limiter hisoblagichlari o‘sha processlarda (yuqoridagi DB raqamlariga qarang).\n\n"
+        )
+
+    await message.answer(
+        "📈 STATISTIKA\n\n"
+        "📝 Esselar (24 soat, barcha processlar):\n"
+        f"{review_lines}\n"
+        "⏱ Bosqichlar (24 soat):\n"
+        f"{stage_lines}\n"
+        f"💬 Faol suhbatlar (FSM): {fsm_active}\n\n"
+        f"{worker_lines}"
+        "📢 Obuna cache (shu process):\n"
+        f"• hit: {subs['hits']}\n"
+        f"• miss (API): {subs['misses']}\n"
+        f"• hajmi: {subs['size']}\n\n"
+        "📤 Chiquvchi xabarlar (shu process):\n"
+        f"• navbatda: {out['queued']}\n"
+        f"• yuborildi: {out['sent']}\n"
+        f"• RetryAfter: {out['retried']}\n"
+        f"• kechikish p50/p95: {out['p50_ms']}/{out['p95_ms']} ms"
+    )
+
+
+# =========================
+# /costs — tokenlar va narx (kunlar bo‘yicha)
+# =========================
+
+@router.message(Command("costs"))
+async def costs_handler(message: Message):
+    if not _is_essay_admin(message):
+        return
+
+    rows = await cost_by_day(days=14)
+    if not rows:
+        await message.answer("💰 Hali OpenAI chaqiruvlari yozilmagan.")
+        return
+
+    lines = ["💰 OPENAI XARAJATLARI (14 kun)\n"]
+    for r in rows:
+        cached_ratio = r["cached_tokens"] / r["input_tokens"] if r["input_tokens"] else 0
+        lines.append(
+            f"📅 {r['day']:%d.%m}: {r['essays']} ta esse, "
+            f"${r['cost_usd']:.2f} (1 esse: ${r['cost_per_essay']:.4f})\n"
+            f"   cache: {cached_ratio:.0%}, "
+            f"output: {r['output_tokens']} (reasoning {r['reasoning_tokens']})"
+        )
+
+    await message.answer("\n".join(lines))
@@ -7,8 +7,7 @@ from aiogram.types import Message
 
 from bot.config import ADMIN_ID
 from bot.services.db import require_pool
-from bot.services.locks import unlock
-from bot.services.scheduler import scheduler
+from bot.services.voice_delivery import VOICE_DELIVERY_DELAY_MINUTES
 
 router = Router()
 
@@ -57,6 +56,9 @@ async def handle_admin_voice(message: Message):
         essay_id = row["essay_id"]
 
         now_aware = datetime.now(timezone.utc)   # timestamptz columns
+        # ⏳ Yuborish vaqti DBda saqlanadi — sweeper (voice_delivery) o‘zi yuboradi
+        run_time = now_aware + timedelta(minutes=VOICE_DELIVERY_DELAY_MINUTES)
+
         # voiced_at in your table is timestamptz, so we use aware
         await conn.execute(
             """
@@ -65,94 +67,20 @@ async def handle_admin_voice(message: Message):
                 voice_file_id = $1,
                 voiced_at = $2,
                 voice_sent_by = $3,
+                voice_due_at = $4,
+                voice_attempts = 0,
                 status = 'voice_scheduled'
-            WHERE essay_id = $4
+            WHERE essay_id = $5
             """,
             message.voice.file_id,
             now_aware,
             ADMIN_ID,
+            run_time,
             essay_id,
         )
 
-    # ⏳ Schedule sending after 30 minutes (you used 30 sec for testing)
-    run_time = now_aware + timedelta(minutes=30)
-
-    scheduler.add_job(
-        send_voice_to_user,
-        trigger="date",
-        run_date=run_time,
-        args=[message.bot, essay_id],
-        id=f"send_voice_{essay_id}",
-        replace_existing=True,
-    )
-
     await message.answer(
         "✅ Ovozli izoh qabul qilindi.\n"
-        "⏳ Foydalanuvchiga 30 daqiqadan so‘ng yuboriladi."
+        f"⏳ Foydalanuvchiga {VOICE_DELIVERY_DELAY_MINUTES} daqiqadan so‘ng yuboriladi."
     )
 
-
-async def send_voice_to_user(bot, essay_id: str):
-    pool = require_pool()
-    user_id = None
-
-    try:
-        async with pool.acquire() as conn:
-            row = await conn.fetchrow(
-                """
-                SELECT user_id, voice_file_id, status
-                FROM essay_reviews
-                WHERE essay_id = $1
-                """,
-                essay_id,
-            )
-
-            if not row:
-                return
-
-            user_id = int(row["user_id"])
-
-            # ✅ Only send if scheduled
-            if row["status"] != "voice_scheduled":
-                return
-
-            sent = await bot.send_voice(
-                chat_id=user_id,
-                voice=row["voice_file_id"],
-                caption=(
-                    "🎙 Ustozning ovozli izohi\n\n"
-                    "Essengiz bo‘yicha batafsil fikrlar yuborildi."
-                ),
-            )
-
-            now_aware = datetime.now(timezone.utc)  # timestamptz
-            now_naive_utc = datetime.utcnow()       # timestamp (no tz) columns
-
-            # ✅ atomic update: only if still scheduled
-            await conn.execute(
-                """
-                UPDATE essay_reviews
-                SET status          = 'voice_sent',
-                    sent_to_user_at = $2,
-                    voice_sent_at   = $3,
-                    voice_msg_id    = $4
-                WHERE essay_id = $1
-                  AND status = 'voice_scheduled'
-                """,
-                essay_id,
-                now_aware,
-                now_naive_utc,
-                sent.message_id,
-            )
-
-            # updated looks like "UPDATE 1" or "UPDATE 0"
-            # If UPDATE 0: it means already changed by another action (double protection)
-
-    except Exception as e:
-        # ✅ Don’t block unlock even if DB fails
-        print(f"❌ send_voice_to_user ERROR essay_id={essay_id}: {e}")
-
-    finally:
-        # 🔓 Always unlock user so they can submit again
-        if user_id is not None:
-            unlock(user_id)
@@ -1,7 +1,9 @@
 # bot/handlers/essay.py
 
-from datetime import datetime, timedelta
+import asyncio
+from datetime import datetime, timedelta, timezone
 import uuid
+from typing import Optional
 from bot.keyboards.main import main_menu
 
 from aiogram import Router
@@ -10,24 +12,44 @@ from aiogram.fsm.context import FSMContext
 
 from bot.states import EssayStates
 from bot.services.word_count import count_words
-from bot.services.scheduler import scheduler
-from bot.services.locks import is_locked, lock, unlock
+from bot.services.locks import unlock
 
-from bot.config import ADMIN_ID
+from bot.config import (
+    ADMIN_ID,
+    ESSAY_REVEAL_DELAY_SECONDS,
+    ESSAY_STREAM_INTERVAL_SECONDS,
+    ESSAY_STREAM_TO_ADMIN,
+)
 from bot.services.db import require_pool
 
 # ✅ DB-based balance
 from bot.services.balance import (
-    get_balance,
-    consume_balance,
+    get_user_context,
+    lock_and_charge,
     refund_balance,
 )
 
 from bot.keyboards.payment import payment_keyboard
-from bot.services.essay_checker import check_essay
+from bot.services.essay_checker import check_essay_detailed, check_essay_streaming
+from bot.services.grading_calls import record_calls
+from bot.services.prescreen import prescreen
+from bot.services.rubric import SCORE_COLUMNS, ParsedScores, parse_report
+from bot.services.duplicates import DuplicateMatch, find_duplicate, index_essay, signature
+from bot.services.batch_grading import get_grading_mode
+from bot.services.essay_queue import enqueue_essay, complete_job, defer_job, fail_job, refund_job
+from bot.services.grading_cache import (
+    cache_key,
+    get_cached,
+    put_cached,
+    consume_bypass,
+)
 
 router = Router()
 
+# essay_reviews INSERT: $10 dan boshlab ball ustunlari
+_SCORE_COLUMNS_SQL = ", ".join(SCORE_COLUMNS)
+_SCORE_PARAMS_SQL = ", ".join(f"${i}" for i in range(10, 10 + len(SCORE_COLUMNS)))
+
 # ============================================================
 # Helpers
 # ============================================================
@@ -42,30 +64,58 @@ def chunk_text(text: str, size: int = 3200) -> list[str]:
     return [text[i:i + size] for i in range(0, len(text), size)]
 
 
-async def _send_admin_ai_result(
-    bot,
+def _anchor_text(
     *,
     essay_id: str,
     user_id: int,
     topic: str,
-    result_text: str,
-) -> int:
-    """
-    1) Adminga "anchor" xabar yuboradi (admin reply qilishi uchun)
-    2) AI natijani alohida chunk message qilib yuboradi (message too long muammosiz)
-    3) anchor message_id ni qaytaradi
-    """
+    duplicate: Optional[DuplicateMatch] = None,
+) -> str:
     anchor_text = (
         "📝 YANGI ESSE TEKSHIRILDI\n\n"
         f"🆔 Essay ID: {essay_id}\n"
         f"👤 User ID: {user_id}\n"
         f"📝 Mavzu: {topic}\n\n"
+    )
+    if duplicate is not None:
+        anchor_text += (
+            f"⚠️ O‘xshash esse: {duplicate.essay_id} "
+            f"(User ID: {duplicate.user_id}, {duplicate.score:.0%})\n\n"
+        )
+    anchor_text += (
         "🎙 Iltimos, SHU XABARGA REPLY qilib ovozli izoh yuboring.\n"
         "⏳ Ovozli izoh foydalanuvchiga 30 daqiqadan keyin yuboriladi.\n\n"
         "👇 AI natija quyidagi xabarlarda:"
     )
+    return anchor_text
+
+
+def _result_part_text(essay_id: str, idx: int, total: Optional[int], part: str) -> str:
+    """
+    total=None — natija hali yozilmoqda (stream).
+    """
+    counter = f"{idx}/{total}" if total is not None else f"{idx} ⏳"
+    return f"📊 AI NATIJA (Essay ID: {essay_id}) — {counter}\n\n{part}"
 
-    anchor_msg = await bot.send_message(chat_id=ADMIN_ID, text=anchor_text)
+
+async def _send_admin_ai_result(
+    bot,
+    *,
+    essay_id: str,
+    user_id: int,
+    topic: str,
+    result_text: str,
+    duplicate: Optional[DuplicateMatch] = None,
+) -> int:
+    """
+    1) Adminga "anchor" xabar yuboradi (admin reply qilishi uchun)
+    2) AI natijani alohida chunk message qilib yuboradi (message too long muammosiz)
+    3) anchor message_id ni qaytaradi
+    """
+    anchor_msg = await bot.send_message(
+        chat_id=ADMIN_ID,
+        text=_anchor_text(essay_id=essay_id, user_id=user_id, topic=topic, duplicate=duplicate),
+    )
 
     # AI natijani chunk qilib yuboramiz
     parts = chunk_text(result_text, size=3200)
@@ -74,15 +124,137 @@ async def _send_admin_ai_result(
     for idx, part in enumerate(parts, start=1):
         await bot.send_message(
             chat_id=ADMIN_ID,
-            text=(
-                f"📊 AI NATIJA (Essay ID: {essay_id}) — {idx}/{len(parts)}\n\n"
-                f"{part}"
-            )
+            text=_result_part_text(essay_id, idx, len(parts), part),
         )
 
     return anchor_msg.message_id
 
 
+class _AdminStream:
+    """
+    AI natijani hosil bo‘layotgan paytda adminga ko‘rsatadi (check_essay_streaming sink'i).
+
+    - feed() faqat bufferga yozadi (OpenAI slot'i Telegram'ni kutmaydi);
+      alohida task reveal_at dan keyin anchor yuboradi va qismlarni
+      ESSAY_STREAM_INTERVAL_SECONDS da bir marta tahrirlaydi / qo‘shadi
+    - finish(text) — yakuniy matn xuddi _send_admin_ai_result dagidek
+      chunk'lanib ko‘rsatiladi (DB dagi ai_result bilan aynan bir xil)
+    - Telegram tezlik limiti — OutboundThrottle (Edit* ham o‘tadi)
+    """
+
+    def __init__(self, bot, *, essay_id: str, user_id: int, topic: str,
+                 duplicate: Optional[DuplicateMatch], reveal_at: datetime) -> None:
+        self.bot = bot
+        self.essay_id = essay_id
+        self.anchor = _anchor_text(essay_id=essay_id, user_id=user_id, topic=topic, duplicate=duplicate)
+        self.reveal_at = reveal_at
+        self.buffer = ""
+        self.anchor_msg_id: Optional[int] = None
+        # qism -> (message_id, ko‘rsatilgan matn)
+        self.messages: list[tuple[int, str]] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self._done = asyncio.Event()
+
+    async def reset(self) -> None:
+        self.buffer = ""
+
+    async def feed(self, delta: str) -> None:
+        self.buffer += delta
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        shown = ""
+        while not self._done.is_set():
+            wait = max(
+                ESSAY_STREAM_INTERVAL_SECONDS,
+                (self.reveal_at - datetime.now(timezone.utc)).total_seconds(),
+            )
+            try:
+                await asyncio.wait_for(self._done.wait(), timeout=wait)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+            text = self.buffer
+            if not text or text == shown:
+                continue
+
+            # oraliq yangilanish xatosi tekshiruvni to‘xtatmaydi — finish() hammasini to‘g‘rilaydi
+            try:
+                await self._render(text, final=False)
+                shown = text
+            except Exception as e:
+                print(f"⚠️ admin stream ERROR ({self.essay_id}): {e}")
+
+    async def stop(self) -> None:
+        """
+        Flush task'ni to‘xtatadi (cancel emas — boshlangan tahrir oxiriga yetadi,
+        messages ro‘yxati Telegram bilan mos qoladi).
+        """
+        self._done.set()
+        if self._flusher is not None:
+            await self._flusher
+            self._flusher = None
+
+    async def finish(self, result_text: str) -> int:
+        await self.stop()
+
+        delay = (self.reveal_at - datetime.now(timezone.utc)).total_seconds()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        await self._render(result_text, final=True)
+        return self.anchor_msg_id
+
+    async def abort(self, final: bool) -> None:
+        """
+        Tekshiruv xato bilan tugadi — ko‘rsatilgan qisman natijani belgilab qo‘yamiz.
+        final — fail_job natijasi: urinishlar tugagan va hisob qaytarilgan.
+        """
+        await self.stop()
+
+        if self.anchor_msg_id is None:
+            return
+        outcome = "urinishlar tugadi, hisob qaytarildi" if final else "qayta uriniladi"
+        try:
+            await self.bot.edit_message_text(
+                chat_id=ADMIN_ID,
+                message_id=self.anchor_msg_id,
+                text=f"❌ Tekshiruv to‘xtadi (Essay ID: {self.essay_id}) — {outcome}.\n"
+                     "Bu xabarga reply qilmang.",
+            )
+        except Exception as e:
+            print(f"⚠️ admin stream abort ERROR ({self.essay_id}): {e}")
+
+    async def _render(self, text: str, *, final: bool) -> None:
+        if self.anchor_msg_id is None:
+            msg = await self.bot.send_message(chat_id=ADMIN_ID, text=self.anchor)
+            self.anchor_msg_id = msg.message_id
+
+        parts = chunk_text(text, size=3200)
+        total = len(parts) if final else None
+
+        for idx, part in enumerate(parts, start=1):
+            body = _result_part_text(self.essay_id, idx, total, part)
+            if idx <= len(self.messages):
+                message_id, shown = self.messages[idx - 1]
+                if shown != body:
+                    await self.bot.edit_message_text(
+                        chat_id=ADMIN_ID, message_id=message_id, text=body
+                    )
+                    self.messages[idx - 1] = (message_id, body)
+            else:
+                msg = await self.bot.send_message(chat_id=ADMIN_ID, text=body)
+                self.messages.append((msg.message_id, body))
+
+        # qayta urinishdan keyin matn qisqargan bo‘lsa — ortiqcha qismlar
+        if final:
+            for message_id, _ in self.messages[len(parts):]:
+                await self.bot.delete_message(chat_id=ADMIN_ID, message_id=message_id)
+            del self.messages[len(parts):]
+
+
 # ============================================================
 # Handlers
 # ============================================================
@@ -91,15 +263,17 @@ async def _send_admin_ai_result(
 async def ask_topic(message: Message, state: FSMContext):
     user_id = message.from_user.id
 
-    if is_locked(user_id):
+    # 1 round trip: lock + balans
+    ctx = await get_user_context(user_id)
+
+    if ctx.locked:
         await message.answer(
             "⏳ Sizning essengiz hozir tekshirilmoqda.\n"
             "Natija kelgach yana yuborishingiz mumkin."
         )
         return
 
-    balance = await get_balance(user_id)
-    if balance < 1:
+    if ctx.balance < 1:
         await message.answer(
             "❌ Hisobingizda tekshiruvlar qolmagan.\n\n"
             "1 ta esse tekshirish narxi: 10 000 so‘m.\n"
@@ -127,15 +301,6 @@ async def receive_topic(message: Message, state: FSMContext):
 async def receive_essay(message: Message, state: FSMContext):
     user_id = message.from_user.id
 
-    if is_locked(user_id):
-        await message.answer(
-            "⏳ Sizning essengiz hozir tekshirilmoqda.\n"
-            "Natija kelgach yana yuborishingiz mumkin.\n\n"
-            "🏠 Asosiy menyu:",
-            reply_markup=main_menu()
-        )
-        return
-
     if not message.text:
         await message.answer("❌ Esse faqat matn ko‘rinishida yuborilishi kerak.")
         return
@@ -161,9 +326,23 @@ async def receive_essay(message: Message, state: FSMContext):
         await message.answer("❌ Esse 350 ta so‘zdan oshmasligi kerak.")
         return
 
-    # Balance consume
-    consumed = await consume_balance(user_id)
-    if not consumed:
+    essay_id = f"essay_{uuid.uuid4().hex}"
+
+    # Lock ON + balans yechish — bitta statement
+    # (atomic: parallel ikkinchi esse shu yerda to‘xtaydi; ledger: charge:<essay_id>)
+    status = await lock_and_charge(user_id, essay_id=essay_id)
+
+    if status == "locked":
+        await message.answer(
+            "⏳ Sizning essengiz hozir tekshirilmoqda.\n"
+            "Natija kelgach yana yuborishingiz mumkin.\n\n"
+            "🏠 Asosiy menyu:",
+            reply_markup=main_menu()
+        )
+        await state.clear()
+        return
+
+    if status == "no_balance":
         await message.answer(
             "❌ Hisobingizda tekshiruvlar qolmagan.\n\n"
             "1 ta esse tekshirish narxi: 10 000 so‘m.\n"
@@ -173,67 +352,150 @@ async def receive_essay(message: Message, state: FSMContext):
         await state.clear()
         return
 
-    # Lock ON
-    lock(user_id)
+    # ⚡ Tekshiruv DARHOL boshlanadi, natija esa reveal_at gacha ushlab turiladi
+    reveal_at = datetime.now(timezone.utc) + timedelta(seconds=ESSAY_REVEAL_DELAY_SECONDS)
+
+    # 💾 Job DBga yoziladi (restart bo‘lsa ham yo‘qolmaydi), workerlar oladi
+    try:
+        # 📦 admin /grading_mode batch — Batch API orqali (arzonroq, sekinroq)
+        grading_mode = await get_grading_mode()
+        await enqueue_essay(
+            essay_id=essay_id,
+            user_id=user_id,
+            chat_id=message.chat.id,
+            topic=topic,
+            essay_text=essay_text,
+            reveal_at=reveal_at,
+            bypass_cache=await consume_bypass(user_id),
+            grading_mode=grading_mode,
+        )
+    except Exception as e:
+        print(f"❌ ESSAY ENQUEUE ERROR for {user_id}: {e}")
+        await refund_balance(user_id, amount=1, essay_id=essay_id)
+        await unlock(user_id)
+        await message.answer(
+            "❌ Esseni qabul qilishda texnik nosozlik yuz berdi.\n\n"
+            "💳 Hisobingiz qayta tiklandi.\n"
+            "Iltimos, birozdan so‘ng yana urinib ko‘ring.",
+            reply_markup=main_menu()
+        )
+        await state.clear()
+        return
 
     await message.answer(
         f"✅ Essengiz qabul qilindi.\n"
         f"So‘zlar soni: {words}\n\n"
         "Natija ustoz tomonidan ovozli izoh shaklida yuboriladi."
-    )
-
-    chat_id = message.chat.id
-    bot = message.bot
-
-    # TEST: 30 sec (keyin 15 min qilasiz)
-    run_time = datetime.now() + timedelta(seconds=30)
-
-    scheduler.add_job(
-        send_result_with_openai,
-        trigger="date",
-        run_date=run_time,
-        args=[bot, chat_id, user_id, topic, essay_text],
-        id=f"essay_result_{user_id}",
-        replace_existing=True,
+        + (
+            "\n\n⏳ Hozir esselar navbat bilan tekshirilmoqda — "
+            "natija 24 soatgacha kechikishi mumkin."
+            if grading_mode == "batch" else ""
+        )
     )
 
     await state.clear()
 
 
 # ============================================================
-# Background job
+# Background job (essay_jobs worker)
 # ============================================================
 
-async def send_result_with_openai(
-    bot,
-    chat_id: int,
-    user_id: int,
-    topic: str,
-    essay_text: str,
-):
+async def process_essay_job(bot, job: dict):
     """
     ✅ AI natija USERga emas — ADMIN'ga yuboriladi va DBga yoziladi.
-    ❌ Xato bo‘lsa → refund + userga xabar + unlock.
+    ❌ Xato bo‘lsa → qayta urinish; urinishlar tugasa → refund + userga xabar + unlock.
+    🛑 STOP holati lokal aniqlansa — OpenAI chaqirilmaydi.
+    ♻️ Bir xil esse avval tekshirilgan bo‘lsa — natija cache'dan olinadi.
+    📦 Batch rejimida natija tayyor keladi (job["ai_result"]).
+    ⏳ Natija reveal_at dan oldin adminga yuborilmaydi: tayyor natija job'ga
+       yoziladi va job reveal_at da qayta olinadi (faqat yetkazish) — worker kutmaydi.
     """
-    essay_id = f"essay_{uuid.uuid4().hex}"
+    essay_id = job["essay_id"]
+    user_id = job["user_id"]
+    topic = job["topic"]
+    essay_text = job["essay_text"]
+    stream: Optional[_AdminStream] = None
 
     try:
-        result_text = await check_essay(topic, essay_text)
+        # oldingi urinishda worker o‘lgan va urinishlar tugagan
+        if job["attempts"] > job["max_attempts"]:
+            raise RuntimeError("worker timeout, urinishlar tugadi")
+
+        # 🔍 Boshqa userning avvalgi essesiga deyarli bir xilmi (MinHash/LSH)
+        sig = signature(essay_text)
+        try:
+            duplicate = await find_duplicate(sig, user_id=user_id)
+        except Exception as e:
+            print(f"⚠️ duplicate check ERROR ({essay_id}): {e}")
+            duplicate = None
+
+        # 🛑 Aniq STOP holatlari (faqat kirish) — OpenAI'siz
+        verdict = None if job["ai_result"] is not None else prescreen(topic, essay_text)
+
+        if job["ai_result"] is not None:
+            # 📦 Batch API natijasi yoki reveal_at kutgan natija — faqat yetkazamiz
+            result_text = job["ai_result"]
+        elif verdict is not None:
+            result_text = verdict.text
+        else:
+            key = cache_key(topic, essay_text)
+            result_text = None if job["bypass_cache"] else await get_cached(key)
+
+            if result_text is None:
+                if ESSAY_STREAM_TO_ADMIN:
+                    # 📡 natija adminga yozilayotgan paytda ko‘rsatiladi
+                    stream = _AdminStream(
+                        bot,
+                        essay_id=essay_id,
+                        user_id=user_id,
+                        topic=topic,
+                        duplicate=duplicate,
+                        reveal_at=job["reveal_at"],
+                    )
+                    checked = await check_essay_streaming(topic, essay_text, stream)
+                else:
+                    checked = await check_essay_detailed(topic, essay_text)
+                result_text = checked.text
+                await put_cached(key, result_text)
+
+                # ⏱ bosqichlar bo‘yicha vaqt / tokenlar (triage tejamini o‘lchash uchun)
+                try:
+                    await record_calls(essay_id, checked.calls)
+                except Exception as e:
+                    print(f"⚠️ grading_calls ERROR ({essay_id}): {e}")
+
+        # ⏳ reveal_at hali kelmagan (adminga hech narsa ko‘rsatilmagan) —
+        # natijani saqlab slot'ni bo‘shatamiz, reveal_at da yetkaziladi
+        early = datetime.now(timezone.utc) < job["reveal_at"]
+        if early and stream is not None:
+            await stream.stop()
+            early = stream.anchor_msg_id is None
+        if early:
+            await defer_job(job, result_text)
+            return
+
+        if stream is not None:
+            # 📡 stream qilingan xabarlar yakuniy matn bilan almashtiriladi
+            anchor_msg_id = await stream.finish(result_text)
+        else:
+            # ✅ Send to ADMIN safely (chunked) + get anchor msg_id
+            anchor_msg_id = await _send_admin_ai_result(
+                bot,
+                essay_id=essay_id,
+                user_id=user_id,
+                topic=topic,
+                result_text=result_text,
+                duplicate=duplicate,
+            )
 
-        # ✅ Send to ADMIN safely (chunked) + get anchor msg_id
-        anchor_msg_id = await _send_admin_ai_result(
-            bot,
-            essay_id=essay_id,
-            user_id=user_id,
-            topic=topic,
-            result_text=result_text,
-        )
+        # 📊 Ballar tip ustunlarga (statistika uchun)
+        parsed = parse_report(result_text) or ParsedScores(None, None, None)
 
         # ✅ Save to DB (anchor only)
         pool = require_pool()
         async with pool.acquire() as conn:
             await conn.execute(
-                """
+                f"""
                 INSERT INTO essay_reviews (
                     essay_id,
                     user_id,
@@ -241,9 +503,14 @@ async def send_result_with_openai(
                     essay_text,
                     ai_result,
                     admin_chat_id,
-                    admin_msg_id
+                    admin_msg_id,
+                    duplicate_of,
+                    duplicate_score,
+                    {_SCORE_COLUMNS_SQL},
+                    scores_parsed_at
                 )
-                VALUES ($1, $2, $3, $4, $5, $6, $7)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, {_SCORE_PARAMS_SQL}, now())
+                ON CONFLICT (essay_id) DO NOTHING
                 """,
                 essay_id,
                 user_id,
@@ -252,20 +519,42 @@ async def send_result_with_openai(
                 result_text,
                 ADMIN_ID,
                 anchor_msg_id,
+                duplicate.essay_id if duplicate else None,
+                duplicate.score if duplicate else None,
+                *parsed.columns(),
             )
 
+        # 🔍 Indeksga qo‘shamiz (keyingi esselar shu bilan solishtiriladi)
+        try:
+            await index_essay(essay_id, user_id, sig)
+        except Exception as e:
+            print(f"⚠️ duplicate index ERROR ({essay_id}): {e}")
+
+        await complete_job(job)
+
         # ❗ USERga natija yuborilmaydi.
         # unlock ham qilinmaydi: admin voice workflow tugaganda ochiladi.
 
     except Exception as e:
-        await refund_balance(user_id, amount=1)
+        print(f"❌ ESSAY CHECK ERROR for {user_id} ({essay_id}): {e}")
+
+        # OpenAI yuklangan (429 / 5xx) — retry-after dan oldin qayta olinmaydi
+        retry_after = getattr(e, "retry_after", 0) or 0
+        final = await fail_job(job, str(e), retry_after=retry_after)
+        if final:
+            await refund_job(job["job_id"])
+
+        if stream is not None:
+            await stream.abort(final)
+
+        if not final:
+            return
 
         await bot.send_message(
-            chat_id,
+            job["chat_id"],
             "❌ Esseni tekshirish jarayonida texnik nosozlik yuz berdi.\n\n"
             "💳 Hisobingiz qayta tiklandi.\n"
             "Iltimos, birozdan so‘ng yana urinib ko‘ring."
         )
 
-        unlock(user_id)
-        print(f"❌ ESSAY CHECK ERROR for {user_id}: {e}")
+        await unlock(user_id)
@@ -4,7 +4,7 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery
 
 from bot.services.subscription import is_user_subscribed
-from bot.services.balance import grant_free_balance, has_used_free
+from bot.services.balance import get_user_context
 from bot.keyboards.main import main_menu
 
 router = Router()
@@ -15,8 +15,8 @@ async def check_subscription(callback: CallbackQuery):
     user_id = callback.from_user.id
     bot = callback.bot
 
-    # ❌ Obuna yo‘q
-    if not await is_user_subscribed(bot, user_id):
+    # ❌ Obuna yo‘q (salbiy cache'siz — hozirgina obuna bo‘lgan bo‘lishi mumkin)
+    if not await is_user_subscribed(bot, user_id, fresh=True):
         await callback.answer(
             "❌ Siz hali kanalga obuna bo‘lmagansiz.",
             show_alert=True
@@ -24,12 +24,10 @@ async def check_subscription(callback: CallbackQuery):
         return
 
     # ✅ Obuna bor
-    already_used = await has_used_free(user_id)
-
-    if not already_used:
-        # 🎁 DB-based ONE TIME ONLY
-        await grant_free_balance(user_id)
+    # 🎁 DB-based ONE TIME ONLY (upsert + grant + holat — 1 round trip)
+    ctx = await get_user_context(user_id, grant_free=True)
 
+    if ctx.granted_free:
         await callback.message.edit_text(
             "✅ Obuna tasdiqlandi.\n\n"
             "🎁 Sizga 1 marta tekin esse tekshirish imkoni berildi.",
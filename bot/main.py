@@ -1,13 +1,15 @@
 import asyncio
+from datetime import datetime, timezone
 
 from aiogram import Bot, Dispatcher
 from aiogram.types import Message
 from aiogram.filters import Command
-from aiogram.fsm.storage.memory import MemoryStorage
 
-from bot.config import BOT_TOKEN
+from bot.config import BOT_TOKEN, BOT_MODE, ESSAY_WORKERS_IN_PROCESS
 from bot.keyboards.main import main_menu
-from bot.keyboards.subscribe import subscribe_keyboard
+from bot.middlewares.subscription import SubscriptionMiddleware
+from bot.middlewares.outbound import outbound_throttle
+from bot.webhook import run_webhook
 
 # ✅ handlers
 from bot.handlers import (
@@ -17,26 +19,120 @@ from bot.handlers import (
     payment,
     admin,           # payment admin (MONEY_ID)
     admin_recovery,  # ✅ NEW: /fix /resend /cancel
-    admin_voice     # ⏭️ will be added next
+    admin_voice,     # ⏭️ will be added next
+    admin_stats,     # /stats
+    admin_grading,   # /grading_mode
 )
 
-from bot.services.scheduler import start_scheduler
-from bot.services.subscription import is_user_subscribed
+from bot.services.scheduler import scheduler, start_scheduler
+from bot.services.grading_cache import purge_expired as purge_grading_cache
+from bot.services.essay_queue import ESSAY_WORKER_SHARDS, start_essay_workers, stop_essay_workers
+from bot.services.voice_delivery import VOICE_SWEEP_SECONDS, sweep_due_voices
+from bot.services.batch_grading import BATCH_POLL_SECONDS, run_batch_cycle
+from bot.services.locks import LOCK_HEARTBEAT_SECONDS, heartbeat as lock_heartbeat
+from bot.services.reconciler import RECONCILE_SECONDS, reconcile_pipeline
+from bot.services.openai_client import close_client as close_openai_client
+from bot.services.fsm_storage import fsm_storage, purge_expired as purge_fsm_states
 
 # ✅ DB & balance
 from bot.services.db import init_db
-from bot.services.balance import grant_free_balance, has_used_free
+from bot.services.balance import get_user_context
 
 
 async def main():
     # ✅ DB pool init (ENG MUHIM QATOR)
     await init_db()
 
-    # ✅ Scheduler (essay jobs, auto-unlock later)
+    # ✅ Scheduler (periodic maintenance jobs)
     start_scheduler()
 
+    # ♻️ Eskirgan grading cache yozuvlarini tozalash
+    scheduler.add_job(
+        purge_grading_cache,
+        trigger="interval",
+        hours=6,
+        id="grading_cache_purge",
+        replace_existing=True,
+    )
+
+    # 💬 Harakatsiz FSM suhbatlarini tozalash
+    scheduler.add_job(
+        purge_fsm_states,
+        trigger="interval",
+        hours=1,
+        id="fsm_states_purge",
+        replace_existing=True,
+    )
+
+    # 🔐 User lock lease'larini uzaytirish
+    scheduler.add_job(
+        lock_heartbeat,
+        trigger="interval",
+        seconds=LOCK_HEARTBEAT_SECONDS,
+        id="lock_heartbeat",
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True,
+    )
+
+    # 🧹 Lock'lar va refund qilinmagan esselarni tiklash (startupda darhol ham)
+    scheduler.add_job(
+        reconcile_pipeline,
+        trigger="interval",
+        seconds=RECONCILE_SECONDS,
+        id="pipeline_reconcile",
+        next_run_time=datetime.now(timezone.utc),
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True,
+    )
+
     bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher(storage=MemoryStorage())
+
+    # 📤 Barcha chiquvchi xabarlar: per-chat + global rate limit, RetryAfter
+    if not ESSAY_WORKERS_IN_PROCESS:
+        # global Telegram limiti python -m bot.worker processlari bilan bo‘linadi
+        outbound_throttle.share(ESSAY_WORKER_SHARDS + 1)
+    bot.session.middleware(outbound_throttle)
+
+    # 💬 FSM holatlari Postgres'da (restart / replikalar uchun)
+    dp = Dispatcher(storage=fsm_storage)
+
+    if ESSAY_WORKERS_IN_PROCESS:
+        # ✅ Essay workers (essay_jobs navbatidan oladi)
+        start_essay_workers(bot, essay.process_essay_job)
+
+        # 🎙 Vaqti kelgan ovozli izohlar — bitta sweeper (startupda darhol ham ishlaydi)
+        scheduler.add_job(
+            sweep_due_voices,
+            trigger="interval",
+            seconds=VOICE_SWEEP_SECONDS,
+            args=[bot],
+            id="voice_sweep",
+            next_run_time=datetime.now(timezone.utc),
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True,
+        )
+
+        # 📦 Batch rejimidagi esselar: yuborish + natijalarni yig‘ish
+        scheduler.add_job(
+            run_batch_cycle,
+            trigger="interval",
+            seconds=BATCH_POLL_SECONDS,
+            id="batch_grading",
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True,
+        )
+    else:
+        # Tekshiruv va ovozli izohlar: python -m bot.worker
+        print("ℹ️ Essay workers alohida processda (python -m bot.worker)")
+
+    # 🔒 Kanal obunasi — barcha router'lar uchun (TTL cache bilan)
+    subscription_gate = SubscriptionMiddleware()
+    dp.message.outer_middleware(subscription_gate)
+    dp.callback_query.outer_middleware(subscription_gate)
 
     # =========================
     # /start
@@ -45,17 +141,11 @@ async def main():
     async def start_handler(message: Message):
         user_id = message.from_user.id
 
-        # ❌ Subscription check
-        if not await is_user_subscribed(bot, user_id):
-            await message.answer(
-                "❗ Botdan foydalanish uchun kanalimizga obuna bo‘lishingiz shart.",
-                reply_markup=subscribe_keyboard()
-            )
-            return
+        # ❗ Obuna tekshiruvi SubscriptionMiddleware'da
 
         # 🎁 One-time free try (DB-based)
-        if not await has_used_free(user_id):
-            await grant_free_balance(user_id)
+        ctx = await get_user_context(user_id, grant_free=True)
+        if ctx.granted_free:
             await message.answer(
                 "Assalomu alaykum! Bot ishga tushdi.\n\n"
                 "🎁 Sizga 1 marta tekin esse tekshirish imkoni berildi.",
@@ -78,11 +168,31 @@ async def main():
     dp.include_router(admin.router)           # MONEY_ID payments
     dp.include_router(admin_recovery.router)  # /fix /resend /cancel
     dp.include_router(admin_voice.router)    # ⏭️ next step
+    dp.include_router(admin_stats.router)    # /stats
+    dp.include_router(admin_grading.router)  # /grading_mode
 
     dp.include_router(help.router)
     dp.include_router(essay.router)
 
-    await dp.start_polling(bot)
+    # =========================
+    # Ingress: polling yoki webhook
+    # =========================
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            # Avval webhook o‘rnatilgan bo‘lsa, polling ishlamaydi
+            await bot.delete_webhook(drop_pending_updates=False)
+            await dp.start_polling(bot)
+    finally:
+        # yangi scheduler job'lari boshlanmaydi; keyin navbatdagi xabarlar yuboriladi
+        if scheduler.running:
+            scheduler.shutdown(wait=False)
+        await stop_essay_workers()
+        await outbound_throttle.drain()
+        await close_openai_client()
+        await fsm_storage.close()
+        await bot.session.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,164 @@
+# bot/middlewares/outbound.py
+
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Dict
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+# Telegram limitlari: ~30 msg/s global, ~1 msg/s bitta chatga
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "25"))
+OUTBOUND_GLOBAL_BURST = int(os.getenv("OUTBOUND_GLOBAL_BURST", "25"))
+OUTBOUND_PER_CHAT_RATE = float(os.getenv("OUTBOUND_PER_CHAT_RATE", "1"))
+OUTBOUND_PER_CHAT_BURST = int(os.getenv("OUTBOUND_PER_CHAT_BURST", "1"))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "5"))
+# To‘xtashda navbatdagi xabarlar shuncha sekund kutiladi (keyin session yopiladi)
+OUTBOUND_DRAIN_SECONDS = float(os.getenv("OUTBOUND_DRAIN_SECONDS", "10"))
+
+# Chatga xabar yuboradigan / o‘zgartiradigan metodlar
+_THROTTLED_PREFIXES = ("Send", "Copy", "Forward", "Edit")
+
+_CHAT_BUCKETS_MAX = 10_000
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = float(max(burst, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class OutboundThrottle(BaseRequestMiddleware):
+    """
+    Barcha chiquvchi xabarlar (send_message, send_voice, send_photo,
+    send_document, edit_*) shu yerdan o‘tadi:
+    - har bir chat uchun FIFO navbat (asyncio.Lock — adolatli) + token bucket
+    - global token bucket
+    - TelegramRetryAfter -> kutib, qayta yuboradi (navbat tartibi buzilmaydi)
+
+    bot.session.middleware(OutboundThrottle())
+    """
+
+    def __init__(self) -> None:
+        self._global = _TokenBucket(OUTBOUND_GLOBAL_RATE, OUTBOUND_GLOBAL_BURST)
+        self._chat_buckets: "OrderedDict[Any, _TokenBucket]" = OrderedDict()
+        # chat_id -> [lock, navbatdagilar soni]
+        self._chat_locks: Dict[Any, list] = {}
+
+        self.queued = 0
+        self.sent = 0
+        self.retried = 0
+        self._latencies_ms: deque = deque(maxlen=500)
+
+    def share(self, processes: int) -> None:
+        """
+        Bir nechta process bitta bot tokeni bilan yuborsa (bot.main + python -m bot.worker),
+        global limit ular orasida bo‘linadi — jami OUTBOUND_GLOBAL_RATE dan oshmaydi.
+        Per-chat limit bo‘linmaydi: bitta userning xabarlari bitta shard'dan ketadi.
+        """
+        processes = max(processes, 1)
+        self._global = _TokenBucket(
+            OUTBOUND_GLOBAL_RATE / processes,
+            max(OUTBOUND_GLOBAL_BURST // processes, 1),
+        )
+
+    def _chat_bucket(self, chat_id: Any) -> _TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = _TokenBucket(OUTBOUND_PER_CHAT_RATE, OUTBOUND_PER_CHAT_BURST)
+            self._chat_buckets[chat_id] = bucket
+            while len(self._chat_buckets) > _CHAT_BUCKETS_MAX:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or not type(method).__name__.startswith(_THROTTLED_PREFIXES):
+            return await make_request(bot, method)
+
+        entry = self._chat_locks.setdefault(chat_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        self.queued += 1
+        enqueued_at = time.monotonic()
+
+        try:
+            async with entry[0]:
+                await self._chat_bucket(chat_id).acquire()
+                await self._global.acquire()
+
+                attempt = 0
+                while True:
+                    try:
+                        response = await make_request(bot, method)
+                        break
+                    except TelegramRetryAfter as e:
+                        attempt += 1
+                        self.retried += 1
+                        if attempt > OUTBOUND_MAX_RETRIES:
+                            raise
+                        print(f"⏳ Telegram flood limit (chat {chat_id}): {e.retry_after}s kutamiz")
+                        await asyncio.sleep(e.retry_after)
+
+                self.sent += 1
+                self._latencies_ms.append(int((time.monotonic() - enqueued_at) * 1000))
+                return response
+        finally:
+            self.queued -= 1
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._chat_locks.pop(chat_id, None)
+
+    async def drain(self, timeout: float = OUTBOUND_DRAIN_SECONDS) -> None:
+        """
+        To‘xtash: navbatdagi xabarlar yuborilishini kutadi (ko‘pi bilan timeout).
+        """
+        deadline = time.monotonic() + timeout
+        while self.queued and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self.queued:
+            print(f"⚠️ outbound: {self.queued} ta xabar yuborilmay qoldi")
+
+    def stats(self) -> dict:
+        lat = sorted(self._latencies_ms)
+        return {
+            "queued": self.queued,
+            "sent": self.sent,
+            "retried": self.retried,
+            "p50_ms": lat[len(lat) // 2] if lat else 0,
+            "p95_ms": lat[int(len(lat) * 0.95)] if lat else 0,
+        }
+
+
+# main.py o‘rnatadi; /stats uchun
+outbound_throttle = OutboundThrottle()
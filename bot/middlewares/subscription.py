@@ -0,0 +1,44 @@
+# bot/middlewares/subscription.py
+
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from bot.keyboards.subscribe import subscribe_keyboard
+from bot.services.permissions import is_essay_admin, is_payment_admin
+from bot.services.subscription import is_user_subscribed
+
+SUBSCRIBE_TEXT = "❗ Botdan foydalanish uchun kanalimizga obuna bo‘lishingiz shart."
+
+
+class SubscriptionMiddleware(BaseMiddleware):
+    """
+    Barcha router'lar uchun kanal obunasini tekshiradi (TTL cache orqali —
+    har bir bosishda Telegram API chaqirilmaydi).
+    Adminlar va "✅ Tekshirish" tugmasi tekshirilmaydi.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None or is_essay_admin(user.id) or is_payment_admin(user.id):
+            return await handler(event, data)
+
+        # obunani o‘zi tekshiradigan callback
+        if isinstance(event, CallbackQuery) and event.data == "check_subscription":
+            return await handler(event, data)
+
+        if await is_user_subscribed(data["bot"], user.id):
+            return await handler(event, data)
+
+        if isinstance(event, Message):
+            await event.answer(SUBSCRIBE_TEXT, reply_markup=subscribe_keyboard())
+        elif isinstance(event, CallbackQuery):
+            await event.answer(SUBSCRIBE_TEXT, show_alert=True)
+
+        return None
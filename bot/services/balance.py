@@ -1,5 +1,17 @@
 # bot/services/balance.py
+from dataclasses import dataclass
+
 from bot.services.db import require_pool
+from bot.services.locks import LOCK_LEASE_SECONDS, LOCK_OWNER, unlock
+
+
+@dataclass
+class UserContext:
+    balance: int
+    used_free: bool
+    # shu chaqiruvda tekin imkoniyat berildimi
+    granted_free: bool
+    locked: bool
 
 
 async def ensure_user(user_id: int) -> None:
@@ -15,113 +27,176 @@ async def ensure_user(user_id: int) -> None:
         )
 
 
-async def get_balance(user_id: int) -> int:
+async def get_user_context(user_id: int, *, grant_free: bool = False) -> UserContext:
+    """
+    1 ta so‘rov (1 round trip):
+    - users ga upsert
+    - grant_free=True bo‘lsa: 1 MARTA (FOREVER) tekin imkoniyat (+1 balans)
+    - balans, tekin imkoniyat holati va lock holatini qaytaradi
+    """
     pool = require_pool()
-    await ensure_user(user_id)
-
     async with pool.acquire() as conn:
         row = await conn.fetchrow(
-            "SELECT balance FROM balances WHERE user_id = $1",
+            """
+            WITH u AS (
+                INSERT INTO users (user_id)
+                VALUES ($1)
+                ON CONFLICT (user_id) DO NOTHING
+            ), f AS (
+                INSERT INTO free_tries (user_id)
+                SELECT $1 WHERE $2
+                ON CONFLICT (user_id) DO NOTHING
+                RETURNING user_id
+            ), l AS (
+                INSERT INTO balance_ledger (idempotency_key, user_id, delta, reason)
+                SELECT 'free:' || user_id, user_id, 1, 'free_try' FROM f
+                ON CONFLICT (idempotency_key) DO NOTHING
+            ), b AS (
+                INSERT INTO balances (user_id, balance)
+                SELECT user_id, 1 FROM f
+                ON CONFLICT (user_id)
+                DO UPDATE SET
+                    balance = balances.balance + 1,
+                    updated_at = now()
+                RETURNING balance
+            )
+            SELECT
+                COALESCE(
+                    (SELECT balance FROM b),
+                    (SELECT balance FROM balances WHERE user_id = $1),
+                    0
+                ) AS balance,
+                EXISTS (SELECT 1 FROM f) AS granted_free,
+                EXISTS (SELECT 1 FROM f)
+                    OR EXISTS (SELECT 1 FROM free_tries WHERE user_id = $1) AS used_free,
+                EXISTS (
+                    SELECT 1 FROM user_locks
+                    WHERE user_id = $1 AND expires_at > now()
+                ) AS locked
+            """,
             user_id,
+            grant_free,
         )
-        return int(row["balance"]) if row else 0
 
-
-async def add_balance(user_id: int, amount: int = 1) -> None:
+    return UserContext(
+        balance=int(row["balance"]),
+        used_free=row["used_free"],
+        granted_free=row["granted_free"],
+        locked=row["locked"],
+    )
+
+
+async def add_balance(
+    user_id: int,
+    amount: int = 1,
+    *,
+    idempotency_key: str,
+    reason: str = "topup",
+    ref: str | None = None,
+) -> bool:
+    """
+    1 statement: ledger yozuvi + balans.
+    Shu idempotency_key bilan avval qo‘shilgan bo‘lsa — hech narsa o‘zgarmaydi (False).
+    """
     pool = require_pool()
-    await ensure_user(user_id)
-
     async with pool.acquire() as conn:
-        await conn.execute(
+        row = await conn.fetchrow(
             """
+            WITH u AS (
+                INSERT INTO users (user_id)
+                VALUES ($1)
+                ON CONFLICT (user_id) DO NOTHING
+            ), entry AS (
+                INSERT INTO balance_ledger (idempotency_key, user_id, delta, reason, ref)
+                VALUES ($3, $1, $2, $4, $5)
+                ON CONFLICT (idempotency_key) DO NOTHING
+                RETURNING user_id, delta
+            )
             INSERT INTO balances (user_id, balance)
-            VALUES ($1, $2)
+            SELECT user_id, delta FROM entry
             ON CONFLICT (user_id)
             DO UPDATE SET
                 balance = balances.balance + EXCLUDED.balance,
                 updated_at = now()
+            RETURNING balance
             """,
             user_id,
             amount,
-        )
-
-
-async def has_used_free(user_id: int) -> bool:
-    pool = require_pool()
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow(
-            "SELECT 1 FROM free_tries WHERE user_id = $1",
-            user_id,
+            idempotency_key,
+            reason,
+            ref,
         )
         return row is not None
 
 
-async def grant_free_balance(user_id: int) -> None:
+async def lock_and_charge(user_id: int, *, essay_id: str) -> str:
     """
-    1 MARTA (FOREVER).
-    - free_tries ga yozadi
-    - balansga +1 qiladi
+    Esse qabul qilish — 1 ta statement (1 round trip): user lock + 1 tekshiruv yechish.
+    - "ok"         — lock olindi, balansdan 1 yechildi (ledger: charge:<essay_id>)
+    - "locked"     — boshqa esse tekshirilmoqda (lock band)
+    - "no_balance" — balans yetmaydi (lock olinmaydi)
     """
     pool = require_pool()
-    await ensure_user(user_id)
-
     async with pool.acquire() as conn:
-        async with conn.transaction():
-            used = await conn.fetchrow(
-                "SELECT 1 FROM free_tries WHERE user_id = $1",
-                user_id,
-            )
-            if used:
-                return
-
-            await conn.execute(
-                "INSERT INTO free_tries (user_id) VALUES ($1)",
-                user_id,
-            )
-
-            await conn.execute(
-                """
-                INSERT INTO balances (user_id, balance)
-                VALUES ($1, 1)
-                ON CONFLICT (user_id)
-                DO UPDATE SET
-                    balance = balances.balance + 1,
-                    updated_at = now()
-                """,
-                user_id,
-            )
-
-
-async def consume_balance(user_id: int) -> bool:
-    """
-    Atomic: balans >=1 bo‘lsa -1 qiladi, bo‘lmasa False.
-    """
-    pool = require_pool()
-    await ensure_user(user_id)
-
-    async with pool.acquire() as conn:
-        async with conn.transaction():
-            row = await conn.fetchrow(
-                "SELECT balance FROM balances WHERE user_id = $1 FOR UPDATE",
-                user_id,
-            )
-            if not row or int(row["balance"]) < 1:
-                return False
-
-            await conn.execute(
-                """
+        row = await conn.fetchrow(
+            """
+            WITH lk AS (
+                INSERT INTO user_locks (user_id, owner, expires_at)
+                SELECT $1, $3, now() + make_interval(secs => $4)
+                WHERE EXISTS (
+                    SELECT 1 FROM balances WHERE user_id = $1 AND balance >= 1
+                )
+                ON CONFLICT (user_id) DO UPDATE
+                SET owner        = EXCLUDED.owner,
+                    acquired_at  = now(),
+                    heartbeat_at = now(),
+                    expires_at   = EXCLUDED.expires_at
+                WHERE user_locks.expires_at <= now()
+                RETURNING user_id
+            ), charged AS (
                 UPDATE balances
                 SET balance = balance - 1,
                     updated_at = now()
-                WHERE user_id = $1
-                """,
-                user_id,
+                WHERE user_id = (SELECT user_id FROM lk)
+                  AND balance >= 1
+                RETURNING user_id
+            ), entry AS (
+                INSERT INTO balance_ledger (idempotency_key, user_id, delta, reason, ref)
+                SELECT $2, user_id, -1, 'essay_charge', $5 FROM charged
+                RETURNING entry_id
             )
-            return True
+            SELECT
+                EXISTS (SELECT 1 FROM lk)      AS acquired,
+                EXISTS (SELECT 1 FROM charged) AS charged,
+                EXISTS (
+                    SELECT 1 FROM user_locks
+                    WHERE user_id = $1 AND expires_at > now()
+                ) AS was_locked
+            """,
+            user_id,
+            f"charge:{essay_id}",
+            LOCK_OWNER,
+            LOCK_LEASE_SECONDS,
+            essay_id,
+        )
+
+    if row["charged"]:
+        return "ok"
+    if row["acquired"]:
+        # juda kam uchraydigan poyga: lock olindi, lekin balans shu orada tugadi
+        await unlock(user_id)
+        return "no_balance"
+    return "locked" if row["was_locked"] else "no_balance"
 
 
-async def refund_balance(user_id: int, amount: int = 1) -> None:
+async def refund_balance(user_id: int, amount: int = 1, *, essay_id: str) -> bool:
     """
-    OpenAI/texnik xato bo‘lsa balansni qaytarish.
+    OpenAI/texnik xato bo‘lsa balansni qaytarish (har bir esse uchun 1 marta).
     """
-    await add_balance(user_id, amount)
+    return await add_balance(
+        user_id,
+        amount,
+        idempotency_key=f"refund:{essay_id}",
+        reason="essay_refund",
+        ref=essay_id,
+    )
@@ -0,0 +1,504 @@
+# bot/services/batch_grading.py
+#
+# Offline tekshiruv (OpenAI Batch API): butun sinf yuklanganda yoki imtihon
+# haftasida javob soniyalarda kerak emas — narx esa ~2 barobar arzon.
+#
+# - /grading_mode batch: shu paytdan yuborilgan esselar essay_jobs da
+#   grading_mode='batch' bo‘lib qoladi (realtime workerlar olmaydi)
+# - submit: yig‘ilgan esselar (prescreen / cache'dan o‘tmaganlari) bitta JSONL ga,
+#   realtime bilan bir xil prompt va parametrlar -> files + batches
+# - poll: tayyor natijalar essay_jobs.ai_result ga yoziladi va job realtime
+#   navbatga qaytadi — admin chat va essay_reviews odatdagi worker orqali
+# - xato qatorlar / muddati o‘tgan (yoki OpenAI'da topilmagan) batch: esselar
+#   oddiy (realtime) tekshiruvga qaytadi
+#
+# Lokal test: python -m bot.tools.fake_batch_server
+#             OPENAI_BATCH_BASE_URL=http://127.0.0.1:8787/v1
+
+import os
+import io
+import json
+import uuid
+from typing import Dict, List, Optional
+
+from openai import AsyncOpenAI, NotFoundError
+
+from bot.services.db import require_pool
+from bot.services.essay_checker import (
+    EssayCheckResult,
+    rubric_batch_body,
+    rubric_result_from_body,
+)
+from bot.services.essay_queue import NOTIFY_CHANNEL
+from bot.services.grading_cache import cache_key, cached_keys, put_cached
+from bot.services.grading_calls import record_calls
+from bot.services.openai_client import OPENAI_API_KEY, get_client
+from bot.services.prescreen import prescreen
+from bot.services.settings import get_setting, set_setting
+
+GRADING_MODES = ("realtime", "batch")
+
+# Bitta batch'dagi eng ko‘p esse
+BATCH_MAX_ESSAYS = int(os.getenv("BATCH_MAX_ESSAYS", "500"))
+# Shuncha esse yig‘ilsa — darhol yuboriladi...
+BATCH_MIN_ESSAYS = int(os.getenv("BATCH_MIN_ESSAYS", "20"))
+# ...aks holda eng eski esse shuncha kutgach (sekund)
+BATCH_MAX_WAIT_SECONDS = int(os.getenv("BATCH_MAX_WAIT_SECONDS", "900"))
+# submit + poll tsikli (scheduler)
+BATCH_POLL_SECONDS = int(os.getenv("BATCH_POLL_SECONDS", "60"))
+BATCH_COMPLETION_WINDOW = os.getenv("BATCH_COMPLETION_WINDOW", "24h")
+# Shundan eski ochiq batch bekor qilinadi, esselari realtime tekshiruvga o‘tadi
+# (completion window + OpenAI'ning yakunlash vaqti)
+BATCH_MAX_AGE_HOURS = float(os.getenv("BATCH_MAX_AGE_HOURS", "26"))
+# Yuborish (upload + batches.create) shundan uzoq "submitting:" holatida qolsa —
+# process o‘lgan deb hisoblanadi, esselar qayta yig‘ishga qaytadi (sekund)
+BATCH_SUBMIT_TIMEOUT_SECONDS = int(os.getenv("BATCH_SUBMIT_TIMEOUT_SECONDS", "600"))
+# Bo‘sh — OpenAI; lokal test uchun bot.tools.fake_batch_server manzili
+OPENAI_BATCH_BASE_URL = os.getenv("OPENAI_BATCH_BASE_URL", "").strip()
+
+_TERMINAL = ("completed", "failed", "expired", "cancelled")
+# Yuborilayotgan esselar: batch_id = "submitting:<uuid>" (haqiqiy id hali yo‘q)
+_SUBMITTING = "submitting:"
+
+_batch_client: Optional[AsyncOpenAI] = None
+
+
+def _client() -> AsyncOpenAI:
+    global _batch_client
+    if not OPENAI_BATCH_BASE_URL:
+        return get_client()
+    if _batch_client is None:
+        _batch_client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BATCH_BASE_URL)
+    return _batch_client
+
+
+# ============================================================
+# Mode (admin: /grading_mode)
+# ============================================================
+
+async def get_grading_mode() -> str:
+    mode = await get_setting("grading_mode", "realtime")
+    return mode if mode in GRADING_MODES else "realtime"
+
+
+async def set_grading_mode(mode: str) -> None:
+    if mode not in GRADING_MODES:
+        raise ValueError(f"grading_mode: {mode}")
+    await set_setting("grading_mode", mode)
+
+
+# ============================================================
+# Submit
+# ============================================================
+
+async def _to_realtime(conn, job_ids: List[int]) -> None:
+    """
+    Batch'siz tekshiriladi (STOP / cache hit / batch xatosi) — odatdagi navbatga.
+    NOTIFY: payload shard raqami emas — barcha workerlar uyg‘onadi.
+    """
+    if not job_ids:
+        return
+    await conn.execute(
+        """
+        UPDATE essay_jobs
+        SET grading_mode = 'realtime',
+            run_after    = now(),
+            updated_at   = now()
+        WHERE job_id = ANY($1::bigint[])
+        """,
+        job_ids,
+    )
+    await conn.execute("SELECT pg_notify($1, $2)", NOTIFY_CHANNEL, "batch")
+
+
+async def _claim_pending() -> Optional[tuple]:
+    """
+    Qisqa tranzaksiya (tarmoq / cache so‘rovlarisiz): esselarni
+    "submitting:<uuid>" bilan band qiladi. -> (placeholder, qatorlar) yoki None.
+    """
+    placeholder = f"{_SUBMITTING}{uuid.uuid4().hex}"
+
+    pool = require_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            # yuborish paytida o‘lgan process qoldirgan band qilishlar
+            await conn.execute(
+                """
+                UPDATE essay_jobs
+                SET batch_id   = NULL,
+                    updated_at = now()
+                WHERE batch_id LIKE $1 || '%'
+                  AND status = 'queued'
+                  AND updated_at < now() - make_interval(secs => $2)
+                """,
+                _SUBMITTING,
+                BATCH_SUBMIT_TIMEOUT_SECONDS,
+            )
+
+            pending = await conn.fetch(
+                """
+                SELECT job_id,
+                       created_at < now() - make_interval(secs => $2) AS overdue
+                FROM essay_jobs
+                WHERE status = 'queued'
+                  AND grading_mode = 'batch'
+                  AND batch_id IS NULL
+                ORDER BY job_id
+                FOR UPDATE SKIP LOCKED
+                LIMIT $1
+                """,
+                BATCH_MAX_ESSAYS,
+                BATCH_MAX_WAIT_SECONDS,
+            )
+            if not pending:
+                return None
+            if len(pending) < BATCH_MIN_ESSAYS and not pending[0]["overdue"]:
+                return None
+
+            rows = await conn.fetch(
+                """
+                UPDATE essay_jobs
+                SET batch_id   = $1,
+                    updated_at = now()
+                WHERE job_id = ANY($2::bigint[])
+                RETURNING job_id, essay_id, topic, essay_text, bypass_cache
+                """,
+                placeholder,
+                [r["job_id"] for r in pending],
+            )
+
+    return placeholder, sorted(rows, key=lambda r: r["job_id"])
+
+
+async def _build_input(rows) -> tuple:
+    """
+    Tranzaksiyadan tashqarida: STOP / cache'dagi esselar realtime'ga qaytadi
+    (cache — bitta so‘rov bilan), qolganlari JSONL ga.
+    -> (batched job_id'lar, JSONL, realtime soni)
+    """
+    keys = {
+        r["job_id"]: cache_key(r["topic"], r["essay_text"])
+        for r in rows
+        if not r["bypass_cache"]
+    }
+    hits = await cached_keys(list(keys.values()))
+
+    realtime: List[int] = []
+    batched: List[int] = []
+    lines = io.BytesIO()
+
+    for r in rows:
+        # 🛑 STOP yoki ♻️ avval tekshirilgan — OpenAI kerak emas
+        if keys.get(r["job_id"]) in hits or prescreen(r["topic"], r["essay_text"]) is not None:
+            realtime.append(r["job_id"])
+            continue
+
+        batched.append(r["job_id"])
+        line = {
+            "custom_id": r["essay_id"],
+            "method": "POST",
+            "url": "/v1/responses",
+            "body": rubric_batch_body(r["topic"], r["essay_text"]),
+        }
+        lines.write(json.dumps(line, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    if realtime:
+        pool = require_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    "UPDATE essay_jobs SET batch_id = NULL WHERE job_id = ANY($1::bigint[])",
+                    realtime,
+                )
+                await _to_realtime(conn, realtime)
+
+    return batched, lines.getvalue(), len(realtime)
+
+
+async def submit_pending() -> Optional[str]:
+    """
+    Yig‘ilgan batch esselarni bitta OpenAI batch qilib yuboradi.
+    Hali erta bo‘lsa (kam esse va eng eskisi ham yangi) — None.
+
+    1) _claim_pending — qisqa tranzaksiya, esselar placeholder bilan band
+    2) STOP / cache filtri, upload + batches.create — tranzaksiyasiz
+    3) haqiqiy batch_id yoziladi; 2) xato bo‘lsa — band qilish bekor qilinadi
+    """
+    claimed = await _claim_pending()
+    if claimed is None:
+        return None
+    placeholder, rows = claimed
+
+    pool = require_pool()
+    try:
+        batched, content, realtime = await _build_input(rows)
+        if not batched:
+            return None
+
+        client = _client()
+        input_file = await client.files.create(
+            file=("essays.jsonl", content),
+            purpose="batch",
+        )
+        batch = await client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/responses",
+            completion_window=BATCH_COMPLETION_WINDOW,
+            metadata={"source": "esse-bot", "claim": placeholder},
+        )
+    except Exception:
+        # esselar keyingi tsiklda qayta yig‘iladi
+        async with pool.acquire() as conn:
+            await conn.execute(
+                "UPDATE essay_jobs SET batch_id = NULL, updated_at = now() WHERE batch_id = $1",
+                placeholder,
+            )
+        raise
+
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute(
+                """
+                INSERT INTO grading_batches (batch_id, input_file_id, status, essay_count)
+                VALUES ($1, $2, $3, $4)
+                """,
+                batch.id,
+                input_file.id,
+                batch.status,
+                len(batched),
+            )
+            await conn.execute(
+                """
+                UPDATE essay_jobs
+                SET batch_id   = $1,
+                    updated_at = now()
+                WHERE batch_id = $2
+                """,
+                batch.id,
+                placeholder,
+            )
+
+    print(f"📦 Batch yuborildi: {batch.id} ({len(batched)} esse, {realtime} tasi realtime)")
+    return batch.id
+
+
+# ============================================================
+# Poll
+# ============================================================
+
+async def _read_file(file_id: Optional[str]) -> str:
+    if not file_id:
+        return ""
+    content = await _client().files.content(file_id)
+    return content.text
+
+
+def _parse_output(raw: str) -> Dict[str, EssayCheckResult]:
+    """
+    Output JSONL: {"custom_id": essay_id, "response": {"status_code", "body"}, "error"}.
+    Xato / formatsiz qatorlar tashlab ketiladi (esse realtime tekshiruvga qaytadi).
+    """
+    results: Dict[str, EssayCheckResult] = {}
+    for line in raw.splitlines():
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            response = item.get("response") or {}
+            if item.get("error") or response.get("status_code") != 200:
+                print(f"⚠️ batch qator xatosi ({item.get('custom_id')}): {item.get('error')}")
+                continue
+            results[item["custom_id"]] = rubric_result_from_body(response["body"])
+        except Exception as e:
+            print(f"⚠️ batch qatorini o‘qib bo‘lmadi: {e}")
+    return results
+
+
+async def _finish_batch(batch) -> None:
+    results = _parse_output(await _read_file(batch.output_file_id))
+
+    pool = require_pool()
+    async with pool.acquire() as conn:
+        jobs = await conn.fetch(
+            """
+            SELECT job_id, essay_id, topic, essay_text
+            FROM essay_jobs
+            WHERE batch_id = $1 AND grading_mode = 'batch' AND status = 'queued'
+            """,
+            batch.id,
+        )
+        done = [j for j in jobs if j["essay_id"] in results]
+        missing = [j["job_id"] for j in jobs if j["essay_id"] not in results]
+
+        async with conn.transaction():
+            # natija tayyor — worker faqat yetkazadi (admin chat + essay_reviews)
+            await conn.execute(
+                """
+                UPDATE essay_jobs j
+                SET ai_result    = u.ai_result,
+                    grading_mode = 'realtime',
+                    run_after    = now(),
+                    updated_at   = now()
+                FROM unnest($1::bigint[], $2::text[]) AS u(job_id, ai_result)
+                WHERE j.job_id = u.job_id
+                """,
+                [j["job_id"] for j in done],
+                [results[j["essay_id"]].text for j in done],
+            )
+            await _to_realtime(conn, missing)
+            await conn.execute("SELECT pg_notify($1, $2)", NOTIFY_CHANNEL, "batch")
+            await conn.execute(
+                """
+                UPDATE grading_batches
+                SET status          = $2,
+                    output_file_id  = $3,
+                    error_file_id   = $4,
+                    completed_count = $5,
+                    failed_count    = $6,
+                    updated_at      = now(),
+                    finished_at     = now()
+                WHERE batch_id = $1
+                """,
+                batch.id,
+                batch.status,
+                batch.output_file_id,
+                batch.error_file_id,
+                len(done),
+                len(missing),
+            )
+
+    for j in done:
+        result = results[j["essay_id"]]
+        try:
+            await put_cached(cache_key(j["topic"], j["essay_text"]), result.text)
+            await record_calls(j["essay_id"], result.calls)
+        except Exception as e:
+            print(f"⚠️ batch natija ERROR ({j['essay_id']}): {e}")
+
+    print(
+        f"📦 Batch {batch.id} ({batch.status}): {len(done)} ta natija, "
+        f"{len(missing)} tasi realtime tekshiruvga qaytdi"
+    )
+
+
+async def _abandon_batch(batch_id: str, status: str) -> None:
+    """
+    Natija kutilmaydi (OpenAI'da yo‘q / juda eski) — esselar realtime tekshiruvga.
+    """
+    pool = require_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            job_ids = [
+                r["job_id"]
+                for r in await conn.fetch(
+                    """
+                    SELECT job_id
+                    FROM essay_jobs
+                    WHERE batch_id = $1 AND grading_mode = 'batch' AND status = 'queued'
+                    """,
+                    batch_id,
+                )
+            ]
+            await _to_realtime(conn, job_ids)
+            await conn.execute(
+                """
+                UPDATE grading_batches
+                SET status       = $2,
+                    failed_count = $3,
+                    updated_at   = now(),
+                    finished_at  = now()
+                WHERE batch_id = $1
+                """,
+                batch_id,
+                status,
+                len(job_ids),
+            )
+
+    print(f"📦 Batch {batch_id} ({status}): {len(job_ids)} ta esse realtime tekshiruvga qaytdi")
+
+
+async def _poll_batch(batch_id: str, too_old: bool) -> None:
+    try:
+        batch = await _client().batches.retrieve(batch_id)
+    except NotFoundError:
+        await _abandon_batch(batch_id, "failed")
+        return
+
+    if batch.status in _TERMINAL:
+        await _finish_batch(batch)
+        return
+
+    if too_old:
+        # keyin natija kelsa ham ikki marta to‘lamaslik uchun — bekor qilamiz
+        try:
+            await _client().batches.cancel(batch_id)
+        except Exception as e:
+            print(f"⚠️ batch cancel ERROR ({batch_id}): {e}")
+        await _abandon_batch(batch_id, "expired")
+        return
+
+    await require_pool().execute(
+        "UPDATE grading_batches SET status = $2, updated_at = now() WHERE batch_id = $1",
+        batch.id,
+        batch.status,
+    )
+
+
+async def poll_batches() -> None:
+    """
+    Har batch alohida: bittasining xatosi qolganlarini to‘xtatmaydi.
+    """
+    pool = require_pool()
+    rows = await pool.fetch(
+        """
+        SELECT batch_id,
+               created_at < now() - make_interval(secs => $2) AS too_old
+        FROM grading_batches
+        WHERE status <> ALL($1::text[])
+        """,
+        list(_TERMINAL),
+        BATCH_MAX_AGE_HOURS * 3600,
+    )
+
+    for row in rows:
+        try:
+            await _poll_batch(row["batch_id"], row["too_old"])
+        except Exception as e:
+            print(f"⚠️ batch poll ERROR ({row['batch_id']}): {e}")
+
+
+async def run_batch_cycle() -> None:
+    """
+    Scheduler: tayyor batch'larni yig‘ib olish, keyin yangilarini yuborish.
+    Poll xatosi submit'ni to‘xtatmaydi (va aksincha).
+    """
+    try:
+        await poll_batches()
+    except Exception as e:
+        print(f"⚠️ batch poll ERROR: {e}")
+
+    try:
+        while await submit_pending():
+            pass
+    except Exception as e:
+        print(f"⚠️ batch submit ERROR: {e}")
+
+
+async def batch_stats() -> dict:
+    pool = require_pool()
+    row = await pool.fetchrow(
+        """
+        SELECT
+            (SELECT count(*) FROM essay_jobs
+             WHERE status = 'queued' AND grading_mode = 'batch'
+               AND (batch_id IS NULL OR batch_id LIKE $2 || '%')) AS waiting,
+            (SELECT count(*) FROM essay_jobs
+             WHERE status = 'queued' AND grading_mode = 'batch'
+               AND batch_id NOT LIKE $2 || '%') AS submitted,
+            (SELECT count(*) FROM grading_batches
+             WHERE status <> ALL($1::text[])) AS open_batches
+        """,
+        list(_TERMINAL),
+        _SUBMITTING,
+    )
+    return dict(row)
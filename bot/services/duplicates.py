@@ -0,0 +1,258 @@
+# bot/services/duplicates.py
+#
+# Ko‘chirilgan / deyarli bir xil esselarni topish (MinHash + LSH).
+# - imzo: 5 so‘zli shingle'lar, one-permutation MinHash (64 ta qiymat, bitta o‘tish)
+# - indeks: 16 band x 4 qator; nomzodlar imzo o‘xshashligi bilan tekshiriladi
+# - essay_signatures jadvali — manba; har bir process o‘z xotirasidagi indeksni
+#   seq bo‘yicha yangilab boradi (boshqa workerlar yozganlari ham ko‘rinadi)
+#
+# To‘liq qayta qurish: python -m bot.tools.rebuild_duplicates
+
+import os
+import re
+import time
+import asyncio
+import hashlib
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from bot.services.db import require_pool
+
+DUPLICATE_ENABLED = os.getenv("DUPLICATE_ENABLED", "1") == "1"
+# Shundan yuqori taxminiy Jaccard o‘xshashlik — "o‘xshash esse"
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.7"))
+
+SHINGLE_WORDS = 5
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+
+_BIN_BITS = 6  # 2**6 = NUM_HASHES
+_VALUE_MASK = (1 << 32) - 1
+_EMPTY = 1 << 63
+
+# DB dan bir martada o‘qiladigan imzolar
+_SYNC_BATCH = 2000
+# seq commit tartibida kelmasligi mumkin: yangi qatorlar shu vaqtgacha qayta o‘qiladi
+_SYNC_SETTLE_SECONDS = 10
+
+_APOSTROPHES = re.compile(r"[‘’`ʻʼ']")
+_WORD = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+
+Signature = Tuple[int, ...]
+
+
+@dataclass
+class DuplicateMatch:
+    essay_id: str
+    user_id: int
+    score: float
+
+
+# ============================================================
+# Signature
+# ============================================================
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(_APOSTROPHES.sub("'", (text or "").casefold()))
+
+
+def signature(text: str) -> Optional[Signature]:
+    """
+    One-permutation MinHash: har bir shingle hash'i yuqori bitlari bo‘yicha
+    bin'ga tushadi, bin'da eng kichik qiymat qoladi. Bo‘sh bin'lar
+    keyingi to‘la bin'dan (masofa bilan) to‘ldiriladi.
+    """
+    words = _words(text)
+    if len(words) < SHINGLE_WORDS:
+        return None
+
+    bins = [_EMPTY] * NUM_HASHES
+    for i in range(len(words) - SHINGLE_WORDS + 1):
+        shingle = " ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8")
+        h = int.from_bytes(hashlib.blake2b(shingle, digest_size=8).digest(), "big")
+        b = h >> (64 - _BIN_BITS)
+        v = h & _VALUE_MASK
+        if v < bins[b]:
+            bins[b] = v
+
+    # densification (rotation)
+    for i in range(NUM_HASHES):
+        if bins[i] != _EMPTY:
+            continue
+        for step in range(1, NUM_HASHES):
+            j = (i + step) % NUM_HASHES
+            if bins[j] <= _VALUE_MASK:
+                bins[i] = bins[j] + (step << 32)
+                break
+
+    return tuple(bins)
+
+
+def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_HASHES
+
+
+def pack(sig: Signature) -> bytes:
+    return array("Q", sig).tobytes()
+
+
+def unpack(raw: bytes) -> Signature:
+    arr = array("Q")
+    arr.frombytes(raw)
+    return tuple(arr)
+
+
+# ============================================================
+# In-memory LSH index
+# ============================================================
+
+class _Index:
+    def __init__(self) -> None:
+        # essay_id -> (user_id, signature)
+        self.sigs: Dict[str, Tuple[int, Signature]] = {}
+        # (band, band qiymatlari) -> essay_id'lar
+        self.buckets: Dict[Tuple[int, Signature], List[str]] = {}
+        self.last_seq = 0
+
+    def add(self, essay_id: str, user_id: int, sig: Signature) -> None:
+        if essay_id in self.sigs:
+            if self.sigs[essay_id] == (user_id, sig):
+                return
+            self._remove(essay_id)
+
+        self.sigs[essay_id] = (user_id, sig)
+        for band in range(BANDS):
+            key = (band, sig[band * ROWS:(band + 1) * ROWS])
+            self.buckets.setdefault(key, []).append(essay_id)
+
+    def _remove(self, essay_id: str) -> None:
+        _, sig = self.sigs.pop(essay_id)
+        for band in range(BANDS):
+            key = (band, sig[band * ROWS:(band + 1) * ROWS])
+            bucket = self.buckets.get(key)
+            if bucket and essay_id in bucket:
+                bucket.remove(essay_id)
+                if not bucket:
+                    del self.buckets[key]
+
+    def query(self, sig: Signature, *, exclude_user: Optional[int]) -> Optional[DuplicateMatch]:
+        seen = set()
+        best: Optional[DuplicateMatch] = None
+
+        for band in range(BANDS):
+            for essay_id in self.buckets.get((band, sig[band * ROWS:(band + 1) * ROWS]), ()):
+                if essay_id in seen:
+                    continue
+                seen.add(essay_id)
+
+                user_id, other = self.sigs[essay_id]
+                if user_id == exclude_user:
+                    continue
+
+                score = similarity(sig, other)
+                if score >= DUPLICATE_THRESHOLD and (best is None or score > best.score):
+                    best = DuplicateMatch(essay_id, user_id, score)
+
+        return best
+
+
+_index = _Index()
+_sync_lock = asyncio.Lock()
+_stats = {"checks": 0, "flagged": 0, "lookup_us_total": 0.0}
+
+
+async def _sync() -> None:
+    """
+    essay_signatures dan yangi (seq > last_seq) qatorlarni indeksga qo‘shadi.
+    Birinchi chaqiruvda butun jadval bo‘laklab o‘qiladi.
+    last_seq faqat "o‘rnashgan" qatorlar bo‘yicha suriladi — parallel
+    tranzaksiyalar kichikroq seq'ni kechroq commit qilsa ham tushib qolmaydi.
+    """
+    async with _sync_lock:
+        pool = require_pool()
+        after = _index.last_seq
+        settled = True
+
+        while True:
+            rows = await pool.fetch(
+                """
+                SELECT seq, essay_id, user_id, minhash,
+                       created_at < now() - make_interval(secs => $3) AS settled
+                FROM essay_signatures
+                WHERE seq > $1
+                ORDER BY seq
+                LIMIT $2
+                """,
+                after,
+                _SYNC_BATCH,
+                _SYNC_SETTLE_SECONDS,
+            )
+            for r in rows:
+                _index.add(r["essay_id"], r["user_id"], unpack(r["minhash"]))
+                settled = settled and r["settled"]
+                if settled:
+                    _index.last_seq = r["seq"]
+                after = r["seq"]
+
+            if len(rows) < _SYNC_BATCH:
+                return
+
+
+# ============================================================
+# Public API
+# ============================================================
+
+async def find_duplicate(sig: Optional[Signature], *, user_id: int) -> Optional[DuplicateMatch]:
+    """
+    Boshqa foydalanuvchining avvalgi essesiga deyarli bir xil bo‘lsa — DuplicateMatch.
+    (O‘z essesini qayta yuborish ko‘chirish hisoblanmaydi.)
+    """
+    if not DUPLICATE_ENABLED or sig is None:
+        return None
+
+    await _sync()
+
+    started = time.perf_counter()
+    match = _index.query(sig, exclude_user=user_id)
+    _stats["lookup_us_total"] += (time.perf_counter() - started) * 1_000_000
+    _stats["checks"] += 1
+
+    if match is not None:
+        _stats["flagged"] += 1
+    return match
+
+
+async def index_essay(essay_id: str, user_id: int, sig: Optional[Signature]) -> None:
+    """
+    essay_reviews ga yozilgandan keyin chaqiriladi (inkremental yangilash).
+    """
+    if not DUPLICATE_ENABLED or sig is None:
+        return
+
+    pool = require_pool()
+    seq = await pool.fetchval(
+        """
+        INSERT INTO essay_signatures (essay_id, user_id, minhash)
+        VALUES ($1, $2, $3)
+        ON CONFLICT (essay_id) DO NOTHING
+        RETURNING seq
+        """,
+        essay_id,
+        user_id,
+        pack(sig),
+    )
+    if seq is not None:
+        _index.add(essay_id, user_id, sig)
+
+
+def duplicate_stats() -> dict:
+    checks = _stats["checks"]
+    return {
+        "enabled": DUPLICATE_ENABLED,
+        "indexed": len(_index.sigs),
+        "checks": checks,
+        "flagged": _stats["flagged"],
+        "avg_lookup_us": (_stats["lookup_us_total"] / checks) if checks else 0.0,
+    }
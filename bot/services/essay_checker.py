@@ -1,21 +1,68 @@
 # bot/services/essay_checker.py
 import os
+import json
 import asyncio
+import hashlib
+from collections import deque
+from dataclasses import dataclass, field
 from typing import Any, Optional, List
 
 from dotenv import load_dotenv
-from openai import OpenAI, OpenAIError
+from openai import OpenAIError
+
+from bot.services.openai_client import (
+    CallTiming,
+    OpenAIOverloaded,
+    OpenAIStreamError,
+    get_client,
+    openai_stats,
+    with_retries,
+)
+from bot.services.rubric import (
+    RUBRIC_JSON_SCHEMA,
+    STOP_TOTALS,
+    RubricResult,
+    render_stop,
+)
 
 load_dotenv()
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-5-mini")
 DEBUG_OPENAI = os.getenv("DEBUG_OPENAI", "0") == "1"
 
-if not OPENAI_API_KEY:
-    raise RuntimeError("OPENAI_API_KEY topilmadi. .env faylga OPENAI_API_KEY=... qo‘ying.")
-
-client = OpenAI(api_key=OPENAI_API_KEY)
+# "text" — model hisobotni o‘zi yozadi; "json" — ballar + izohlar JSON'da,
+# jami ball / 75 shkala / hisobot matni lokal (bot/services/rubric.py)
+RUBRIC_OUTPUT = os.getenv("RUBRIC_OUTPUT", "text").strip().lower()
+if RUBRIC_OUTPUT not in ("text", "json"):
+    raise RuntimeError("RUBRIC_OUTPUT faqat 'text' yoki 'json' bo‘lishi mumkin!")
+
+TEXT_MAX_OUTPUT_TOKENS = 3800
+
+# Ikki bosqich: arzon model avval STOP holatlarini (mavzuga mosligi ham) tekshiradi,
+# o‘tgan esselargina to‘liq rubrika modeliga boradi. Bo‘sh — o‘chirilgan.
+OPENAI_TRIAGE_MODEL = os.getenv("OPENAI_TRIAGE_MODEL", "").strip()
+TRIAGE_MAX_OUTPUT_TOKENS = int(os.getenv("TRIAGE_MAX_OUTPUT_TOKENS", "300"))
+# reasoning modellari uchun; bo‘sh — parametr yuborilmaydi (gpt-4.1-nano va h.k.)
+TRIAGE_REASONING_EFFORT = os.getenv("TRIAGE_REASONING_EFFORT", "minimal").strip()
+JSON_MAX_OUTPUT_TOKENS = int(os.getenv("RUBRIC_JSON_MAX_OUTPUT_TOKENS", "2000"))
+
+# Hedging: rubrika chaqiruvi oxirgi javoblarning shu percentilidan uzoq cho‘zilsa —
+# ikkinchi so‘rov (fallback model yoki o‘sha model) yuboriladi, birinchi kelgani olinadi,
+# ikkinchisi bekor qilinadi. 0 — o‘chirilgan.
+OPENAI_HEDGE_PERCENTILE = float(os.getenv("OPENAI_HEDGE_PERCENTILE", "0"))
+# Statistika yetarli bo‘lmaguncha (va eng kamida) shu deadline ishlatiladi
+OPENAI_HEDGE_MIN_MS = int(os.getenv("OPENAI_HEDGE_MIN_MS", "30000"))
+# Hedge'lar rubrika chaqiruvlarining shu ulushidan oshmaydi (yuklama portlamasin)
+OPENAI_HEDGE_MAX_RATIO = float(os.getenv("OPENAI_HEDGE_MAX_RATIO", "0.1"))
+# Bo‘sh — OPENAI_MODEL ning o‘zi
+OPENAI_FALLBACK_MODEL = os.getenv("OPENAI_FALLBACK_MODEL", "").strip()
+# reasoning modellari uchun; bo‘sh — parametr yuborilmaydi
+FALLBACK_REASONING_EFFORT = os.getenv("FALLBACK_REASONING_EFFORT", "low").strip()
+
+# percentil uchun oxirgi rubrika javob vaqtlari (ms)
+_HEDGE_MIN_SAMPLES = 20
+_rubric_latencies: deque = deque(maxlen=200)
+_hedge_stats = {"calls": 0, "hedged": 0, "hedge_won": 0}
 
 RUBRIC_PROMPT = """
 You are a strict, professional Uzbek (Ona tili va adabiyot) national certification essay examiner.
@@ -472,8 +519,75 @@ UMUMIY XULOSA:
 [Qat’iy, ustozona yakun]
 """
 
+# JSON rejimi: STEP 0–2 o‘zgarmaydi; STEP 3 (jami / matritsa) va OUTPUT FORMAT
+# o‘rniga JSON qoidalari (hisob-kitob lokal).
+RUBRIC_JSON_PROMPT = RUBRIC_PROMPT.split(
+    "========================================================\nSTEP 3"
+)[0] + """========================================================
+OUTPUT FORMAT (JSON)
+
+Return ONLY a JSON object that matches the provided schema.
+Do NOT calculate the total or the 75 scale — they are calculated separately.
+
+stop_reason: if a STOP CASE is triggered, the exact reason
+(mavzuga mos emas / 100 so‘zdan kam / ko‘chirilgan / esse yo‘q / faqat kirish / to‘liq kirill);
+then set every score to 0, every comment to "", recommendations to [] and conclusion to "".
+Otherwise stop_reason MUST be null.
+
+scores: the 12 criteria of STEP 2, each exactly 2 / 1.5 / 1 / 0.5 / 0.
+
+comments (MATN BO‘YICHA IZOHLAR):
+kirish: 3 gap talabi, 2 qarash, so‘roq gap
+asosiy_qism: 3 xatboshi/abzast, 2-xatboshi maqol/ibora bilan boshlanishi, dalillar
+xulosa: “Xulosa qilib aytganda”, tanlangan tomon, foyda 1 gap, “zero”dan keyin maqol/sitata + statistika
+imlo: 2–3 ta eng muhim imlo xatosi misoli
+punktuatsiya: 2–3 ta eng muhim tinish belgisi xatosi misoli
+
+recommendations: exactly 5 items (BALLNI OSHIRISH UCHUN TAVSIYALAR).
+
+conclusion: UMUMIY XULOSA — qat’iy, ustozona yakun.
+
+All text values in Uzbek, following the CRITICAL OUTPUT RULES and TERMINOLOGY RULE.
+"""
+
+ACTIVE_PROMPT = RUBRIC_JSON_PROMPT if RUBRIC_OUTPUT == "json" else RUBRIC_PROMPT
+
+TRIAGE_PROMPT = """
+You are a strict Uzbek (Ona tili va adabiyot) national certification essay examiner.
+Do ONLY a quick pre-check (STEP 0 — STOP CASES). Do NOT grade the essay.
 
+STOP reasons (use the exact text):
+- mavzuga mos emas: the essay is written but does NOT match the given topic
+- ko‘chirilgan: the essay substantially repeats the situation text or contains large verbatim blocks obviously not original
+- 100 so‘zdan kam: fewer than 100 words (count by splitting on whitespace)
+- esse yo‘q: the essay is empty / not written
+- faqat kirish: only the introduction is written, other parts are missing
+- to‘liq kirill: the essay is fully written in Cyrillic alphabet
 
+Set stop_reason ONLY if you are certain. If in doubt — stop_reason MUST be null.
+"""
+
+TRIAGE_JSON_SCHEMA = {
+    "type": "object",
+    "additionalProperties": False,
+    "required": ["stop_reason"],
+    "properties": {
+        "stop_reason": RUBRIC_JSON_SCHEMA["properties"]["stop_reason"],
+    },
+}
+
+# Prompt (yoki rejim) o‘zgarsa — versiya ham o‘zgaradi (cache kalitlari eskiradi).
+# Qo‘lda belgilash ham mumkin: RUBRIC_PROMPT_VERSION=v2
+_version_source = ACTIVE_PROMPT
+if RUBRIC_OUTPUT == "json":
+    _version_source += json.dumps(RUBRIC_JSON_SCHEMA, sort_keys=True)
+if OPENAI_TRIAGE_MODEL:
+    _version_source += OPENAI_TRIAGE_MODEL + TRIAGE_PROMPT
+
+RUBRIC_PROMPT_VERSION = (
+    os.getenv("RUBRIC_PROMPT_VERSION")
+    or hashlib.sha256(_version_source.encode("utf-8")).hexdigest()[:12]
+)
 
 
 def _get(obj: Any, key: str, default=None):
@@ -517,41 +631,385 @@ def _extract_text(response: Any) -> Optional[str]:
     return joined if joined else None
 
 
-async def check_essay(topic: str, essay_text: str) -> str:
-    user_input = f"""MAVZU:
+@dataclass
+class EssayCheckResult:
+    text: str
+    calls: List[CallTiming] = field(default_factory=list)
+    # faqat JSON rejimida
+    rubric: Optional[RubricResult] = None
+
+
+def _json_format(name: str, schema: dict) -> dict:
+    return {
+        "format": {
+            "type": "json_schema",
+            "name": name,
+            "schema": schema,
+            "strict": True,
+        }
+    }
+
+
+def _prompt_cache_key(stage: str) -> str:
+    """
+    Prompt-prefix cache: instructions (statik prompt) doim birinchi va o‘zgarmas,
+    o‘zgaruvchi qism (mavzu + esse) faqat input'da. Bir xil kalit so‘rovlarni
+    bitta cache'ga yo‘naltiradi; prompt o‘zgarsa kalit ham o‘zgaradi.
+    """
+    return f"esse-{stage}-{RUBRIC_PROMPT_VERSION}"
+
+
+def _fill_usage(timing: CallTiming, response: Any) -> None:
+    usage = _get(response, "usage", None)
+    timing.input_tokens = int(_get(usage, "input_tokens", 0) or 0)
+    timing.output_tokens = int(_get(usage, "output_tokens", 0) or 0)
+    timing.cached_tokens = int(
+        _get(_get(usage, "input_tokens_details", None), "cached_tokens", 0) or 0
+    )
+    timing.reasoning_tokens = int(
+        _get(_get(usage, "output_tokens_details", None), "reasoning_tokens", 0) or 0
+    )
+
+
+async def _stream_response(sink, request: dict) -> Any:
+    """
+    stream=True: har bir matn bo‘lagi sink.feed() ga; oxirida to‘liq response (usage bilan).
+    Har urinish boshida sink.reset() — qayta urinishda matn ikki marta yig‘ilmaydi.
+    sink.feed() faqat bufferga yozadi — Telegram'ga yuborish slot tashqarisida.
+    response.failed / error -> OpenAIStreamError (with_retries kod bo‘yicha qayta urinadi).
+    """
+    await sink.reset()
+    final = None
+
+    stream = await get_client().responses.create(stream=True, **request)
+    try:
+        async for event in stream:
+            etype = _get(event, "type", None)
+            if etype == "response.output_text.delta":
+                await sink.feed(_get(event, "delta", "") or "")
+            elif etype in ("response.completed", "response.incomplete"):
+                final = _get(event, "response", None)
+            elif etype == "response.failed":
+                error = _get(_get(event, "response", None), "error", None)
+                raise OpenAIStreamError(
+                    f"OpenAI stream xatosi: {_get(error, 'message', etype)}",
+                    code=_get(error, "code", None),
+                )
+            elif etype == "error":
+                raise OpenAIStreamError(
+                    f"OpenAI stream xatosi: {_get(event, 'message', etype)}",
+                    code=_get(event, "code", None),
+                )
+    finally:
+        # ulanish pool'ga qaytadi (xato / cancel bo‘lsa ham)
+        await stream.close()
+
+    if final is None:
+        raise OpenAIStreamError("OpenAI stream yakunlanmadi")
+    return final
+
+
+async def _call(
+    timing: CallTiming,
+    cache_stage: Optional[str] = None,
+    sink=None,
+    **request,
+) -> Any:
+    """
+    Bitta Responses API chaqiruvi: moslashuvchan concurrency limit + deadline +
+    qayta urinishlar (429 / 5xx / timeout) + tokenlar.
+    sink berilsa — javob stream qilinadi (qarang: check_essay_streaming).
+    """
+    extra_body = dict(request.pop("extra_body", None) or {})
+    extra_body["prompt_cache_key"] = _prompt_cache_key(cache_stage or timing.stage)
+    request["extra_body"] = extra_body
+
+    if sink is not None:
+        timing.stream = True
+        response = await with_retries(timing, lambda: _stream_response(sink, request))
+    else:
+        response = await with_retries(timing, lambda: get_client().responses.create(**request))
+
+    _fill_usage(timing, response)
+
+    print(
+        f"⏱ OpenAI {timing.stage}/{timing.model}: "
+        f"navbat={timing.queue_wait_ms}ms, model={timing.latency_ms}ms, "
+        f"tokens={timing.input_tokens}(cache {timing.cached_tokens})+{timing.output_tokens}"
+        + (f", qayta={timing.retries}" if timing.retries else "")
+    )
+
+    if DEBUG_OPENAI:
+        print("STATUS:", _get(response, "status", None))
+        out = _get(response, "output", None) or []
+        print("OUTPUT_ITEMS:", len(out))
+        # show types quickly
+        types = [str(_get(it, "type", None)) for it in out[:10]]
+        print("OUTPUT_TYPES:", types)
+
+    return response
+
+
+async def _triage(user_input: str, calls: List[CallTiming]) -> Optional[str]:
+    """
+    Arzon model: STOP sababi yoki None. Xato bo‘lsa — None (to‘liq modelga o‘tadi).
+    """
+    timing = CallTiming(model=OPENAI_TRIAGE_MODEL, stage="triage")
+    calls.append(timing)
+
+    request = dict(
+        model=OPENAI_TRIAGE_MODEL,
+        instructions=TRIAGE_PROMPT,
+        input=user_input,
+        max_output_tokens=TRIAGE_MAX_OUTPUT_TOKENS,
+        text=_json_format("essay_triage", TRIAGE_JSON_SCHEMA),
+    )
+    if TRIAGE_REASONING_EFFORT:
+        request["extra_body"] = {"reasoning": {"effort": TRIAGE_REASONING_EFFORT}}
+
+    try:
+        response = await _call(timing, **request)
+        data = json.loads(_get(response, "output_text", None) or "{}")
+        reason = data.get("stop_reason") or None
+    except Exception as e:
+        print(f"⚠️ triage ERROR ({OPENAI_TRIAGE_MODEL}): {e}")
+        timing.outcome = "error"
+        return None
+
+    if reason not in STOP_TOTALS:
+        timing.outcome = "pass"
+        return None
+
+    timing.outcome = "stop"
+    return reason
+
+
+def _hedge_deadline_ms() -> Optional[int]:
+    """
+    Hedge qachon yuborilishi (ms) yoki None (hedging o‘chiq / budjet tugagan).
+    """
+    if OPENAI_HEDGE_PERCENTILE <= 0:
+        return None
+    if _hedge_stats["hedged"] >= OPENAI_HEDGE_MAX_RATIO * max(_hedge_stats["calls"], 1):
+        return None
+
+    if len(_rubric_latencies) < _HEDGE_MIN_SAMPLES:
+        return OPENAI_HEDGE_MIN_MS
+
+    ordered = sorted(_rubric_latencies)
+    idx = min(len(ordered) - 1, int(len(ordered) * OPENAI_HEDGE_PERCENTILE / 100))
+    return max(OPENAI_HEDGE_MIN_MS, ordered[idx])
+
+
+async def _rubric_call(request: dict, calls: List[CallTiming]) -> Any:
+    """
+    Rubrika chaqiruvi (hedging bilan, yoqilgan bo‘lsa).
+    grading_calls da: asosiy — stage="rubric", ikkinchisi — stage="hedge";
+    outcome: "won" / "lost" (bekor qilindi) / "error".
+    """
+    timing = CallTiming(model=request["model"], stage="rubric")
+    calls.append(timing)
+    _hedge_stats["calls"] += 1
+
+    deadline_ms = _hedge_deadline_ms()
+    if deadline_ms is None:
+        response = await _call(timing, **request)
+        _rubric_latencies.append(timing.latency_ms)
+        return response
+
+    primary = asyncio.create_task(_call(timing, **request))
+    owners = {primary: timing}
+    pending = {primary}
+    error: Optional[BaseException] = None
+
+    try:
+        done, pending = await asyncio.wait(pending, timeout=deadline_ms / 1000)
+        if primary in done or openai_stats()["waiting"] > 0:
+            # javob keldi — yoki OpenAI limiti to‘la: hedge faqat navbatni uzaytiradi
+            response = await primary
+            _rubric_latencies.append(timing.latency_ms)
+            return response
+
+        # ⏱ Asosiy so‘rov kechikdi — ikkinchisini yuboramiz
+        hedge_model = OPENAI_FALLBACK_MODEL or request["model"]
+        hedge_request = dict(request, model=hedge_model)
+        if OPENAI_FALLBACK_MODEL:
+            hedge_request.pop("extra_body", None)
+            if FALLBACK_REASONING_EFFORT:
+                hedge_request["extra_body"] = {"reasoning": {"effort": FALLBACK_REASONING_EFFORT}}
+
+        hedge_timing = CallTiming(model=hedge_model, stage="hedge")
+        calls.append(hedge_timing)
+        _hedge_stats["hedged"] += 1
+        print(f"🪁 rubric {deadline_ms}ms dan oshdi — hedge: {hedge_model}")
+
+        hedge = asyncio.create_task(_call(hedge_timing, cache_stage="rubric", **hedge_request))
+        owners[hedge] = hedge_timing
+        pending.add(hedge)
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    owners[task].outcome = "error"
+                    error = error or task.exception()
+                    continue
+
+                owners[task].outcome = "won"
+                for other in pending:
+                    owners[other].outcome = "lost"
+                if task is hedge:
+                    _hedge_stats["hedge_won"] += 1
+                _rubric_latencies.append(owners[task].latency_ms)
+                return task.result()
+
+        raise error
+    finally:
+        # yutqazgan (yoki tashqaridan bekor qilingan) so‘rovlar — cancel,
+        # limiter sloti bo‘shashini kutamiz
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*owners, return_exceptions=True)
+
+
+def hedge_stats() -> dict:
+    return {
+        "enabled": OPENAI_HEDGE_PERCENTILE > 0,
+        "percentile": OPENAI_HEDGE_PERCENTILE,
+        "fallback_model": OPENAI_FALLBACK_MODEL or OPENAI_MODEL,
+        "samples": len(_rubric_latencies),
+        **_hedge_stats,
+    }
+
+
+def _user_input(topic: str, essay_text: str) -> str:
+    return f"""MAVZU:
 {topic}
 
 ESSE MATNI:
 {essay_text}
 """
 
-    def _call_openai():
-        return client.responses.create(
-            model=OPENAI_MODEL,
-            instructions=RUBRIC_PROMPT,
-            input=user_input,
-            max_output_tokens=3800,  # ✅ correct for Responses API
-            extra_body={"reasoning": {"effort": "low"}},
-        )
 
-    try:
-        response = await asyncio.to_thread(_call_openai)
+def _rubric_request(user_input: str) -> dict:
+    request = dict(
+        model=OPENAI_MODEL,
+        instructions=ACTIVE_PROMPT,
+        input=user_input,
+        max_output_tokens=TEXT_MAX_OUTPUT_TOKENS,  # ✅ correct for Responses API
+        extra_body={"reasoning": {"effort": "low"}},
+    )
+    if RUBRIC_OUTPUT == "json":
+        request["max_output_tokens"] = JSON_MAX_OUTPUT_TOKENS
+        request["text"] = _json_format("essay_rubric", RUBRIC_JSON_SCHEMA)
+    return request
+
+
+def _rubric_result(response: Any, calls: List[CallTiming]) -> EssayCheckResult:
+    if RUBRIC_OUTPUT == "json":
+        # batch natijasi — oddiy dict (output_text SDK qulayligi, JSON'da yo‘q)
+        raw = _get(response, "output_text", None) or _extract_text(response)
+        if not raw:
+            raise RuntimeError(
+                f"OpenAI JSON javobi bo‘sh (status={_get(response, 'status', None)})"
+            )
+        rubric = RubricResult.from_json(raw)
+        return EssayCheckResult(text=rubric.render(), calls=calls, rubric=rubric)
+
+    text = _extract_text(response)
+    if not text:
+        raise RuntimeError("OpenAI javobidan matn olinmadi")
+
+    return EssayCheckResult(text=text.strip(), calls=calls)
+
+
+async def check_essay_detailed(topic: str, essay_text: str, sink=None) -> EssayCheckResult:
+    """
+    AI natija + har bir OpenAI chaqiruvining vaqtlari va tokenlari (bosqichlar bo‘yicha).
+    """
+    user_input = _user_input(topic, essay_text)
 
-        if DEBUG_OPENAI:
-            print("STATUS:", _get(response, "status", None))
-            out = _get(response, "output", None) or []
-            print("OUTPUT_ITEMS:", len(out))
-            # show types quickly
-            types = [str(_get(it, "type", None)) for it in out[:10]]
-            print("OUTPUT_TYPES:", types)
+    calls: List[CallTiming] = []
 
-        text = _extract_text(response)
-        if not text:
-            raise RuntimeError("OpenAI javobidan matn olinmadi")
+    # 1) Triage (yoqilgan bo‘lsa)
+    if OPENAI_TRIAGE_MODEL:
+        reason = await _triage(user_input, calls)
+        if reason is not None:
+            rubric = RubricResult(stop_reason=reason) if RUBRIC_OUTPUT == "json" else None
+            return EssayCheckResult(
+                text=render_stop(reason, STOP_TOTALS[reason]),
+                calls=calls,
+                rubric=rubric,
+            )
 
-        return text.strip()
+    # 2) To‘liq rubrika
+    request = _rubric_request(user_input)
 
+    try:
+        if sink is not None and RUBRIC_OUTPUT == "text":
+            # stream: hedge qilinmaydi (admin allaqachon qisman matnni ko‘ryapti)
+            timing = CallTiming(model=OPENAI_MODEL, stage="rubric")
+            calls.append(timing)
+            response = await _call(timing, sink=sink, **request)
+        else:
+            response = await _rubric_call(request, calls)
+
+        return _rubric_result(response, calls)
+
+    except OpenAIOverloaded:
+        # navbat buni keyinroq qayta urinadi (retry-after bilan) — refund faqat oxirida
+        raise
+    except TimeoutError as e:
+        raise RuntimeError(f"OPENAI ERROR: timeout ({calls[-1].latency_ms}ms)") from e
     except OpenAIError as e:
         raise RuntimeError(f"OPENAI ERROR: {e}") from e
     except Exception as e:
-        raise RuntimeError(f"OPENAI ERROR: {e}") from e
\ No newline at end of file
+        raise RuntimeError(f"OPENAI ERROR: {e}") from e
+
+
+# ============================================================
+# Batch API (bot/services/batch_grading.py)
+# ============================================================
+
+def rubric_batch_body(topic: str, essay_text: str) -> dict:
+    """
+    Batch JSONL qatori uchun /v1/responses body — realtime bilan aynan bir xil
+    prompt va parametrlar (extra_body maydonlari yuqori darajaga chiqariladi).
+    Triage ishlatilmaydi: batch allaqachon arzon, STOP holatlarini prescreen ushlaydi.
+    """
+    request = _rubric_request(_user_input(topic, essay_text))
+    body = {k: v for k, v in request.items() if k != "extra_body"}
+    body.update(request["extra_body"])
+    body["prompt_cache_key"] = _prompt_cache_key("rubric")
+    return body
+
+
+def rubric_result_from_body(body: dict) -> EssayCheckResult:
+    """
+    Batch natijasidagi response body -> EssayCheckResult (stage="batch", usage bilan).
+    """
+    timing = CallTiming(model=str(body.get("model") or OPENAI_MODEL), stage="batch")
+    _fill_usage(timing, body)
+    return _rubric_result(body, [timing])
+
+
+async def check_essay(topic: str, essay_text: str) -> str:
+    result = await check_essay_detailed(topic, essay_text)
+    return result.text
+
+
+async def check_essay_streaming(topic: str, essay_text: str, sink) -> EssayCheckResult:
+    """
+    check_essay_detailed ning stream varianti: rubrika matni hosil bo‘layotganda
+    bo‘laklab sink ga beriladi.
+
+    sink:
+        async reset()          — yangi urinish boshlandi (avvalgi bo‘laklar bekor)
+        async feed(delta: str) — navbatdagi matn bo‘lagi
+
+    Qaytgan result.text — yakuniy matn (DB ga aynan shu yoziladi); sink uni
+    o‘zi yakunlab ko‘rsatishi kerak (bo‘laklar yig‘indisidan .strip() bilan farq qilishi mumkin).
+    JSON rejimida yoki triage STOP bo‘lsa — bo‘laklar kelmaydi, faqat yakuniy matn.
+    """
+    return await check_essay_detailed(topic, essay_text, sink=sink)
+
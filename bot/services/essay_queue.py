@@ -0,0 +1,446 @@
+# bot/services/essay_queue.py
+import os
+import socket
+import asyncio
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from bot.services.db import require_pool
+
+# Nechta parallel worker (shu process ichida)
+ESSAY_WORKERS = int(os.getenv("ESSAY_WORKERS", "4"))
+# Alohida worker processlar soni (python -m bot.worker); job'lar user_id % N bo‘yicha bo‘linadi
+ESSAY_WORKER_SHARDS = int(os.getenv("ESSAY_WORKER_SHARDS", "1"))
+ESSAY_JOB_MAX_ATTEMPTS = int(os.getenv("ESSAY_JOB_MAX_ATTEMPTS", "3"))
+# Worker job'ni olgach shu vaqt ichida tugatmasa — job boshqa workerga o‘tadi
+ESSAY_JOB_VISIBILITY_SECONDS = int(os.getenv("ESSAY_JOB_VISIBILITY_SECONDS", "600"))
+# Job ishlanayotganda lease shu oraliqda uzaytiriladi (worker tirik — job o‘tmaydi)
+_LEASE_HEARTBEAT_SECONDS = max(ESSAY_JOB_VISIBILITY_SECONDS // 3, 1)
+ESSAY_QUEUE_POLL_SECONDS = float(os.getenv("ESSAY_QUEUE_POLL_SECONDS", "2"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Ingress boshqa processda bo‘lsa — yangi job haqida NOTIFY orqali xabar beradi
+NOTIFY_CHANNEL = "essay_jobs"
+# LISTEN ulanishi tirikligini tekshirish / qayta ulanish oralig‘i
+_LISTEN_CHECK_SECONDS = 5
+
+EssayJob = Dict[str, Any]
+JobHandler = Callable[[Any, EssayJob], Awaitable[None]]
+
+_wakeup = asyncio.Event()
+_workers: List[asyncio.Task] = []
+_listener = None
+
+# shu process qaysi shard'ni oladi (None — hammasini)
+_shard: Optional[int] = None
+_shards: int = 1
+
+
+# ============================================================
+# Queue operations
+# ============================================================
+
+async def enqueue_essay(
+    *,
+    essay_id: str,
+    user_id: int,
+    chat_id: int,
+    topic: str,
+    essay_text: str,
+    reveal_at: datetime,
+    bypass_cache: bool = False,
+    grading_mode: str = "realtime",
+) -> None:
+    """
+    Esse DBga yoziladi — restart bo‘lsa ham yo‘qolmaydi.
+    grading_mode='batch' — realtime workerlar olmaydi (bot/services/batch_grading.py).
+    """
+    pool = require_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(
+            """
+            INSERT INTO essay_jobs (
+                essay_id,
+                user_id,
+                chat_id,
+                topic,
+                essay_text,
+                bypass_cache,
+                reveal_at,
+                max_attempts,
+                grading_mode
+            )
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+            """,
+            essay_id,
+            user_id,
+            chat_id,
+            topic,
+            essay_text,
+            bypass_cache,
+            reveal_at,
+            ESSAY_JOB_MAX_ATTEMPTS,
+            grading_mode,
+        )
+        if grading_mode == "batch":
+            return
+        # boshqa processdagi workerlar (python -m bot.worker) uchun
+        await conn.execute("SELECT pg_notify($1, $2)", NOTIFY_CHANNEL, str(user_id))
+
+    # shu processdagi workerlarni uyg‘otamiz (poll kutmasdan)
+    _wakeup.set()
+
+
+async def claim_job(shard: Optional[int] = None, shards: int = 1) -> Optional[EssayJob]:
+    """
+    Bitta tayyor job'ni oladi (FOR UPDATE SKIP LOCKED).
+    Muddati o‘tgan 'running' job'lar ham qayta olinadi (worker o‘lgan bo‘lsa).
+    shard berilsa — faqat user_id % shards = shard bo‘lgan job'lar
+    (bitta userning esselari doim bitta processga tushadi).
+    """
+    pool = require_pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(
+            """
+            UPDATE essay_jobs
+            SET status       = 'running',
+                attempts     = attempts + 1,
+                locked_until = now() + make_interval(secs => $1),
+                locked_by    = $2,
+                updated_at   = now()
+            WHERE job_id = (
+                SELECT job_id
+                FROM essay_jobs
+                WHERE (
+                        (status = 'queued' AND run_after <= now())
+                     OR (status = 'running' AND locked_until < now())
+                  )
+                  AND grading_mode = 'realtime'
+                  AND ($3::int IS NULL OR user_id % $4 = $3)
+                ORDER BY run_after
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING *
+            """,
+            ESSAY_JOB_VISIBILITY_SECONDS,
+            WORKER_ID,
+            shard,
+            shards,
+        )
+        return dict(row) if row else None
+
+
+async def complete_job(job: EssayJob) -> bool:
+    """
+    Faqat job hali shu workerda bo‘lsa (lease: locked_by + attempts).
+    False — lease muddati o‘tgan va job boshqa workerga o‘tgan.
+    """
+    pool = require_pool()
+    async with pool.acquire() as conn:
+        result = await conn.execute(
+            """
+            UPDATE essay_jobs
+            SET status       = 'done',
+                locked_until = NULL,
+                finished_at  = now(),
+                updated_at   = now()
+            WHERE job_id = $1
+              AND status = 'running'
+              AND locked_by = $2
+              AND attempts = $3
+            """,
+            job["job_id"],
+            WORKER_ID,
+            job["attempts"],
+        )
+
+    owned = result.endswith(" 1")
+    if not owned:
+        print(f"⚠️ essay job {job['essay_id']} lease yo‘qolgan — complete o‘tkazib yuborildi")
+    return owned
+
+
+async def defer_job(job: EssayJob, ai_result: str) -> bool:
+    """
+    Natija tayyor, lekin reveal_at hali kelmagan: natija job'ga yoziladi va job
+    reveal_at gacha navbatga qaytadi (worker slot'i kutib turmaydi).
+    Yetkazish urinish hisoblanmaydi (attempts qaytariladi).
+    False — lease yo‘qolgan (job boshqa workerda).
+    """
+    pool = require_pool()
+    async with pool.acquire() as conn:
+        result = await conn.execute(
+            """
+            UPDATE essay_jobs
+            SET status       = 'queued',
+                ai_result    = $4,
+                run_after    = reveal_at,
+                attempts     = attempts - 1,
+                locked_until = NULL,
+                updated_at   = now()
+            WHERE job_id = $1
+              AND status = 'running'
+              AND locked_by = $2
+              AND attempts = $3
+            """,
+            job["job_id"],
+            WORKER_ID,
+            job["attempts"],
+            ai_result,
+        )
+
+    owned = result.endswith(" 1")
+    if not owned:
+        print(f"⚠️ essay job {job['essay_id']} lease yo‘qolgan — defer o‘tkazib yuborildi")
+    return owned
+
+
+async def extend_lease(job: EssayJob) -> bool:
+    """
+    Heartbeat: locked_until ni yana ESSAY_JOB_VISIBILITY_SECONDS ga suradi.
+    False — lease allaqachon yo‘qolgan (job boshqa workerda).
+    """
+    pool = require_pool()
+    async with pool.acquire() as conn:
+        result = await conn.execute(
+            """
+            UPDATE essay_jobs
+            SET locked_until = now() + make_interval(secs => $4),
+                updated_at   = now()
+            WHERE job_id = $1
+              AND status = 'running'
+              AND locked_by = $2
+              AND attempts = $3
+            """,
+            job["job_id"],
+            WORKER_ID,
+            job["attempts"],
+            ESSAY_JOB_VISIBILITY_SECONDS,
+        )
+    return result.endswith(" 1")
+
+
+async def fail_job(job: EssayJob, error: str, retry_after: float = 0) -> bool:
+    """
+    Urinishlar qolgan bo‘lsa — backoff bilan qayta navbatga qo‘yadi
+    (OpenAI retry-after bergan bo‘lsa — undan erta emas).
+    Qolmagan bo‘lsa — 'failed'. True qaytsa: yakuniy xato (refund qilish kerak).
+    Lease yo‘qolgan bo‘lsa (job boshqa workerda) — hech narsa o‘zgarmaydi, False.
+    """
+    final = job["attempts"] >= job["max_attempts"]
+    backoff = max(10 * job["attempts"] ** 2, int(retry_after))
+
+    pool = require_pool()
+    async with pool.acquire() as conn:
+        result = await conn.execute(
+            """
+            UPDATE essay_jobs
+            SET status       = CASE WHEN $2 THEN 'failed' ELSE 'queued' END::essay_job_status,
+                run_after    = now() + make_interval(secs => $3),
+                locked_until = NULL,
+                last_error   = $4,
+                finished_at  = CASE WHEN $2 THEN now() END,
+                updated_at   = now()
+            WHERE job_id = $1
+              AND status = 'running'
+              AND locked_by = $5
+              AND attempts = $6
+            """,
+            job["job_id"],
+            final,
+            backoff,
+            error[:2000],
+            WORKER_ID,
+            job["attempts"],
+        )
+
+    if not result.endswith(" 1"):
+        print(f"⚠️ essay job {job['essay_id']} lease yo‘qolgan — fail o‘tkazib yuborildi")
+        return False
+
+    if not final:
+        print(
+            f"🔁 essay job {job['essay_id']} qayta navbatga qo‘yildi "
+            f"({job['attempts']}/{job['max_attempts']}, {backoff}s)"
+        )
+    return final
+
+
+async def refund_job(job_id: int) -> bool:
+    """
+    Yakuniy xato bo‘lgan job uchun 1 ta tekshiruvni qaytaradi.
+    Bitta statement: refunded_at belgisi, ledger va balans birga o‘zgaradi —
+    idempotency kaliti (refund:<essay_id>) ikki marta refund bo‘lishiga yo‘l qo‘ymaydi.
+    """
+    pool = require_pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(
+            """
+            WITH j AS (
+                UPDATE essay_jobs
+                SET refunded_at = now()
+                WHERE job_id = $1
+                  AND refunded_at IS NULL
+                RETURNING user_id, essay_id
+            ), entry AS (
+                INSERT INTO balance_ledger (idempotency_key, user_id, delta, reason, ref)
+                SELECT 'refund:' || essay_id, user_id, 1, 'essay_refund', essay_id FROM j
+                ON CONFLICT (idempotency_key) DO NOTHING
+                RETURNING user_id, delta
+            )
+            INSERT INTO balances (user_id, balance)
+            SELECT user_id, delta FROM entry
+            ON CONFLICT (user_id)
+            DO UPDATE SET
+                balance = balances.balance + EXCLUDED.balance,
+                updated_at = now()
+            RETURNING user_id
+            """,
+            job_id,
+        )
+        return row is not None
+
+
+async def queue_stats() -> Dict[str, int]:
+    pool = require_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT status::text AS status, count(*) AS n
+            FROM essay_jobs
+            WHERE status IN ('queued', 'running')
+            GROUP BY status
+            """
+        )
+    return {r["status"]: int(r["n"]) for r in rows}
+
+
+# ============================================================
+# Worker pool
+# ============================================================
+
+async def _heartbeat(job: EssayJob) -> None:
+    while True:
+        await asyncio.sleep(_LEASE_HEARTBEAT_SECONDS)
+        try:
+            if not await extend_lease(job):
+                print(f"⚠️ essay job {job['essay_id']} lease yo‘qolgan — heartbeat to‘xtadi")
+                return
+        except Exception as e:
+            print(f"⚠️ essay job {job['essay_id']} heartbeat ERROR: {e}")
+
+
+async def _worker_loop(bot, handler: JobHandler, idx: int) -> None:
+    while True:
+        try:
+            job = await claim_job(_shard, _shards)
+        except Exception as e:
+            print(f"❌ essay worker #{idx} claim ERROR: {e}")
+            job = None
+
+        if job is None:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=ESSAY_QUEUE_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
+            continue
+
+        # OpenAI qayta urinishlari uzoq cho‘zilsa ham job boshqa workerga o‘tmasin
+        heartbeat = asyncio.create_task(_heartbeat(job))
+        try:
+            await handler(bot, job)
+        except Exception as e:
+            # handler o‘zi xatoni qayta ishlashi kerak; bu — oxirgi himoya
+            print(f"❌ essay worker #{idx} job {job['essay_id']} ERROR: {e}")
+        finally:
+            heartbeat.cancel()
+
+
+def _on_notify(conn, pid, channel, payload) -> None:
+    if _shard is None:
+        _wakeup.set()
+        return
+    try:
+        if int(payload) % _shards == _shard:
+            _wakeup.set()
+    except ValueError:
+        _wakeup.set()
+
+
+async def _release_listener() -> None:
+    global _listener
+    if _listener is None:
+        return
+    conn, _listener = _listener, None
+    try:
+        if not conn.is_closed():
+            await conn.remove_listener(NOTIFY_CHANNEL, _on_notify)
+    except Exception:
+        pass
+    finally:
+        try:
+            await require_pool().release(conn)
+        except Exception:
+            pass
+
+
+async def _listen() -> None:
+    """
+    LISTEN uchun alohida ulanish. Uzilsa — qayta ulanadi (shu orada workerlar
+    ESSAY_QUEUE_POLL_SECONDS bo‘yicha poll qilishda davom etadi).
+    """
+    global _listener
+    pool = require_pool()
+
+    while True:
+        try:
+            _listener = await pool.acquire()
+            await _listener.add_listener(NOTIFY_CHANNEL, _on_notify)
+            # uzilgan paytda kelgan NOTIFY'lar yo‘qolgan bo‘lishi mumkin
+            _wakeup.set()
+
+            while not _listener.is_closed():
+                await asyncio.sleep(_LISTEN_CHECK_SECONDS)
+
+            print("⚠️ essay_jobs LISTEN ulanishi uzildi — qayta ulanamiz")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ essay_jobs LISTEN ishlamadi (hozircha poll): {e}")
+
+        await _release_listener()
+        await asyncio.sleep(_LISTEN_CHECK_SECONDS)
+
+
+def start_essay_workers(
+    bot,
+    handler: JobHandler,
+    count: int = ESSAY_WORKERS,
+    *,
+    shard: Optional[int] = None,
+    shards: int = 1,
+) -> None:
+    global _shard, _shards
+    if _workers:
+        return
+
+    _shard, _shards = shard, max(shards, 1)
+
+    _workers.append(asyncio.create_task(_listen()))
+    for idx in range(count):
+        _workers.append(asyncio.create_task(_worker_loop(bot, handler, idx)))
+
+    where = "barcha job'lar" if shard is None else f"shard {shard}/{_shards}"
+    print(f"✅ Essay workers started: {count} ({where})")
+
+
+async def stop_essay_workers() -> None:
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+    await _release_listener()
@@ -0,0 +1,172 @@
+# bot/services/fsm_storage.py
+import os
+import json
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from bot.services.db import require_pool
+
+# Harakatsiz suhbat (topic/esse kutilmoqda) shuncha vaqtdan keyin unutiladi
+FSM_STATE_TTL_SECONDS = int(os.getenv("FSM_STATE_TTL_SECONDS", str(24 * 3600)))
+
+_Entry = Tuple[Optional[str], Dict[str, Any]]
+
+
+def _key(key: StorageKey) -> str:
+    return ":".join(
+        str(part)
+        for part in (
+            key.bot_id,
+            key.chat_id,
+            key.user_id,
+            key.thread_id or "",
+            getattr(key, "business_connection_id", None) or "",
+            key.destiny,
+        )
+    )
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    if isinstance(state, State):
+        return state.state
+    return state
+
+
+class PostgresStorage(BaseStorage):
+    """
+    FSM holatlari fsm_states jadvalida:
+    - restartdan keyin suhbat davom etadi, replikalar bitta holatni ko‘radi
+    - har bir yozuv expires_at'ni uzaytiradi; muddati o‘tganlari o‘qilmaydi
+      va purge_expired() bilan o‘chiriladi
+    - lokal cache yo‘q: ketma-ket update'lar turli replikalarga tushsa ham
+      har biri oxirgi holatni ko‘radi (1 ta PK lookup)
+
+    Dispatcher(storage=PostgresStorage())
+    """
+
+    async def _load(self, k: str) -> _Entry:
+        pool = require_pool()
+        async with pool.acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                SELECT state, data::text AS data
+                FROM fsm_states
+                WHERE key = $1 AND expires_at > now()
+                """,
+                k,
+            )
+
+        if row is None:
+            return None, {}
+        return row["state"], json.loads(row["data"])
+
+    # =========================
+    # BaseStorage
+    # =========================
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k = _key(key)
+        name = _state_name(state)
+        pool = require_pool()
+
+        async with pool.acquire() as conn:
+            # state.clear() = set_state(None) + set_data({}) — bo‘sh qator saqlanmaydi
+            row = await conn.fetchrow(
+                """
+                INSERT INTO fsm_states (key, state, expires_at)
+                VALUES ($1, $2, now() + make_interval(secs => $3))
+                ON CONFLICT (key) DO UPDATE
+                SET state      = EXCLUDED.state,
+                    data       = CASE WHEN fsm_states.expires_at > now()
+                                      THEN fsm_states.data ELSE '{}'::jsonb END,
+                    expires_at = EXCLUDED.expires_at,
+                    updated_at = now()
+                RETURNING data::text AS data
+                """,
+                k,
+                name,
+                FSM_STATE_TTL_SECONDS,
+            )
+            if name is None and not json.loads(row["data"]):
+                await self._delete(conn, k)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(_key(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        k = _key(key)
+        pool = require_pool()
+
+        async with pool.acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                INSERT INTO fsm_states (key, data, expires_at)
+                VALUES ($1, $2::jsonb, now() + make_interval(secs => $3))
+                ON CONFLICT (key) DO UPDATE
+                SET state      = CASE WHEN fsm_states.expires_at > now()
+                                      THEN fsm_states.state END,
+                    data       = EXCLUDED.data,
+                    expires_at = EXCLUDED.expires_at,
+                    updated_at = now()
+                RETURNING state
+                """,
+                k,
+                json.dumps(data, ensure_ascii=False),
+                FSM_STATE_TTL_SECONDS,
+            )
+            if row["state"] is None and not data:
+                await self._delete(conn, k)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(_key(key))
+        return data
+
+    async def close(self) -> None:
+        # ulanishlar umumiy pool'da — yopiladigan narsa yo‘q
+        pass
+
+    # =========================
+    # Helpers
+    # =========================
+
+    @staticmethod
+    async def _delete(conn, k: str) -> None:
+        # boshqa so‘rov orada yozgan bo‘lsa — o‘chirilmaydi
+        await conn.execute(
+            """
+            DELETE FROM fsm_states
+            WHERE key = $1 AND state IS NULL AND data = '{}'::jsonb
+            """,
+            k,
+        )
+
+    async def stats(self) -> dict:
+        """
+        Barcha replikalar bo‘yicha (DB dan).
+        """
+        pool = require_pool()
+        async with pool.acquire() as conn:
+            active = await conn.fetchval(
+                "SELECT count(*) FROM fsm_states WHERE expires_at > now()"
+            )
+        return {"active": int(active)}
+
+
+async def purge_expired() -> int:
+    """
+    Muddati o‘tgan (harakatsiz) suhbatlarni o‘chiradi. Scheduler chaqiradi.
+    """
+    pool = require_pool()
+    async with pool.acquire() as conn:
+        status = await conn.execute("DELETE FROM fsm_states WHERE expires_at <= now()")
+    deleted = int(status.split()[-1])
+    if deleted:
+        print(f"🧹 FSM: {deleted} ta eskirgan holat o‘chirildi")
+    return deleted
+
+
+# main.py Dispatcher'ga beradi; /stats uchun
+fsm_storage = PostgresStorage()
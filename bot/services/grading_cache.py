@@ -0,0 +1,247 @@
+# bot/services/grading_cache.py
+import os
+import re
+import time
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from typing import List, Optional, Set
+
+from bot.services.db import require_pool
+from bot.services.essay_checker import OPENAI_MODEL, RUBRIC_PROMPT_VERSION
+
+GRADING_CACHE_ENABLED = os.getenv("GRADING_CACHE_ENABLED", "1") == "1"
+GRADING_CACHE_TTL_DAYS = int(os.getenv("GRADING_CACHE_TTL_DAYS", "30"))
+GRADING_CACHE_LRU_SIZE = int(os.getenv("GRADING_CACHE_LRU_SIZE", "512"))
+
+# key -> (expires_at unix ts, ai_result)
+_lru: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+
+_stats = {
+    "lru_hits": 0,
+    "db_hits": 0,
+    "misses": 0,
+    "stores": 0,
+    "bypassed": 0,
+}
+
+
+# ============================================================
+# Key
+# ============================================================
+
+def _normalize(text: str) -> str:
+    """
+    Bir xil esse qayta yuborilganda bir xil kalit chiqishi uchun:
+    - unicode NFC
+    - qator oxiridagi / ortiqcha probellar
+    - 3+ bo‘sh qator -> 1 bo‘sh qator
+    Harf/tinish belgilari o‘zgarmaydi (imlo baholanadi).
+    """
+    text = unicodedata.normalize("NFC", text or "")
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    lines = [re.sub(r"[ \t\u00a0]+", " ", line).strip() for line in text.split("\n")]
+    text = "\n".join(lines)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def cache_key(topic: str, essay_text: str) -> str:
+    raw = "\x1f".join([
+        _normalize(topic).casefold(),
+        _normalize(essay_text),
+        OPENAI_MODEL,
+        RUBRIC_PROMPT_VERSION,
+    ])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ============================================================
+# LRU front
+# ============================================================
+
+def _lru_get(key: str) -> Optional[str]:
+    item = _lru.get(key)
+    if item is None:
+        return None
+
+    expires_at, ai_result = item
+    if expires_at <= time.time():
+        _lru.pop(key, None)
+        return None
+
+    _lru.move_to_end(key)
+    return ai_result
+
+
+def _lru_put(key: str, ai_result: str, expires_at: float) -> None:
+    _lru[key] = (expires_at, ai_result)
+    _lru.move_to_end(key)
+    while len(_lru) > GRADING_CACHE_LRU_SIZE:
+        _lru.popitem(last=False)
+
+
+# ============================================================
+# Public API
+# ============================================================
+
+async def get_cached(key: str) -> Optional[str]:
+    """
+    LRU -> Postgres. Topilmasa None.
+    Cache xatosi esse tekshirishni to‘xtatmaydi.
+    """
+    if not GRADING_CACHE_ENABLED:
+        return None
+
+    ai_result = _lru_get(key)
+    if ai_result is not None:
+        _stats["lru_hits"] += 1
+        return ai_result
+
+    try:
+        pool = require_pool()
+        async with pool.acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                UPDATE grading_cache
+                SET hits = hits + 1,
+                    last_hit_at = now()
+                WHERE cache_key = $1
+                  AND expires_at > now()
+                RETURNING ai_result, expires_at
+                """,
+                key,
+            )
+    except Exception as e:
+        print(f"❌ grading_cache get ERROR: {e}")
+        return None
+
+    if not row:
+        _stats["misses"] += 1
+        return None
+
+    _stats["db_hits"] += 1
+    _lru_put(key, row["ai_result"], row["expires_at"].timestamp())
+    return row["ai_result"]
+
+
+async def cached_keys(keys: List[str]) -> Set[str]:
+    """
+    Ko‘p kalit uchun bitta so‘rov (batch yuborishdan oldin): qaysilari cache'da bor.
+    Hit hisoblanmaydi — natijani worker get_cached() bilan oladi.
+    """
+    if not GRADING_CACHE_ENABLED or not keys:
+        return set()
+
+    pool = require_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT cache_key
+            FROM grading_cache
+            WHERE cache_key = ANY($1::text[])
+              AND expires_at > now()
+            """,
+            keys,
+        )
+    return {r["cache_key"] for r in rows}
+
+
+async def put_cached(key: str, ai_result: str) -> None:
+    if not GRADING_CACHE_ENABLED:
+        return
+
+    try:
+        pool = require_pool()
+        async with pool.acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                INSERT INTO grading_cache (
+                    cache_key,
+                    model,
+                    prompt_version,
+                    ai_result,
+                    expires_at
+                )
+                VALUES ($1, $2, $3, $4, now() + make_interval(days => $5))
+                ON CONFLICT (cache_key)
+                DO UPDATE SET
+                    ai_result = EXCLUDED.ai_result,
+                    expires_at = EXCLUDED.expires_at
+                RETURNING expires_at
+                """,
+                key,
+                OPENAI_MODEL,
+                RUBRIC_PROMPT_VERSION,
+                ai_result,
+                GRADING_CACHE_TTL_DAYS,
+            )
+    except Exception as e:
+        print(f"❌ grading_cache put ERROR: {e}")
+        return
+
+    _stats["stores"] += 1
+    _lru_put(key, ai_result, row["expires_at"].timestamp())
+
+
+async def purge_expired() -> int:
+    """
+    Scheduler orqali davriy chaqiriladi.
+    """
+    pool = require_pool()
+    async with pool.acquire() as conn:
+        status = await conn.execute(
+            "DELETE FROM grading_cache WHERE expires_at <= now()"
+        )
+
+    now = time.time()
+    for key in [k for k, (exp, _) in _lru.items() if exp <= now]:
+        _lru.pop(key, None)
+
+    # "DELETE 12"
+    return int(status.split()[-1])
+
+
+async def bypass_next(user_id: int) -> None:
+    """
+    Admin: "keyingi esse cache'siz tekshirilsin". DB da — restart'dan keyin ham,
+    /nocache boshqa replica'ga kelsa ham ishlaydi.
+    """
+    pool = require_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(
+            """
+            INSERT INTO grading_cache_bypass (user_id)
+            VALUES ($1)
+            ON CONFLICT (user_id) DO NOTHING
+            """,
+            user_id,
+        )
+
+
+async def consume_bypass(user_id: int) -> bool:
+    """
+    True bo‘lsa — shu esse cache'siz tekshiriladi (bir martalik).
+    Enqueue paytida chaqiriladi; natija essay_jobs.bypass_cache ga yoziladi.
+    """
+    pool = require_pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(
+            "DELETE FROM grading_cache_bypass WHERE user_id = $1 RETURNING user_id",
+            user_id,
+        )
+    if row is None:
+        return False
+    _stats["bypassed"] += 1
+    return True
+
+
+def cache_stats() -> dict:
+    hits = _stats["lru_hits"] + _stats["db_hits"]
+    total = hits + _stats["misses"]
+    return {
+        **_stats,
+        "hit_ratio": (hits / total) if total else 0.0,
+        "lru_size": len(_lru),
+        "enabled": GRADING_CACHE_ENABLED,
+    }
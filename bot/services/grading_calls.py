@@ -0,0 +1,171 @@
+# bot/services/grading_calls.py
+import os
+import json
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+from bot.services.db import require_pool
+from bot.services.openai_client import CallTiming
+
+# USD / 1M token: (input, cached input, output). Reasoning — output narxida.
+# O‘zgartirish: OPENAI_PRICING='{"gpt-5-mini": [0.25, 0.025, 2.0]}'
+_DEFAULT_PRICING: Dict[str, Tuple[float, float, float]] = {
+    "gpt-5": (1.25, 0.125, 10.0),
+    "gpt-5-mini": (0.25, 0.025, 2.0),
+    "gpt-5-nano": (0.05, 0.005, 0.4),
+    "gpt-4.1": (2.0, 0.5, 8.0),
+    "gpt-4.1-mini": (0.4, 0.1, 1.6),
+    "gpt-4.1-nano": (0.1, 0.025, 0.4),
+}
+OPENAI_PRICING = {
+    **_DEFAULT_PRICING,
+    **{k: tuple(v) for k, v in json.loads(os.getenv("OPENAI_PRICING", "{}")).items()},
+}
+
+# Batch API — realtime narxining yarmi
+BATCH_PRICE_FACTOR = float(os.getenv("BATCH_PRICE_FACTOR", "0.5"))
+
+
+def call_cost(call: CallTiming) -> Decimal:
+    """
+    Taxminiy narx (USD). Noma’lum model — 0.
+    "gpt-5-mini-2025-08-07" kabi nomlar eng uzun mos prefiks bo‘yicha topiladi.
+    """
+    price = None
+    for name in sorted(OPENAI_PRICING, key=len, reverse=True):
+        if call.model == name or call.model.startswith(name + "-"):
+            price = OPENAI_PRICING[name]
+            break
+    if price is None:
+        return Decimal(0)
+
+    input_price, cached_price, output_price = price
+    uncached = max(call.input_tokens - call.cached_tokens, 0)
+    usd = (
+        uncached * input_price
+        + call.cached_tokens * cached_price
+        + call.output_tokens * output_price
+    ) / 1_000_000
+    if call.stage == "batch":
+        usd *= BATCH_PRICE_FACTOR
+    return Decimal(str(round(usd, 6)))
+
+
+async def record_calls(essay_id: str, calls: List[CallTiming]) -> None:
+    """
+    Har bir OpenAI chaqiruvi (bosqich, model, vaqt, tokenlar, narx) — bitta INSERT.
+    """
+    if not calls:
+        return
+
+    pool = require_pool()
+    await pool.execute(
+        """
+        INSERT INTO grading_calls (
+            essay_id, stage, model, outcome,
+            queue_wait_ms, latency_ms,
+            input_tokens, cached_tokens, output_tokens, reasoning_tokens,
+            retries, cost_usd
+        )
+        SELECT $1, *
+        FROM unnest(
+            $2::text[], $3::text[], $4::text[],
+            $5::int[], $6::int[],
+            $7::int[], $8::int[], $9::int[], $10::int[],
+            $11::int[], $12::numeric[]
+        )
+        """,
+        essay_id,
+        [c.stage for c in calls],
+        [c.model for c in calls],
+        [c.outcome for c in calls],
+        [c.queue_wait_ms for c in calls],
+        [c.latency_ms for c in calls],
+        [c.input_tokens for c in calls],
+        [c.cached_tokens for c in calls],
+        [c.output_tokens for c in calls],
+        [c.reasoning_tokens for c in calls],
+        [c.retries for c in calls],
+        [call_cost(c) for c in calls],
+    )
+
+
+async def stage_stats(hours: int = 24) -> List[dict]:
+    """
+    /stats uchun: bosqichlar bo‘yicha chaqiruvlar, o‘rtacha vaqt va tokenlar.
+    """
+    pool = require_pool()
+    rows = await pool.fetch(
+        """
+        SELECT stage,
+               count(*)                                   AS calls,
+               count(*) FILTER (WHERE outcome = 'stop')   AS stops,
+               count(*) FILTER (WHERE outcome = 'won')    AS won,
+               avg(latency_ms)::int                       AS avg_latency_ms,
+               avg(input_tokens)::int                     AS avg_input_tokens,
+               avg(output_tokens)::int                    AS avg_output_tokens,
+               coalesce(sum(retries), 0)                  AS retries
+        FROM grading_calls
+        WHERE created_at > now() - make_interval(hours => $1)
+        GROUP BY stage
+        ORDER BY stage
+        """,
+        hours,
+    )
+    return [dict(r) for r in rows]
+
+
+async def review_stats(hours: int = 24) -> dict:
+    """
+    /stats uchun: barcha processlar bo‘yicha (DB dan) — ingress alohida bo‘lsa ham
+    (ESSAY_WORKERS_IN_PROCESS=0) haqiqiy raqamlar.
+    without_openai — grading_calls yozilmagan esselar (lokal STOP / cache).
+    """
+    pool = require_pool()
+    row = await pool.fetchrow(
+        """
+        SELECT
+            (SELECT count(*) FROM essay_reviews
+             WHERE created_at > now() - make_interval(hours => $1)) AS reviewed,
+            (SELECT count(*) FROM essay_reviews r
+             WHERE r.created_at > now() - make_interval(hours => $1)
+               AND NOT EXISTS (
+                   SELECT 1 FROM grading_calls c WHERE c.essay_id = r.essay_id
+               )) AS without_openai,
+            (SELECT count(*) FROM essay_reviews
+             WHERE created_at > now() - make_interval(hours => $1)
+               AND duplicate_of IS NOT NULL) AS duplicates,
+            (SELECT count(*) FROM grading_cache
+             WHERE expires_at > now()) AS cache_entries,
+            (SELECT count(*) FROM grading_cache
+             WHERE last_hit_at > now() - make_interval(hours => $1)) AS cache_used
+        """,
+        hours,
+    )
+    return dict(row)
+
+
+async def cost_by_day(days: int = 14) -> List[dict]:
+    """
+    Kunlar bo‘yicha: esselar, cache'dan olingan input ulushi, bitta esse narxi.
+    """
+    pool = require_pool()
+    rows = await pool.fetch(
+        """
+        SELECT created_at::date                                AS day,
+               count(DISTINCT essay_id)                        AS essays,
+               sum(input_tokens)                               AS input_tokens,
+               sum(cached_tokens)                              AS cached_tokens,
+               sum(output_tokens)                              AS output_tokens,
+               sum(reasoning_tokens)                           AS reasoning_tokens,
+               coalesce(sum(cost_usd), 0)                      AS cost_usd,
+               coalesce(sum(cost_usd), 0)
+                   / greatest(count(DISTINCT essay_id), 1)     AS cost_per_essay
+        FROM grading_calls
+        WHERE created_at > now() - make_interval(days => $1)
+        GROUP BY 1
+        ORDER BY 1 DESC
+        """,
+        days,
+    )
+    return [dict(r) for r in rows]
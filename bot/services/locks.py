@@ -1,14 +1,57 @@
-# oddiy in-memory lock
-active_checks: set[int] = set()
+# bot/services/locks.py
+import os
+import socket
+from typing import Iterable
 
+from bot.services.db import require_pool
 
-def is_locked(user_id: int) -> bool:
-    return user_id in active_checks
+# Lease lock (Postgres): bir nechta bot process bitta lock jadvalini bo‘lishadi.
+# Egasi tirik bo‘lsa heartbeat lease'ni uzaytiradi; process o‘lsa lock o‘zi tugaydi.
+# Lock balance.lock_and_charge da olinadi (balans yechish bilan bitta statement),
+# holati balance.get_user_context da o‘qiladi; bu yerda — ochish va heartbeat.
+LOCK_LEASE_SECONDS = int(os.getenv("LOCK_LEASE_SECONDS", "900"))
+LOCK_HEARTBEAT_SECONDS = max(LOCK_LEASE_SECONDS // 3, 1)
 
+LOCK_OWNER = f"{socket.gethostname()}:{os.getpid()}"
 
-def lock(user_id: int):
-    active_checks.add(user_id)
 
+async def unlock(user_id: int) -> None:
+    pool = require_pool()
+    async with pool.acquire() as conn:
+        await conn.execute("DELETE FROM user_locks WHERE user_id = $1", user_id)
 
-def unlock(user_id: int):
-    active_checks.discard(user_id)
+
+async def unlock_many(user_ids: Iterable[int]) -> None:
+    ids = list(user_ids)
+    if not ids:
+        return
+
+    pool = require_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(
+            "DELETE FROM user_locks WHERE user_id = ANY($1::bigint[])",
+            ids,
+        )
+
+
+async def heartbeat() -> None:
+    """
+    Scheduler orqali davriy: shu process olgan lock'larni uzaytiradi,
+    uzoq vaqt oldin tugagan yozuvlarni tozalaydi.
+    """
+    pool = require_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(
+            """
+            UPDATE user_locks
+            SET expires_at   = now() + make_interval(secs => $2),
+                heartbeat_at = now()
+            WHERE owner = $1
+              AND expires_at > now()
+            """,
+            LOCK_OWNER,
+            LOCK_LEASE_SECONDS,
+        )
+        await conn.execute(
+            "DELETE FROM user_locks WHERE expires_at < now() - interval '1 day'"
+        )
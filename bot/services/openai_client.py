@@ -0,0 +1,335 @@
+# bot/services/openai_client.py
+import os
+import time
+import random
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    AsyncOpenAI,
+    DefaultAsyncHttpxClient,
+    RateLimitError,
+)
+
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+# Bir vaqtda OpenAI ga ketadigan so‘rovlar soni — yuqori chegara (global, butun process uchun).
+# Haqiqiy limit moslashuvchan (AIMD): 429 / sekinlashuvda kamayadi, muvaffaqiyatda o‘sadi.
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+OPENAI_MIN_CONCURRENCY = int(os.getenv("OPENAI_MIN_CONCURRENCY", "1"))
+# Tez EWMA sekin (bazaviy) EWMA dan shuncha marta oshsa — limit kamayadi
+# (har bosqich / model / stream uchun alohida — triage va rubrika aralashmaydi)
+OPENAI_LATENCY_RATIO = float(os.getenv("OPENAI_LATENCY_RATIO", "1.5"))
+# Bitta chaqiruv uchun umumiy deadline (sekund)
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "180"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))
+# 429 / 5xx / timeout bo‘lsa — shuncha marta qayta (jitter bilan), keyin xato
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+OPENAI_BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", "2"))
+OPENAI_BACKOFF_MAX = float(os.getenv("OPENAI_BACKOFF_MAX", "60"))
+# Bitta chaqiruvning barcha urinishlari + kutishlari shundan oshmaydi (sekund).
+# ESSAY_JOB_VISIBILITY_SECONDS dan kichik bo‘lsin — aks holda job boshqa workerga o‘tadi.
+OPENAI_RETRY_BUDGET_SECONDS = float(os.getenv("OPENAI_RETRY_BUDGET_SECONDS", "420"))
+
+if not OPENAI_API_KEY:
+    raise RuntimeError("OPENAI_API_KEY topilmadi. .env faylga OPENAI_API_KEY=... qo‘ying.")
+
+
+_client: Optional[AsyncOpenAI] = None
+
+# Kamaytirishlar orasidagi minimal vaqt (bir vaqtdagi 429 lar limitni nolga tushirmasin)
+_DECREASE_COOLDOWN = 2.0
+
+
+class OpenAIOverloaded(RuntimeError):
+    """
+    Qayta urinishlar tugadi (429 / 5xx / timeout). Job keyinroq qayta navbatga qo‘yiladi.
+    """
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class OpenAIStreamError(RuntimeError):
+    """
+    Stream ichida kelgan response.failed / error hodisasi (HTTP status yo‘q).
+    code — OpenAI xato kodi; server_error / rate_limit_exceeded / noma’lum — qayta urinadi.
+    """
+
+    _RETRYABLE_CODES = ("server_error", "rate_limit_exceeded", "vector_store_timeout")
+
+    def __init__(self, message: str, code: Optional[str] = None):
+        super().__init__(message)
+        self.code = code
+
+    @property
+    def retryable(self) -> bool:
+        return self.code is None or self.code in self._RETRYABLE_CODES
+
+    @property
+    def rate_limited(self) -> bool:
+        return self.code == "rate_limit_exceeded"
+
+
+class _AdaptiveLimiter:
+    """
+    AIMD concurrency limit:
+    - muvaffaqiyat -> limit += 1/limit (har "oyna"da +1)
+    - 429 yoki latency oshishi -> limit *= 0.5 / 0.8 (cooldown bilan)
+    - latency EWMA har (stage, model, stream) uchun alohida: triage tez, hedge
+      boshqa model — bir qatorga qo‘shilsa "sekinlashuv" soxta ko‘rinadi
+    - retry-after -> shu vaqtgacha yangi so‘rov yuborilmaydi
+    """
+
+    def __init__(self, lo: int, hi: int) -> None:
+        self.lo = max(lo, 1)
+        self.hi = max(hi, self.lo)
+        self.limit = float(self.hi)
+        self.in_flight = 0
+        self.waiting = 0
+        self.blocked_until = 0.0
+        self.rate_limited = 0
+        self.retries = 0
+        # (stage, model, stream) -> [fast_ms, slow_ms]
+        self._latency: Dict[Tuple[str, str, bool], List[float]] = {}
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            self.waiting += 1
+            try:
+                while True:
+                    pause = self.blocked_until - time.monotonic()
+                    if pause > 0:
+                        try:
+                            await asyncio.wait_for(self._cond.wait(), timeout=pause)
+                        except asyncio.TimeoutError:
+                            pass
+                        continue
+                    if self.in_flight < int(self.limit):
+                        break
+                    await self._cond.wait()
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def _decrease(self, factor: float) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < _DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.lo), self.limit * factor)
+
+    def on_success(self, key: Tuple[str, str, bool], latency_ms: int) -> None:
+        ewma = self._latency.get(key)
+        if ewma is None:
+            ewma = self._latency[key] = [float(latency_ms), float(latency_ms)]
+        else:
+            ewma[0] += 0.3 * (latency_ms - ewma[0])
+            ewma[1] += 0.05 * (latency_ms - ewma[1])
+
+        if ewma[0] > ewma[1] * OPENAI_LATENCY_RATIO:
+            self._decrease(0.8)
+        else:
+            self.limit = min(float(self.hi), self.limit + 1 / self.limit)
+
+    def on_overload(self, retry_after: float, rate_limited: bool) -> None:
+        if rate_limited:
+            self.rate_limited += 1
+            self._decrease(0.5)
+        if retry_after > 0:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+
+_limiter = _AdaptiveLimiter(OPENAI_MIN_CONCURRENCY, OPENAI_MAX_CONCURRENCY)
+
+
+@dataclass
+class CallTiming:
+    """
+    Bitta OpenAI chaqiruvi vaqtlari va tokenlari (usage):
+    - stage: "triage" / "rubric"
+    - queue_wait_ms: concurrency limitida navbat kutish
+    - latency_ms: modelning o‘zi (HTTP so‘rov) qancha vaqt oldi
+    - outcome: bosqich natijasi (masalan triage: "stop" / "pass")
+    """
+    model: str
+    stage: str = "rubric"
+    queue_wait_ms: int = 0
+    latency_ms: int = 0
+    input_tokens: int = 0
+    # input_tokens ichidan prompt-prefix cache'dan olingani
+    cached_tokens: int = 0
+    # output_tokens ichidan reasoning
+    output_tokens: int = 0
+    reasoning_tokens: int = 0
+    # 429 / 5xx / timeout dan keyin qayta urinishlar
+    retries: int = 0
+    outcome: Optional[str] = None
+    # stream=True (latency EWMA alohida yuritiladi)
+    stream: bool = False
+
+
+def get_client() -> AsyncOpenAI:
+    """
+    Umumiy AsyncOpenAI client (keep-alive connection pool bilan).
+    Har chaqiruvda yangi client/ulanish ochilmaydi.
+    """
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            # qayta urinishlar shu modulda (limiter + retry-after bilan)
+            max_retries=0,
+            timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONCURRENCY * 2,
+                    max_keepalive_connections=OPENAI_MAX_CONCURRENCY,
+                    keepalive_expiry=60,
+                ),
+            ),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """
+    App to‘xtaganda ulanishlarni yopish.
+    """
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+@asynccontextmanager
+async def openai_slot(timing: CallTiming):
+    """
+    Moslashuvchan concurrency limit + deadline.
+
+    async with openai_slot(timing):
+        response = await get_client().responses.create(...)
+
+    Navbat kutish deadline ga kirmaydi — faqat model vaqti cheklanadi.
+    Task cancel qilinsa, HTTP so‘rov ham bekor bo‘ladi.
+    """
+    queued_at = time.perf_counter()
+    await _limiter.acquire()
+
+    started_at = time.perf_counter()
+    timing.queue_wait_ms = int((started_at - queued_at) * 1000)
+
+    ok = False
+    try:
+        async with asyncio.timeout(OPENAI_TIMEOUT):
+            yield
+        ok = True
+    finally:
+        timing.latency_ms = int((time.perf_counter() - started_at) * 1000)
+        if ok:
+            _limiter.on_success((timing.stage, timing.model, timing.stream), timing.latency_ms)
+        await _limiter.release()
+
+
+def _retry_after(e: BaseException) -> float:
+    """
+    retry-after-ms / retry-after (sekund) headerlari; yo‘q bo‘lsa 0.
+    """
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return 0.0
+
+
+def _is_retryable(e: BaseException) -> bool:
+    if isinstance(e, (RateLimitError, APIConnectionError, APITimeoutError, TimeoutError)):
+        return True
+    if isinstance(e, OpenAIStreamError):
+        return e.retryable
+    if isinstance(e, APIStatusError):
+        return e.status_code in (408, 409) or e.status_code >= 500
+    return False
+
+
+async def with_retries(timing: CallTiming, make_request):
+    """
+    make_request() — openai_slot ichida chaqiriladi.
+    429 / 5xx / timeout: retry-after (bo‘lsa) yoki full-jitter exponential backoff.
+    Urinishlar yoki OPENAI_RETRY_BUDGET_SECONDS tugasa (keyingi urinish to‘liq
+    OPENAI_TIMEOUT ga sig‘masa) — OpenAIOverloaded (job keyinroq qayta navbatga qo‘yiladi).
+    Boshqa xatolar darhol yuqoriga chiqadi.
+    """
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        try:
+            async with openai_slot(timing):
+                return await make_request()
+        except Exception as e:
+            if not _is_retryable(e):
+                raise
+
+            retry_after = _retry_after(e)
+            rate_limited = isinstance(e, RateLimitError) or (
+                isinstance(e, OpenAIStreamError) and e.rate_limited
+            )
+            _limiter.on_overload(retry_after, rate_limited)
+
+            backoff = random.uniform(0, min(OPENAI_BACKOFF_MAX, OPENAI_BACKOFF_BASE * 2 ** attempt))
+            delay = max(retry_after, backoff)
+            elapsed = time.monotonic() - started
+
+            if (
+                attempt >= OPENAI_MAX_RETRIES
+                or elapsed + delay + OPENAI_TIMEOUT > OPENAI_RETRY_BUDGET_SECONDS
+            ):
+                raise OpenAIOverloaded(
+                    f"OPENAI OVERLOADED: {type(e).__name__}: {e} "
+                    f"({attempt + 1} urinish, {elapsed:.0f}s)",
+                    retry_after=retry_after,
+                ) from e
+
+            attempt += 1
+            timing.retries = attempt
+            _limiter.retries += 1
+
+            print(
+                f"🔁 OpenAI {timing.stage}/{timing.model}: {type(e).__name__}, "
+                f"{delay:.1f}s dan keyin qayta ({attempt}/{OPENAI_MAX_RETRIES}), "
+                f"limit={int(_limiter.limit)}"
+            )
+            await asyncio.sleep(delay)
+
+
+def openai_stats() -> dict:
+    return {
+        "limit": int(_limiter.limit),
+        "max_limit": _limiter.hi,
+        "in_flight": _limiter.in_flight,
+        "waiting": _limiter.waiting,
+        "rate_limited": _limiter.rate_limited,
+        "retries": _limiter.retries,
+    }
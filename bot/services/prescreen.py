@@ -0,0 +1,164 @@
+# bot/services/prescreen.py
+#
+# RUBRIC_PROMPT STEP 0 (STOP holatlari) ning aniq hal qilinadigan qismi — lokal.
+# Bir marta o‘tib hisoblanadi: so‘zlar (probel bo‘yicha, prompt qoidasi),
+# xatboshilar, gaplar.
+# Faqat shubhasiz holatlarda natija beradi; qolganini (mavzuga mos emas,
+# ko‘chirilgan, kirill) model hal qiladi.
+# Bo‘sh va 100 so‘zdan kam esselar bu yerga kelmaydi — receive_essay rad etadi.
+
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from bot.services.rubric import STOP_INTRO_ONLY, render_stop
+
+PRESCREEN_ENABLED = os.getenv("PRESCREEN_ENABLED", "1") == "1"
+# "Faqat kirish": kirish bundan uzun bo‘lmaydi...
+INTRO_MAX_WORDS = int(os.getenv("PRESCREEN_INTRO_MAX_WORDS", "150"))
+# ...va gaplari tinish belgilari bilan ajratilgan (tinishsiz uzun matn — kirish emas)
+INTRO_MAX_WORDS_PER_SENTENCE = 60
+
+_SENTENCE_END = ".!?…"
+# so‘z boshidagi / oxiridagi tinish belgilari (o‘, g‘ ichidagi belgi qoladi)
+_WORD_PUNCT = ".,;:!?…\"'«»“”()[]-–—"
+
+_stats = {"checked": 0, "stopped": 0}
+_by_reason: dict = {}
+
+
+@dataclass
+class TextStats:
+    words: int = 0
+    paragraphs: int = 0
+    sentences: int = 0
+    # oxirgi gap "?" bilan tugaganmi
+    ends_with_question: bool = False
+
+
+@dataclass
+class StopVerdict:
+    reason: str
+    total: float
+    stats: TextStats
+
+    @property
+    def text(self) -> str:
+        return render_stop(self.reason, self.total)
+
+
+def analyze(text: str) -> TextStats:
+    """
+    Bitta o‘tish (regex yo‘q). Xatbosh — bo‘sh bo‘lmagan qator.
+    Gap — harf/raqamdan keyin kelgan .!?… ketma-ketligi (yoki matn oxiri).
+    """
+    st = TextStats()
+    in_word = False
+    line_has_text = False
+    sentence_open = False
+    # oxirgi gap tugashida "?" bormi ("?!", "?»" ham)
+    question = False
+
+    for ch in text or "":
+        if ch == "\n":
+            if line_has_text:
+                st.paragraphs += 1
+            line_has_text = False
+            in_word = False
+            continue
+
+        if ch.isspace():
+            in_word = False
+            continue
+
+        if not in_word:
+            st.words += 1
+            in_word = True
+        line_has_text = True
+
+        if ch in _SENTENCE_END:
+            if sentence_open:
+                st.sentences += 1
+                sentence_open = False
+                question = False
+            question = question or ch == "?"
+            continue
+
+        if ch.isalnum():
+            sentence_open = True
+
+    if line_has_text:
+        st.paragraphs += 1
+    if sentence_open:
+        st.sentences += 1
+        question = False
+
+    st.ends_with_question = question
+    return st
+
+
+def _stems(text: str) -> set:
+    """
+    So‘z o‘zaklari (birinchi 5 harf): "internet" / "internetni", "yoshlar" / "yoshlarimiz".
+    Qisqa so‘zlar (va, yoki, bu...) hisobga olinmaydi.
+    """
+    words = (w.strip(_WORD_PUNCT).casefold() for w in text.split())
+    return {w[:5] for w in words if len(w) >= 4}
+
+
+def _last_sentence(text: str) -> str:
+    tail = text.rstrip().rstrip(_SENTENCE_END + "»\"”)")
+    start = max(tail.rfind(ch) for ch in _SENTENCE_END)
+    return tail[start + 1:]
+
+
+def _is_intro_only(topic: str, essay_text: str, st: TextStats) -> bool:
+    """
+    Hamma belgilar birga: bitta xatbosh, 2–3 gap, INTRO_MAX_WORDS gacha,
+    gaplar o‘rtacha INTRO_MAX_WORDS_PER_SENTENCE so‘zdan qisqa va oxirgi gap —
+    mavzu so‘zlari bilan berilgan savol (kirishning mavzu savoli).
+    """
+    return (
+        st.paragraphs == 1
+        and 2 <= st.sentences <= 3
+        and st.ends_with_question
+        and st.words <= INTRO_MAX_WORDS
+        and st.words <= st.sentences * INTRO_MAX_WORDS_PER_SENTENCE
+        and bool(_stems(topic) & _stems(_last_sentence(essay_text)))
+    )
+
+
+def prescreen(topic: str, essay_text: str) -> Optional[StopVerdict]:
+    """
+    STOP holati aniq bo‘lsa — StopVerdict (OpenAI chaqirilmaydi), aks holda None.
+
+    Promptda A (2 ball: mavzuga mos emas, ko‘chirilgan) B (0 ball) dan oldin
+    tekshiriladi, A ni esa lokal aniqlab bo‘lmaydi. Shuning uchun kirill esse
+    modelga yuboriladi (mavzuga mos bo‘lmasa 2 ball olishi kerak).
+    "Faqat kirish" — istisno (qarang: _is_intro_only): oxirgi gap mavzu so‘zlari
+    bilan berilgan savol bo‘lgani uchun A (mavzuga mos emas) holati uchramaydi;
+    bitta belgi yetmaydi — kam tinishli haqiqiy esse STOP olmasligi kerak.
+    """
+    if not PRESCREEN_ENABLED:
+        return None
+
+    _stats["checked"] += 1
+    st = analyze(essay_text)
+    verdict = None
+
+    if _is_intro_only(topic, essay_text, st):
+        # kirish: 2–3 gap, oxirgisi mavzu savoli — boshqa qism yo‘q
+        verdict = StopVerdict(STOP_INTRO_ONLY, 0, st)
+
+    if verdict is not None:
+        _stats["stopped"] += 1
+        _by_reason[verdict.reason] = _by_reason.get(verdict.reason, 0) + 1
+    return verdict
+
+
+def prescreen_stats() -> dict:
+    return {
+        **_stats,
+        "enabled": PRESCREEN_ENABLED,
+        "by_reason": dict(_by_reason),
+    }
@@ -0,0 +1,168 @@
+# bot/services/reconciler.py
+import os
+from dataclasses import dataclass
+
+from bot.services.db import require_pool
+from bot.services.locks import LOCK_LEASE_SECONDS
+
+# Startupda va har N sekundda ishlaydi (lock lease'dan qisqa bo‘lishi kerak)
+RECONCILE_SECONDS = int(os.getenv("RECONCILE_SECONDS", "300"))
+# Yangi olingan lock (esse hali navbatga yozilmagan) tegilmaydi
+RECONCILE_LOCK_GRACE_SECONDS = int(os.getenv("RECONCILE_LOCK_GRACE_SECONDS", "600"))
+
+RECONCILER_OWNER = "reconciler"
+
+# Foydalanuvchi "jarayonda" hisoblanadi, agar:
+# - esse navbatda / tekshirilmoqda, yoki
+# - admin ovozli izohini kutmoqda / yuborilishi kutilmoqda
+_ACTIVE_USERS_SQL = """
+    SELECT user_id FROM essay_jobs
+    WHERE status IN ('queued', 'running')
+    UNION
+    SELECT user_id FROM essay_reviews
+    WHERE user_unlocked_at IS NULL
+      AND (
+            status = 'waiting_voice'
+         OR (status = 'voice_scheduled' AND voice_due_at IS NOT NULL)
+      )
+"""
+
+
+# {source}: (user_id, essay_id) qatorlar. Ledger idempotency kaliti
+# (refund:<essay_id>) worker bilan ikki marta refund bo‘lishiga yo‘l qo‘ymaydi.
+_REFUND_CTES = """
+    entry AS (
+        INSERT INTO balance_ledger (idempotency_key, user_id, delta, reason, ref)
+        SELECT 'refund:' || essay_id, user_id, 1, 'essay_refund', essay_id
+        FROM {source}
+        ON CONFLICT (idempotency_key) DO NOTHING
+        RETURNING user_id, delta
+    ), per_user AS (
+        SELECT user_id, sum(delta)::int AS n
+        FROM entry
+        GROUP BY user_id
+    ), credited AS (
+        INSERT INTO balances (user_id, balance)
+        SELECT user_id, n FROM per_user
+        ON CONFLICT (user_id)
+        DO UPDATE SET
+            balance = balances.balance + EXCLUDED.balance,
+            updated_at = now()
+        RETURNING user_id
+    )
+"""
+
+
+@dataclass
+class ReconcileReport:
+    jobs_refunded: int = 0
+    charges_refunded: int = 0
+    locks_rebuilt: int = 0
+    locks_released: int = 0
+
+    @property
+    def is_empty(self) -> bool:
+        return not (
+            self.jobs_refunded
+            or self.charges_refunded
+            or self.locks_rebuilt
+            or self.locks_released
+        )
+
+    def __str__(self) -> str:
+        return (
+            f"refund: {self.jobs_refunded} ta esse, "
+            f"navbatga yozilmagan to‘lov: {self.charges_refunded}, "
+            f"lock tiklandi: {self.locks_rebuilt}, "
+            f"lock ochildi: {self.locks_released}"
+        )
+
+
+async def reconcile_pipeline() -> ReconcileReport:
+    """
+    Set-based (har bir qator uchun alohida so‘rov yo‘q):
+    1) yakuniy xato bo‘lgan, lekin refund qilinmagan esselar -> balans qaytariladi;
+       pul yechilgan, lekin navbatga yozilmagan esselar ham
+    2) jarayondagi foydalanuvchilar uchun lock tiklanadi / uzaytiriladi
+    3) hech qanday esse bilan bog‘lanmagan eski lock'lar ochiladi
+    """
+    report = ReconcileReport()
+    pool = require_pool()
+
+    async with pool.acquire() as conn:
+        # 1a) Refund (worker refund qilishdan oldin o‘lgan bo‘lsa)
+        report.jobs_refunded = await conn.fetchval(
+            f"""
+            WITH j AS (
+                UPDATE essay_jobs
+                SET refunded_at = now()
+                WHERE status = 'failed'
+                  AND refunded_at IS NULL
+                  AND finished_at < now() - interval '2 minutes'
+                RETURNING user_id, essay_id
+            ),
+            {_REFUND_CTES.format(source="j")}
+            SELECT count(*) FROM entry
+            """
+        )
+
+        # 1b) Pul yechilgan, lekin esse navbatga umuman yozilmagan (crash)
+        report.charges_refunded = await conn.fetchval(
+            f"""
+            WITH orphan AS (
+                SELECT l.user_id, l.ref AS essay_id
+                FROM balance_ledger l
+                WHERE l.reason = 'essay_charge'
+                  AND l.created_at < now() - make_interval(secs => $1)
+                  AND l.created_at > now() - interval '7 days'
+                  AND NOT EXISTS (
+                      SELECT 1 FROM essay_jobs j WHERE j.essay_id = l.ref
+                  )
+            ),
+            {_REFUND_CTES.format(source="orphan")}
+            SELECT count(*) FROM entry
+            """,
+            RECONCILE_LOCK_GRACE_SECONDS,
+        )
+
+        # 2) Lock rebuild
+        report.locks_rebuilt = await conn.fetchval(
+            f"""
+            WITH active AS ({_ACTIVE_USERS_SQL}),
+            missing AS (
+                SELECT a.user_id
+                FROM active a
+                LEFT JOIN user_locks l
+                       ON l.user_id = a.user_id
+                      AND l.expires_at > now()
+                WHERE l.user_id IS NULL
+            ), upserted AS (
+                INSERT INTO user_locks (user_id, owner, expires_at)
+                SELECT user_id, $1, now() + make_interval(secs => $2)
+                FROM active
+                ON CONFLICT (user_id) DO UPDATE
+                SET expires_at   = GREATEST(user_locks.expires_at, EXCLUDED.expires_at),
+                    heartbeat_at = now()
+                RETURNING user_id
+            )
+            SELECT count(*) FROM missing
+            """,
+            RECONCILER_OWNER,
+            LOCK_LEASE_SECONDS,
+        )
+
+        # 3) Orphan lock'lar
+        status = await conn.execute(
+            f"""
+            DELETE FROM user_locks l
+            WHERE l.acquired_at < now() - make_interval(secs => $1)
+              AND l.user_id NOT IN ({_ACTIVE_USERS_SQL})
+            """,
+            RECONCILE_LOCK_GRACE_SECONDS,
+        )
+        # "DELETE 3"
+        report.locks_released = int(status.split()[-1])
+
+    if not report.is_empty:
+        print(f"🧹 Reconcile: {report}")
+    return report
@@ -0,0 +1,328 @@
+# bot/services/rubric.py
+#
+# RUBRIC_PROMPT dagi rasmiy jadval va chiqish formati (lokal ishlatish uchun).
+# JSON rejimida model faqat ballar va izohlarni qaytaradi — jami ball,
+# 75 ballik shkala va hisobot matni shu yerda hosil qilinadi.
+
+import re
+import json
+from decimal import Decimal
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+REPORT_HEADER = (
+    "Assalomu alaykum.\n"
+    "Sizning essengiz Sardor Toshmuhammadov tomonidan "
+    "UZBMB baholash mezonlari asosida tekshirildi."
+)
+
+# 24 ballik jami -> 75 ballik shkala (rasmiy matritsa, formula emas)
+SCALE_75 = {
+    **{x / 2: 27 + x for x in range(1, 49)},  # 0.5 -> 28 ... 24 -> 75
+    0.0: 0,
+}
+
+# STOP sabablari (prompt bilan bir xil yozilishi shart)
+STOP_OFF_TOPIC = "mavzuga mos emas"
+STOP_TOO_SHORT = "100 so‘zdan kam"
+STOP_COPIED = "ko‘chirilgan"
+STOP_EMPTY = "esse yo‘q"
+STOP_INTRO_ONLY = "faqat kirish"
+STOP_CYRILLIC = "to‘liq kirill"
+
+# A) -> 2 ball, B) -> 0 ball
+STOP_TOTALS = {
+    STOP_OFF_TOPIC: 2,
+    STOP_TOO_SHORT: 2,
+    STOP_COPIED: 2,
+    STOP_EMPTY: 0,
+    STOP_INTRO_ONLY: 0,
+    STOP_CYRILLIC: 0,
+}
+
+# 12 mezon: (JSON kaliti, hisobotdagi nomi) — STEP 2 tartibida
+CRITERIA = [
+    ("publitsistik_uslub", "Publitsistik uslub"),
+    ("qarashlar", "Qarashlar va shaxsiy fikr"),
+    ("dalillash", "Dalillash"),
+    ("tuzilma", "Kirish–asosiy qism–xulosa"),
+    ("xatboshilar", "Matn qurilishi va xatboshilar"),
+    ("izchillik", "Izchillik va takror"),
+    ("imlo", "Imlo"),
+    ("punktuatsiya", "Punktuatsiya"),
+    ("qoshimcha", "Qo‘shimcha qo‘llash"),
+    ("soz_qollash", "So‘z qo‘llash uslubiyati"),
+    ("leksik_boylik", "Leksik boylik"),
+    ("nutq_sofligi", "Nutq sofligi"),
+]
+
+# MATN BO‘YICHA IZOHLAR: (JSON kaliti, hisobotdagi nomi)
+COMMENTS = [
+    ("kirish", "Kirish qismi"),
+    ("asosiy_qism", "Asosiy qism"),
+    ("xulosa", "Xulosa"),
+    ("imlo", "Imlo"),
+    ("punktuatsiya", "Punktuatsiya"),
+]
+
+RECOMMENDATIONS = 5
+
+_POINTS = [0, 0.5, 1, 1.5, 2]
+
+
+def to_scale_75(total: float) -> int:
+    """
+    Jadvalda faqat 0.5 qadamli qiymatlar bor — eng yaqiniga yaxlitlanadi.
+    """
+    total = max(0.0, min(24.0, round(total * 2) / 2))
+    return SCALE_75[total]
+
+
+def _fmt(points: float) -> str:
+    return str(int(points)) if float(points).is_integer() else str(points)
+
+
+def render_stop(reason: str, total: float) -> str:
+    return (
+        f"{REPORT_HEADER}\n\n"
+        "STOP NATIJA:\n"
+        f"Sabab: {reason}\n"
+        f"Jami ball: {_fmt(total)} / 24\n"
+        f"75 ballik shkala bo‘yicha: {to_scale_75(total)} / 75"
+    )
+
+
+# ============================================================
+# JSON rejimi
+# ============================================================
+
+RUBRIC_JSON_SCHEMA = {
+    "type": "object",
+    "additionalProperties": False,
+    "required": ["stop_reason", "scores", "comments", "recommendations", "conclusion"],
+    "properties": {
+        "stop_reason": {
+            "anyOf": [
+                {"type": "string", "enum": list(STOP_TOTALS)},
+                {"type": "null"},
+            ],
+        },
+        "scores": {
+            "type": "object",
+            "additionalProperties": False,
+            "required": [key for key, _ in CRITERIA],
+            "properties": {
+                key: {"type": "number", "enum": _POINTS} for key, _ in CRITERIA
+            },
+        },
+        "comments": {
+            "type": "object",
+            "additionalProperties": False,
+            "required": [key for key, _ in COMMENTS],
+            "properties": {key: {"type": "string"} for key, _ in COMMENTS},
+        },
+        # STOP holatida [] (prompt), aks holda aynan RECOMMENDATIONS ta
+        "recommendations": {
+            "anyOf": [
+                {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "minItems": RECOMMENDATIONS,
+                    "maxItems": RECOMMENDATIONS,
+                },
+                {"type": "array", "items": {"type": "string"}, "maxItems": 0},
+            ],
+        },
+        "conclusion": {"type": "string"},
+    },
+}
+
+
+@dataclass
+class RubricResult:
+    stop_reason: Optional[str] = None
+    scores: Dict[str, float] = field(default_factory=dict)
+    comments: Dict[str, str] = field(default_factory=dict)
+    recommendations: List[str] = field(default_factory=list)
+    conclusion: str = ""
+
+    @classmethod
+    def from_json(cls, raw: str) -> "RubricResult":
+        """
+        Model javobi (RUBRIC_JSON_SCHEMA). Ballar 0.5 qadamga va 0–2 oralig‘iga keltiriladi.
+        Noto‘g‘ri javob -> ValueError (job qayta urinadi).
+        """
+        data: Any = json.loads(raw)
+        if not isinstance(data, dict):
+            raise ValueError("JSON obyekt kutilgan edi")
+
+        stop_reason = data.get("stop_reason") or None
+        if stop_reason is not None and stop_reason not in STOP_TOTALS:
+            raise ValueError(f"noma’lum STOP sababi: {stop_reason}")
+
+        raw_scores = data.get("scores") or {}
+        scores = {}
+        for key, _ in CRITERIA:
+            if stop_reason is None and key not in raw_scores:
+                raise ValueError(f"ball yo‘q: {key}")
+            value = float(raw_scores.get(key) or 0)
+            scores[key] = max(0.0, min(2.0, round(value * 2) / 2))
+
+        comments = data.get("comments") or {}
+        return cls(
+            stop_reason=stop_reason,
+            scores=scores,
+            comments={key: str(comments.get(key) or "").strip() for key, _ in COMMENTS},
+            recommendations=[
+                str(r).strip() for r in (data.get("recommendations") or []) if str(r).strip()
+            ][:RECOMMENDATIONS],
+            conclusion=str(data.get("conclusion") or "").strip(),
+        )
+
+    @property
+    def total(self) -> float:
+        if self.stop_reason is not None:
+            return STOP_TOTALS[self.stop_reason]
+        return sum(self.scores.get(key, 0) for key, _ in CRITERIA)
+
+    @property
+    def scale_75(self) -> int:
+        return to_scale_75(self.total)
+
+    def render(self) -> str:
+        """
+        Matn rejimidagi hisobot bilan bir xil ko‘rinish (OUTPUT FORMAT).
+        """
+        if self.stop_reason is not None:
+            return render_stop(self.stop_reason, self.total)
+
+        lines = [REPORT_HEADER, "", "BAHOLASH NATIJALARI:", ""]
+        for key, label in CRITERIA:
+            lines += [f"{label} — {_fmt(self.scores.get(key, 0))}", ""]
+
+        lines += [
+            f"Jami ball: {_fmt(self.total)} / 24",
+            f"75 ballik shkala bo‘yicha: {self.scale_75} / 75",
+            "",
+            "MATN BO‘YICHA IZOHLAR:",
+            "",
+        ]
+        for key, label in COMMENTS:
+            lines += [f"{label}: {self.comments.get(key) or '—'}", ""]
+
+        lines.append(f"BALLNI OSHIRISH UCHUN TAVSIYALAR ({RECOMMENDATIONS} ta):")
+        lines += [f"{i}. {rec}" for i, rec in enumerate(self.recommendations, start=1)]
+        lines += ["", "UMUMIY XULOSA:", self.conclusion]
+
+        return "\n".join(lines).strip()
+
+
+# ============================================================
+# Matn hisobotidan ballarni ajratib olish (essay_reviews.ai_result)
+# ============================================================
+
+# essay_reviews dagi tip ustunlar — INSERT va backfill shu tartibda yozadi
+SCORE_COLUMNS = (
+    ["stop_reason", "score_total", "score_75"]
+    + [f"score_{key}" for key, _ in CRITERIA]
+)
+
+_DASH = "[–—-]"
+_QUOTE = "[‘’'`ʻʼ]"
+
+
+def _label_re(label: str) -> "re.Pattern[str]":
+    parts = []
+    for ch in label:
+        if ch in "–—-":
+            parts.append(rf"\s*{_DASH}\s*")
+        elif ch in "‘’'`ʻʼ":
+            parts.append(_QUOTE)
+        elif ch == " ":
+            parts.append(r"\s+")
+        else:
+            parts.append(re.escape(ch))
+    return re.compile(
+        rf"^[\s*•\d.)]*{''.join(parts)}[\s*]*(?:{_DASH}|:)[\s*]*([0-2](?:[.,]5)?)\b",
+        re.IGNORECASE | re.MULTILINE,
+    )
+
+
+_CRITERIA_RE = [(key, _label_re(label)) for key, label in CRITERIA]
+_TOTAL_RE = re.compile(r"Jami\s+ball\s*:\s*(\d{1,2}(?:[.,]5)?)\s*/\s*24", re.IGNORECASE)
+_SCALE_RE = re.compile(rf"75\s+ballik\s+shkala\s+bo{_QUOTE}yicha\s*:\s*(\d{{1,2}})\s*/\s*75", re.IGNORECASE)
+_STOP_RE = re.compile(r"STOP\s+NATIJA\s*:\s*\n\s*Sabab\s*:\s*(.+)", re.IGNORECASE)
+_SECTION_START_RE = re.compile(r"BAHOLASH\s+NATIJALARI", re.IGNORECASE)
+_SECTION_END_RE = re.compile(rf"MATN\s+BO{_QUOTE}YICHA\s+IZOHLAR", re.IGNORECASE)
+
+
+def _num(value: str) -> float:
+    return float(value.replace(",", "."))
+
+
+@dataclass
+class ParsedScores:
+    stop_reason: Optional[str]
+    total: Optional[float]
+    scale_75: Optional[int]
+    # topilmagan mezon — None
+    scores: Dict[str, Optional[float]] = field(default_factory=dict)
+
+    def columns(self) -> list:
+        """
+        SCORE_COLUMNS tartibida qiymatlar (NUMERIC ustunlar uchun Decimal).
+        """
+        def dec(v: Optional[float]) -> Optional[Decimal]:
+            return None if v is None else Decimal(str(v))
+
+        return [self.stop_reason, dec(self.total), self.scale_75] + [
+            dec(self.scores.get(key)) for key, _ in CRITERIA
+        ]
+
+
+def parse_report(text: str) -> Optional[ParsedScores]:
+    """
+    "BAHOLASH NATIJALARI" / "STOP NATIJA" formatidagi hisobotdan ballar.
+    Hisobotda yozilgan jami ball / 75 shkala saqlanadi (foydalanuvchi shuni ko‘rgan);
+    yo‘q bo‘lsa — mezonlardan hisoblanadi. Hech narsa topilmasa — None.
+    """
+    if not text:
+        return None
+
+    total_m = _TOTAL_RE.search(text)
+    scale_m = _SCALE_RE.search(text)
+    total = _num(total_m.group(1)) if total_m else None
+    scale = int(scale_m.group(1)) if scale_m else None
+
+    stop_m = _STOP_RE.search(text)
+    if stop_m:
+        reason = stop_m.group(1).strip()
+        if total is None:
+            total = STOP_TOTALS.get(reason)
+        if scale is None and total is not None:
+            scale = to_scale_75(total)
+        return ParsedScores(stop_reason=reason, total=total, scale_75=scale)
+
+    # mezonlar faqat ballar bo‘limida qidiriladi ("Imlo: 2 ta xato" izohlarda ham bor)
+    start_m = _SECTION_START_RE.search(text)
+    end_m = _SECTION_END_RE.search(text)
+    section = text[
+        start_m.end() if start_m else 0:
+        end_m.start() if end_m else len(text)
+    ]
+
+    scores: Dict[str, Optional[float]] = {}
+    for key, pattern in _CRITERIA_RE:
+        m = pattern.search(section)
+        scores[key] = _num(m.group(1)) if m else None
+
+    found = [v for v in scores.values() if v is not None]
+    if not found and total is None:
+        return None
+
+    if total is None and len(found) == len(CRITERIA):
+        total = sum(found)
+    if scale is None and total is not None:
+        scale = to_scale_75(total)
+
+    return ParsedScores(stop_reason=None, total=total, scale_75=scale, scores=scores)
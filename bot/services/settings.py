@@ -0,0 +1,44 @@
+# bot/services/settings.py
+#
+# Admin buyruqlari bilan o‘zgaradigan sozlamalar (bot_settings jadvali).
+# Barcha processlar (bot + python -m bot.worker) bitta qiymatni ko‘radi;
+# o‘qish qisqa TTL cache bilan — har esse uchun DB ga bormaydi.
+
+import time
+from typing import Dict, Optional, Tuple
+
+from bot.services.db import require_pool
+
+# Boshqa processlar o‘zgarishni ko‘pi bilan shuncha kechikib ko‘radi
+SETTINGS_CACHE_SECONDS = 5
+
+# key -> (o‘qilgan vaqt, qiymat)
+_cache: Dict[str, Tuple[float, Optional[str]]] = {}
+
+
+async def get_setting(key: str, default: Optional[str] = None) -> Optional[str]:
+    cached = _cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < SETTINGS_CACHE_SECONDS:
+        value = cached[1]
+    else:
+        pool = require_pool()
+        value = await pool.fetchval("SELECT value FROM bot_settings WHERE key = $1", key)
+        _cache[key] = (time.monotonic(), value)
+
+    return default if value is None else value
+
+
+async def set_setting(key: str, value: str) -> None:
+    pool = require_pool()
+    await pool.execute(
+        """
+        INSERT INTO bot_settings (key, value)
+        VALUES ($1, $2)
+        ON CONFLICT (key) DO UPDATE
+        SET value = EXCLUDED.value,
+            updated_at = now()
+        """,
+        key,
+        value,
+    )
+    _cache[key] = (time.monotonic(), value)
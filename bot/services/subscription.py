@@ -1,15 +1,62 @@
+import os
+import time
+from collections import OrderedDict
+
 from aiogram import Bot
 from aiogram.enums import ChatMemberStatus
 from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 
 CHANNEL_USERNAME = "@sardortoshmuhammad_onatili"
 
+# Obuna bor -> uzoqroq eslab qolamiz; obuna yo‘q -> qisqa (obuna bo‘lgach tez o‘tsin)
+SUBSCRIPTION_POSITIVE_TTL = int(os.getenv("SUBSCRIPTION_POSITIVE_TTL", "600"))
+SUBSCRIPTION_NEGATIVE_TTL = int(os.getenv("SUBSCRIPTION_NEGATIVE_TTL", "10"))
+SUBSCRIPTION_CACHE_SIZE = int(os.getenv("SUBSCRIPTION_CACHE_SIZE", "10000"))
+
+# user_id -> (expires_at monotonic, subscribed)
+_cache: "OrderedDict[int, tuple[float, bool]]" = OrderedDict()
+
+_stats = {"hits": 0, "misses": 0}
+
+
+def _cache_get(user_id: int) -> bool | None:
+    item = _cache.get(user_id)
+    if item is None:
+        return None
+
+    expires_at, subscribed = item
+    if expires_at <= time.monotonic():
+        _cache.pop(user_id, None)
+        return None
+
+    _cache.move_to_end(user_id)
+    return subscribed
+
+
+def _cache_put(user_id: int, subscribed: bool) -> None:
+    ttl = SUBSCRIPTION_POSITIVE_TTL if subscribed else SUBSCRIPTION_NEGATIVE_TTL
+    _cache[user_id] = (time.monotonic() + ttl, subscribed)
+    _cache.move_to_end(user_id)
+    while len(_cache) > SUBSCRIPTION_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+async def is_user_subscribed(bot: Bot, user_id: int, *, fresh: bool = False) -> bool:
+    """
+    fresh=True — faqat cache'dagi salbiy natija chetlab o‘tiladi ("✅ Tekshirish":
+    user hozirgina obuna bo‘lgan bo‘lishi mumkin); ijobiy natija cache'dan olinadi.
+    """
+    cached = _cache_get(user_id)
+    if cached is not None and (cached or not fresh):
+        _stats["hits"] += 1
+        return cached
+
+    _stats["misses"] += 1
 
-async def is_user_subscribed(bot: Bot, user_id: int) -> bool:
     try:
         member = await bot.get_chat_member(CHANNEL_USERNAME, user_id)
 
-        return member.status in (
+        subscribed = member.status in (
             ChatMemberStatus.MEMBER,
             ChatMemberStatus.ADMINISTRATOR,
             ChatMemberStatus.CREATOR,
@@ -19,4 +66,11 @@ async def is_user_subscribed(bot: Bot, user_id: int) -> bool:
         # - user kanalga obuna emas
         # - kanal topilmadi
         # - botda huquq yo‘q
-        return False
+        subscribed = False
+
+    _cache_put(user_id, subscribed)
+    return subscribed
+
+
+def subscription_cache_stats() -> dict:
+    return {**_stats, "size": len(_cache)}
@@ -0,0 +1,149 @@
+# bot/services/voice_delivery.py
+import os
+import asyncio
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from bot.services.db import require_pool
+from bot.services.locks import unlock_many
+
+# Ovozli izoh foydalanuvchiga qancha vaqtdan keyin yuboriladi
+VOICE_DELIVERY_DELAY_MINUTES = int(os.getenv("VOICE_DELIVERY_DELAY_MINUTES", "30"))
+
+# Sweeper: har N sekundda vaqti kelganlarni bitta so‘rov bilan oladi
+VOICE_SWEEP_SECONDS = int(os.getenv("VOICE_SWEEP_SECONDS", "15"))
+VOICE_SWEEP_BATCH = int(os.getenv("VOICE_SWEEP_BATCH", "100"))
+VOICE_SEND_CONCURRENCY = int(os.getenv("VOICE_SEND_CONCURRENCY", "8"))
+# Olingan qator shu vaqt ichida yuborilmasa — keyingi sweep qayta oladi
+VOICE_CLAIM_SECONDS = int(os.getenv("VOICE_CLAIM_SECONDS", "120"))
+VOICE_MAX_ATTEMPTS = int(os.getenv("VOICE_MAX_ATTEMPTS", "5"))
+
+VOICE_CAPTION = (
+    "🎙 Ustozning ovozli izohi\n\n"
+    "Essengiz bo‘yicha batafsil fikrlar yuborildi."
+)
+
+
+async def _claim_due(conn) -> list:
+    """
+    Vaqti kelgan qatorlarni oladi va voice_due_at ni "lease" sifatida suradi —
+    bir nechta sweeper/replica bir qatorni ikki marta yubormaydi.
+    """
+    return await conn.fetch(
+        """
+        UPDATE essay_reviews
+        SET voice_due_at   = now() + make_interval(secs => $2),
+            voice_attempts = voice_attempts + 1
+        WHERE essay_id IN (
+            SELECT essay_id
+            FROM essay_reviews
+            WHERE status = 'voice_scheduled'
+              AND voice_due_at <= now()
+            ORDER BY voice_due_at
+            LIMIT $1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING essay_id, user_id, voice_file_id, voice_attempts
+        """,
+        VOICE_SWEEP_BATCH,
+        VOICE_CLAIM_SECONDS,
+    )
+
+
+async def _send_one(bot, row, sem: asyncio.Semaphore) -> Optional[int]:
+    # rate limit: OutboundThrottle (bot session middleware)
+    async with sem:
+        try:
+            sent = await bot.send_voice(
+                chat_id=int(row["user_id"]),
+                voice=row["voice_file_id"],
+                caption=VOICE_CAPTION,
+            )
+            return sent.message_id
+        except Exception as e:
+            print(f"❌ send_voice ERROR essay_id={row['essay_id']}: {e}")
+            return None
+
+
+async def sweep_due_voices(bot) -> int:
+    """
+    Bitta davriy job: vaqti kelgan barcha ovozli izohlarni yuboradi.
+    - 1 ta SELECT (partial index: voice_due_at WHERE status='voice_scheduled')
+    - parallel yuborish (semaphore; rate limit — OutboundThrottle)
+    - 1 ta bulk UPDATE ... voice_sent
+    Startupda ham darhol ishga tushadi — restart paytida qolib ketganlar
+    shu yerda yuboriladi.
+    """
+    pool = require_pool()
+    sem = asyncio.Semaphore(VOICE_SEND_CONCURRENCY)
+    total_sent = 0
+
+    while True:
+        async with pool.acquire() as conn:
+            rows = await _claim_due(conn)
+
+        if not rows:
+            break
+
+        msg_ids = await asyncio.gather(*(_send_one(bot, r, sem) for r in rows))
+
+        sent: List[Tuple[str, int]] = []
+        given_up: List[str] = []
+        unlock_ids: List[int] = []
+
+        for row, msg_id in zip(rows, msg_ids):
+            if msg_id is not None:
+                sent.append((row["essay_id"], msg_id))
+                unlock_ids.append(int(row["user_id"]))
+            elif row["voice_attempts"] >= VOICE_MAX_ATTEMPTS:
+                given_up.append(row["essay_id"])
+                unlock_ids.append(int(row["user_id"]))
+
+        now_aware = datetime.now(timezone.utc)  # timestamptz
+        now_naive_utc = datetime.utcnow()       # timestamp (no tz) columns
+
+        async with pool.acquire() as conn:
+            if sent:
+                # ✅ bulk update: only if still scheduled
+                await conn.execute(
+                    """
+                    UPDATE essay_reviews e
+                    SET status          = 'voice_sent',
+                        sent_to_user_at = $3,
+                        voice_sent_at   = $4,
+                        voice_msg_id    = s.msg_id
+                    FROM unnest($1::text[], $2::bigint[]) AS s(essay_id, msg_id)
+                    WHERE e.essay_id = s.essay_id
+                      AND e.status = 'voice_scheduled'
+                    """,
+                    [essay_id for essay_id, _ in sent],
+                    [msg_id for _, msg_id in sent],
+                    now_aware,
+                    now_naive_utc,
+                )
+
+            if given_up:
+                # urinishlar tugadi — sweeper endi olmaydi (admin /resend qilishi mumkin)
+                await conn.execute(
+                    """
+                    UPDATE essay_reviews
+                    SET voice_due_at = NULL,
+                        user_unlocked_at = now()
+                    WHERE essay_id = ANY($1::text[])
+                      AND status = 'voice_scheduled'
+                    """,
+                    given_up,
+                )
+                print(f"⚠️ Voice yuborilmadi (urinishlar tugadi): {given_up}")
+
+        # 🔓 Unlock users so they can submit again
+        await unlock_many(unlock_ids)
+
+        total_sent += len(sent)
+
+        if len(rows) < VOICE_SWEEP_BATCH:
+            break
+
+    if total_sent:
+        print(f"🎙 Voice sweep: {total_sent} ta yuborildi")
+    return total_sent
@@ -0,0 +1,123 @@
+# bot/tools/backfill_scores.py
+#
+# Eski essay_reviews qatorlari uchun ball ustunlarini to‘ldiradi.
+# To‘xtatib, qayta ishga tushirish mumkin: scores_parsed_at IS NULL qatorlar
+# bo‘laklab olinadi (ajratib bo‘lmagan hisobot ham belgilanadi — qayta aylanmaydi).
+#
+#   python -m bot.tools.backfill_scores
+#   python -m bot.tools.backfill_scores --batch 500 --sleep 0.2
+#   python -m bot.tools.backfill_scores --all      # parser o‘zgarganda hammasini qayta
+#   python -m bot.tools.backfill_scores --all --after essay_ab12...   # --all ni davom ettirish
+
+import argparse
+import asyncio
+import time
+
+from bot.services.db import init_db, require_pool
+from bot.services.rubric import SCORE_COLUMNS, parse_report
+
+# unnest ustunlari: essay_id + SCORE_COLUMNS
+_TYPES = ["text", "numeric", "smallint"] + ["numeric"] * (len(SCORE_COLUMNS) - 3)
+
+_UPDATE_SQL = f"""
+    UPDATE essay_reviews r
+    SET {", ".join(f"{col} = u.{col}" for col in SCORE_COLUMNS)},
+        scores_parsed_at = now()
+    FROM unnest(
+        $1::text[],
+        {", ".join(f"${i + 2}::{t}[]" for i, t in enumerate(_TYPES))}
+    ) AS u(essay_id, {", ".join(SCORE_COLUMNS)})
+    WHERE r.essay_id = u.essay_id
+"""
+
+
+async def _write(conn, rows) -> int:
+    essay_ids = []
+    columns = [[] for _ in SCORE_COLUMNS]
+    parsed_count = 0
+
+    for row in rows:
+        parsed = parse_report(row["ai_result"])
+        if parsed is not None:
+            parsed_count += 1
+            values = parsed.columns()
+        else:
+            values = [None] * len(SCORE_COLUMNS)
+
+        essay_ids.append(row["essay_id"])
+        for col, value in zip(columns, values):
+            col.append(value)
+
+    await conn.execute(_UPDATE_SQL, essay_ids, *columns)
+    return parsed_count
+
+
+async def backfill(batch: int, pause: float, reparse_all: bool, after: str = "") -> None:
+    await init_db()
+    pool = require_pool()
+
+    started = time.monotonic()
+    seen = 0
+    parsed = 0
+    last_id = after
+
+    while True:
+        async with pool.acquire() as conn:
+            if reparse_all:
+                # keyset: to‘xtasa — oxirgi chop etilgan essay_id bilan --after
+                rows = await conn.fetch(
+                    """
+                    SELECT essay_id, ai_result
+                    FROM essay_reviews
+                    WHERE essay_id > $1
+                    ORDER BY essay_id
+                    LIMIT $2
+                    """,
+                    last_id,
+                    batch,
+                )
+            else:
+                rows = await conn.fetch(
+                    """
+                    SELECT essay_id, ai_result
+                    FROM essay_reviews
+                    WHERE scores_parsed_at IS NULL
+                    ORDER BY essay_id
+                    LIMIT $1
+                    """,
+                    batch,
+                )
+
+            if not rows:
+                break
+
+            parsed += await _write(conn, rows)
+
+        seen += len(rows)
+        last_id = rows[-1]["essay_id"]
+        print(f"… {seen} ta qator ({parsed} ta ball ajratildi), oxirgi: {last_id}")
+
+        if len(rows) < batch:
+            break
+        if pause:
+            await asyncio.sleep(pause)
+
+    print(
+        f"✅ Tayyor: {seen} ta qator, {parsed} ta ball ajratildi, "
+        f"{seen - parsed} ta formatsiz ({time.monotonic() - started:.1f}s)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="essay_reviews ball ustunlarini to‘ldirish")
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--sleep", type=float, default=0.0, help="bo‘laklar orasida pauza (s)")
+    parser.add_argument("--all", action="store_true", help="allaqachon to‘ldirilganlarni ham qayta")
+    parser.add_argument("--after", default="", help="--all: shu essay_id dan keyingilar")
+    args = parser.parse_args()
+
+    asyncio.run(backfill(args.batch, args.sleep, args.all, args.after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# bot/tools/bench_prescreen.py
+#
+# Lokal STOP tekshiruvi qancha OpenAI chaqiruvini tejashini o‘lchaydi.
+#
+#   python -m bot.tools.bench_prescreen                    # bot/tools/samples/prescreen_corpus.jsonl
+#   python -m bot.tools.bench_prescreen --corpus my.jsonl  # {"topic", "essay_text", "expected"}
+#   python -m bot.tools.bench_prescreen --db 5000          # oxirgi 5000 ta essay_reviews
+#
+# --db rejimida "expected" model natijasidan olinadi (STOP NATIJA -> Sabab: ...).
+# Noto‘g‘ri STOP (model baholagan, lokal STOP bergan) — eng muhim ko‘rsatkich, 0 bo‘lishi kerak.
+# receive_essay dagi so‘z chegarasi (100–350) dan o‘tmagan esselar hisobga olinmaydi —
+# ular prescreen gacha ham, OpenAI gacha ham yetmaydi.
+
+import argparse
+import asyncio
+import json
+import re
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional
+
+from bot.services.prescreen import prescreen
+from bot.services.word_count import count_words
+
+DEFAULT_CORPUS = Path(__file__).parent / "samples" / "prescreen_corpus.jsonl"
+
+# receive_essay bilan bir xil
+MIN_WORDS = 100
+MAX_WORDS = 350
+
+_STOP_REASON_RE = re.compile(r"STOP NATIJA:\s*\n\s*Sabab:\s*(.+)")
+
+
+def _expected_from_ai_result(ai_result: Optional[str]) -> Optional[str]:
+    m = _STOP_REASON_RE.search(ai_result or "")
+    return m.group(1).strip() if m else None
+
+
+def load_corpus(path: Path) -> List[dict]:
+    with path.open(encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+async def load_db(limit: int) -> List[dict]:
+    from bot.services.db import init_db, require_pool
+
+    await init_db()
+    rows = await require_pool().fetch(
+        """
+        SELECT topic, essay_text, ai_result
+        FROM essay_reviews
+        ORDER BY created_at DESC
+        LIMIT $1
+        """,
+        limit,
+    )
+    return [
+        {
+            "topic": r["topic"],
+            "essay_text": r["essay_text"],
+            "expected": _expected_from_ai_result(r["ai_result"]),
+        }
+        for r in rows
+    ]
+
+
+def run(corpus: List[dict], repeat: int) -> None:
+    rejected = len(corpus)
+    corpus = [
+        item for item in corpus
+        if MIN_WORDS <= count_words(item["essay_text"]) <= MAX_WORDS
+    ]
+    rejected -= len(corpus)
+
+    stopped = Counter()
+    expected_stops = 0
+    correct = 0
+    false_stops = 0
+    missed = 0
+    wrong_reason = 0
+
+    for item in corpus:
+        verdict = prescreen(item["topic"], item["essay_text"])
+        got = verdict.reason if verdict else None
+        expected = item.get("expected")
+
+        if expected:
+            expected_stops += 1
+        if got:
+            stopped[got] += 1
+
+        if got == expected:
+            correct += 1
+        elif got and not expected:
+            false_stops += 1
+        elif expected and not got:
+            missed += 1
+        else:
+            wrong_reason += 1
+
+    # tezlik
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for item in corpus:
+            prescreen(item["topic"], item["essay_text"])
+    elapsed = time.perf_counter() - started
+    per_essay_us = elapsed / max(len(corpus) * repeat, 1) * 1_000_000
+
+    total = len(corpus)
+    avoided = sum(stopped.values())
+
+    print(f"Esselar: {total} (+{rejected} tasi so‘z soni bo‘yicha handler'da rad etiladi)")
+    print(f"OpenAI chaqiruvisiz: {avoided} ({avoided / total:.1%})" if total else "OpenAI chaqiruvisiz: 0")
+    for reason, n in stopped.most_common():
+        print(f"  • {reason}: {n}")
+    print(f"Kutilgan STOP (model/korpus): {expected_stops}, shundan lokal topildi: {expected_stops - missed}")
+    print(f"Mos keldi: {correct}/{total}")
+    print(f"Noto‘g‘ri STOP: {false_stops}")
+    print(f"Sababi boshqa: {wrong_reason}")
+    print(f"O‘tkazib yuborilgan (model hal qiladi): {missed}")
+    print(f"Tezlik: {per_essay_us:.1f} µs / esse")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Lokal STOP tekshiruvi benchmark")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("--db", type=int, metavar="N", help="essay_reviews dan oxirgi N ta esse")
+    parser.add_argument("--repeat", type=int, default=200, help="tezlik o‘lchash uchun takrorlar")
+    args = parser.parse_args()
+
+    corpus = asyncio.run(load_db(args.db)) if args.db else load_corpus(args.corpus)
+    run(corpus, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# bot/tools/fake_batch_server.py
+#
+# OpenAI Batch API ning lokal o‘rinbosari (batch rejimini OpenAI'siz sinash uchun).
+# Faqat bot ishlatadigan endpointlar: files (upload / content) va batches (create / retrieve / cancel).
+# Natijalar soxta, lekin formati haqiqiy: matn rejimida rubrika hisoboti,
+# JSON rejimida RUBRIC_JSON_SCHEMA ga mos javob (ballar esse hash'idan).
+#
+#   python -m bot.tools.fake_batch_server --port 8787 --delay 30 --fail-every 10
+#   OPENAI_BATCH_BASE_URL=http://127.0.0.1:8787/v1 python -m bot.main
+
+import argparse
+import hashlib
+import json
+import time
+import uuid
+
+from aiohttp import web
+
+from bot.services.rubric import COMMENTS, CRITERIA, RECOMMENDATIONS, RubricResult
+
+_POINTS = [0, 0.5, 1, 1.5, 2]
+
+
+def _fake_rubric(body: dict) -> RubricResult:
+    seed = hashlib.sha256(str(body.get("input", "")).encode("utf-8")).digest()
+    return RubricResult(
+        scores={key: _POINTS[2 + seed[i] % 3] for i, (key, _) in enumerate(CRITERIA)},
+        comments={key: "Soxta izoh (fake batch server)." for key, _ in COMMENTS},
+        recommendations=[f"Soxta tavsiya {i + 1}." for i in range(RECOMMENDATIONS)],
+        conclusion="Soxta xulosa (fake batch server).",
+    )
+
+
+def _fake_response(body: dict) -> dict:
+    rubric = _fake_rubric(body)
+    text_format = ((body.get("text") or {}).get("format") or {}).get("type")
+    if text_format == "json_schema":
+        text = json.dumps(
+            {
+                "stop_reason": None,
+                "scores": rubric.scores,
+                "comments": rubric.comments,
+                "recommendations": rubric.recommendations,
+                "conclusion": rubric.conclusion,
+            },
+            ensure_ascii=False,
+        )
+    else:
+        text = rubric.render()
+
+    input_tokens = len(str(body.get("instructions", ""))) // 4 + len(str(body.get("input", ""))) // 4
+    return {
+        "id": f"resp_{uuid.uuid4().hex}",
+        "object": "response",
+        "model": body.get("model"),
+        "status": "completed",
+        "output": [
+            {
+                "type": "message",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": text}],
+            }
+        ],
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": len(text) // 4,
+            "output_tokens_details": {"reasoning_tokens": 0},
+        },
+    }
+
+
+class FakeBatchServer:
+    def __init__(self, delay: float, fail_every: int) -> None:
+        self.delay = delay
+        self.fail_every = fail_every
+        # file_id -> (filename, purpose, content)
+        self.files: dict = {}
+        self.batches: dict = {}
+
+    def _store_file(self, filename: str, purpose: str, content: bytes) -> dict:
+        file_id = f"file-{uuid.uuid4().hex}"
+        self.files[file_id] = (filename, purpose, content)
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+
+    # ---------- files ----------
+
+    async def create_file(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        upload = form["file"]
+        content = upload.file.read()
+        return web.json_response(self._store_file(upload.filename, form.get("purpose", ""), content))
+
+    async def file_content(self, request: web.Request) -> web.Response:
+        item = self.files.get(request.match_info["file_id"])
+        if item is None:
+            return web.json_response({"error": {"message": "file not found"}}, status=404)
+        return web.Response(body=item[2], content_type="application/jsonl")
+
+    # ---------- batches ----------
+
+    async def create_batch(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        if data.get("input_file_id") not in self.files:
+            return web.json_response({"error": {"message": "input file not found"}}, status=400)
+
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        self.batches[batch_id] = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": data.get("endpoint"),
+            "input_file_id": data["input_file_id"],
+            "completion_window": data.get("completion_window", "24h"),
+            "status": "in_progress",
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": int(time.time()),
+            "metadata": data.get("metadata"),
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        print(f"📥 batch {batch_id}")
+        return web.json_response(self.batches[batch_id])
+
+    def _complete(self, batch: dict) -> None:
+        lines = self.files[batch["input_file_id"]][2].decode("utf-8").splitlines()
+        output, errors = [], []
+
+        for n, line in enumerate(filter(None, lines), start=1):
+            item = json.loads(line)
+            if self.fail_every and n % self.fail_every == 0:
+                errors.append({
+                    "id": f"batch_req_{n}",
+                    "custom_id": item["custom_id"],
+                    "response": None,
+                    "error": {"code": "server_error", "message": "fake failure"},
+                })
+                continue
+            output.append({
+                "id": f"batch_req_{n}",
+                "custom_id": item["custom_id"],
+                "response": {"status_code": 200, "body": _fake_response(item["body"])},
+                "error": None,
+            })
+
+        def _jsonl(rows: list) -> bytes:
+            return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows).encode("utf-8")
+
+        if output:
+            batch["output_file_id"] = self._store_file("output.jsonl", "batch_output", _jsonl(output))["id"]
+        if errors:
+            batch["error_file_id"] = self._store_file("errors.jsonl", "batch_output", _jsonl(errors))["id"]
+
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+        batch["request_counts"] = {
+            "total": len(output) + len(errors),
+            "completed": len(output),
+            "failed": len(errors),
+        }
+        print(f"✅ batch {batch['id']}: {len(output)} ok, {len(errors)} xato")
+
+    async def retrieve_batch(self, request: web.Request) -> web.Response:
+        batch = self.batches.get(request.match_info["batch_id"])
+        if batch is None:
+            return web.json_response({"error": {"message": "batch not found"}}, status=404)
+
+        if batch["status"] == "in_progress" and time.time() - batch["created_at"] >= self.delay:
+            self._complete(batch)
+        return web.json_response(batch)
+
+    async def cancel_batch(self, request: web.Request) -> web.Response:
+        batch = self.batches.get(request.match_info["batch_id"])
+        if batch is None:
+            return web.json_response({"error": {"message": "batch not found"}}, status=404)
+
+        if batch["status"] == "in_progress":
+            batch["status"] = "cancelled"
+            print(f"🛑 batch {batch['id']} bekor qilindi")
+        return web.json_response(batch)
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=200 * 1024 * 1024)
+        app.router.add_post("/v1/files", self.create_file)
+        app.router.add_get("/v1/files/{file_id}/content", self.file_content)
+        app.router.add_post("/v1/batches", self.create_batch)
+        app.router.add_get("/v1/batches/{batch_id}", self.retrieve_batch)
+        app.router.add_post("/v1/batches/{batch_id}/cancel", self.cancel_batch)
+        return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Lokal soxta OpenAI Batch API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--delay", type=float, default=10, help="batch shuncha sekunddan keyin tayyor")
+    parser.add_argument("--fail-every", type=int, default=0, help="har N-qator xato bilan qaytadi")
+    args = parser.parse_args()
+
+    server = FakeBatchServer(args.delay, args.fail_every)
+    web.run_app(server.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
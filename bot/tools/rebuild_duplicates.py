@@ -0,0 +1,97 @@
+# bot/tools/rebuild_duplicates.py
+#
+# essay_signatures ni essay_reviews dan qayta quradi (oqim bilan — butun jadval
+# xotiraga yuklanmaydi: server-side cursor + bo‘laklab yozish).
+#
+#   python -m bot.tools.rebuild_duplicates          # faqat imzosi yo‘q esselar
+#   python -m bot.tools.rebuild_duplicates --all    # hammasini qayta hisoblash
+#
+# Ishlab turgan processlar yangilangan imzolarni seq orqali o‘zlari oladi.
+
+import argparse
+import asyncio
+import time
+
+from bot.services.db import init_db, require_pool
+from bot.services.duplicates import pack, signature
+
+BATCH_SIZE = 500
+
+
+async def _flush(conn, batch: list) -> None:
+    if not batch:
+        return
+
+    essay_ids, user_ids, hashes = zip(*batch)
+    await conn.execute(
+        """
+        INSERT INTO essay_signatures (essay_id, user_id, minhash)
+        SELECT * FROM unnest($1::text[], $2::bigint[], $3::bytea[])
+        ON CONFLICT (essay_id) DO UPDATE
+        SET user_id = EXCLUDED.user_id,
+            minhash = EXCLUDED.minhash,
+            seq     = DEFAULT
+        """,
+        list(essay_ids),
+        list(user_ids),
+        list(hashes),
+    )
+    batch.clear()
+
+
+async def rebuild(recompute_all: bool) -> None:
+    await init_db()
+    pool = require_pool()
+
+    where = "" if recompute_all else (
+        "WHERE NOT EXISTS (SELECT 1 FROM essay_signatures s WHERE s.essay_id = r.essay_id)"
+    )
+
+    started = time.monotonic()
+    seen = 0
+    written = 0
+    batch: list = []
+
+    async with pool.acquire() as read_conn, pool.acquire() as write_conn:
+        # cursor faqat tranzaksiya ichida ishlaydi
+        async with read_conn.transaction(readonly=True):
+            cursor = read_conn.cursor(
+                f"""
+                SELECT r.essay_id, r.user_id, r.essay_text
+                FROM essay_reviews r
+                {where}
+                ORDER BY r.created_at
+                """,
+                prefetch=BATCH_SIZE,
+            )
+            async for row in cursor:
+                seen += 1
+                sig = signature(row["essay_text"])
+                if sig is None:
+                    continue
+
+                batch.append((row["essay_id"], row["user_id"], pack(sig)))
+                written += 1
+
+                if len(batch) >= BATCH_SIZE:
+                    await _flush(write_conn, batch)
+                    print(f"… {seen} ta esse, {written} ta imzo")
+
+        await _flush(write_conn, batch)
+
+    print(
+        f"✅ Tayyor: {seen} ta esse o‘qildi, {written} ta imzo yozildi "
+        f"({time.monotonic() - started:.1f}s)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Near-duplicate indeksini qayta qurish")
+    parser.add_argument("--all", action="store_true", help="mavjud imzolarni ham qayta hisoblash")
+    args = parser.parse_args()
+
+    asyncio.run(rebuild(args.all))
+
+
+if __name__ == "__main__":
+    main()
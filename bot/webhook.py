@@ -0,0 +1,112 @@
+# bot/webhook.py
+#
+# Webhook rejimi (BOT_MODE=webhook): aiohttp server + aiogram dispatcher.
+# Update'lar parallel qayta ishlanadi (WEBHOOK_MAX_CONCURRENCY gacha),
+# bir nechta bot nusxasini load balancer ortiga qo‘yish mumkin.
+#
+# Lokal test (WEBHOOK_URL bo‘sh -> set_webhook chaqirilmaydi; WEBHOOK_SECRET doim majburiy):
+#   BOT_MODE=webhook WEBHOOK_SECRET=test python -m bot.main
+#   curl -X POST http://127.0.0.1:8080/webhook \
+#        -H "Content-Type: application/json" \
+#        -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET" \
+#        -d @update.json
+
+import os
+import hmac
+import asyncio
+from typing import Set
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Tashqi manzil, masalan https://bot.example.uz — bo‘sh bo‘lsa Telegramga ro‘yxatdan o‘tkazilmaydi
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+# Majburiy (WEBHOOK_URL bo‘sh bo‘lsa ham — load balancer ortidagi replica, qo‘lda
+# o‘rnatilgan webhook): usiz portga yeta oladigan istalgan kishi soxta update
+# (admin nomidan) yubora oladi
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Bir vaqtda qayta ishlanadigan update'lar soni
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "32"))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def create_app(bot: Bot, dp: Dispatcher) -> web.Application:
+    semaphore = asyncio.Semaphore(WEBHOOK_MAX_CONCURRENCY)
+    tasks: Set[asyncio.Task] = set()
+    in_flight = 0
+
+    async def _process(update: dict) -> None:
+        nonlocal in_flight
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception as e:
+            print(f"❌ webhook update ERROR (update_id={update.get('update_id')}): {e}")
+        finally:
+            in_flight -= 1
+            semaphore.release()
+
+    async def handle_update(request: web.Request) -> web.Response:
+        nonlocal in_flight
+        token = request.headers.get(SECRET_HEADER, "")
+        if not WEBHOOK_SECRET or not hmac.compare_digest(token.encode("utf-8"), WEBHOOK_SECRET.encode("utf-8")):
+            return web.Response(status=401)
+
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        # limit to‘lsa — javob kechikadi, Telegram sekinlashadi (backpressure)
+        await semaphore.acquire()
+        in_flight += 1
+        task = asyncio.create_task(_process(update))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+        return web.Response()
+
+    async def healthz(request: web.Request) -> web.Response:
+        return web.json_response({
+            "ok": True,
+            "in_flight": in_flight,
+        })
+
+    async def on_shutdown(app: web.Application) -> None:
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle_update)
+    app.router.add_get("/healthz", healthz)
+    app.on_shutdown.append(on_shutdown)
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher) -> None:
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("BOT_MODE=webhook: WEBHOOK_SECRET .env faylda topilmadi!")
+
+    runner = web.AppRunner(create_app(bot, dp))
+    await runner.setup()
+
+    site = web.TCPSite(runner, host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+    await site.start()
+    print(f"✅ Webhook server: http://{WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=min(WEBHOOK_MAX_CONCURRENCY, 100),
+        )
+        print("✅ Webhook Telegramga o‘rnatildi")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,157 @@
+# bot/worker.py
+#
+# Esse tekshiruvchi worker processlar (ingress'dan alohida).
+# Telegram update'larni bot.main qabul qiladi va essay_jobs'ga yozadi,
+# OpenAI chaqiruvlari va admin'ga yuborish shu yerda bajariladi.
+#
+#   ESSAY_WORKERS_IN_PROCESS=0 python -m bot.main      # faqat ingress
+#   python -m bot.worker                               # ESSAY_WORKER_SHARDS ta process
+#   python -m bot.worker --shard 1 --shards 4          # bitta shard (systemd / docker)
+#
+# Job'lar user_id % shards bo‘yicha bo‘linadi: bitta userning esselari
+# doim bitta processga tushadi. Ovozli izohlar sweeper'i va batch tsikli faqat shard 0 da.
+
+import argparse
+import asyncio
+import multiprocessing
+import signal
+import time
+from datetime import datetime, timezone
+
+from aiogram import Bot
+
+from bot.config import BOT_TOKEN
+from bot.handlers import essay
+from bot.middlewares.outbound import outbound_throttle
+from bot.services.batch_grading import BATCH_POLL_SECONDS, run_batch_cycle
+from bot.services.db import init_db
+from bot.services.essay_queue import (
+    ESSAY_WORKER_SHARDS,
+    start_essay_workers,
+    stop_essay_workers,
+)
+from bot.services.openai_client import close_client as close_openai_client
+from bot.services.scheduler import scheduler, start_scheduler
+from bot.services.voice_delivery import VOICE_SWEEP_SECONDS, sweep_due_voices
+
+# o‘lgan processni qayta ishga tushirishdan oldin kutish
+RESTART_DELAY_SECONDS = 5
+
+
+async def run_worker(shard: int, shards: int) -> None:
+    await init_db()
+
+    bot = Bot(token=BOT_TOKEN)
+    # global Telegram limiti: ingress (bot.main) + shards ta worker o‘rtasida
+    outbound_throttle.share(shards + 1)
+    bot.session.middleware(outbound_throttle)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    if shard == 0:
+        start_scheduler()
+
+        # 🎙 Vaqti kelgan ovozli izohlar
+        scheduler.add_job(
+            sweep_due_voices,
+            trigger="interval",
+            seconds=VOICE_SWEEP_SECONDS,
+            args=[bot],
+            id="voice_sweep",
+            next_run_time=datetime.now(timezone.utc),
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True,
+        )
+
+        # 📦 Batch rejimidagi esselar: yuborish + natijalarni yig‘ish
+        scheduler.add_job(
+            run_batch_cycle,
+            trigger="interval",
+            seconds=BATCH_POLL_SECONDS,
+            id="batch_grading",
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True,
+        )
+
+    start_essay_workers(bot, essay.process_essay_job, shard=shard, shards=shards)
+
+    try:
+        await stop.wait()
+    finally:
+        print(f"🛑 Worker shard {shard}/{shards} to‘xtamoqda")
+        if scheduler.running:
+            scheduler.shutdown(wait=False)
+        await stop_essay_workers()
+        await outbound_throttle.drain()
+        await close_openai_client()
+        await bot.session.close()
+
+
+def _run_shard(shard: int, shards: int) -> None:
+    asyncio.run(run_worker(shard, shards))
+
+
+def _supervise(shards: int) -> None:
+    """
+    Har bir shard — alohida process (CPU yadrolari bo‘yicha).
+    Process o‘lsa — qayta ishga tushiriladi.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    procs = {}
+
+    def spawn(shard: int):
+        p = ctx.Process(target=_run_shard, args=(shard, shards), name=f"essay-worker-{shard}")
+        p.start()
+        procs[shard] = p
+        print(f"✅ Worker shard {shard}/{shards} started (pid {p.pid})")
+
+    def on_term(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, on_term)
+
+    for shard in range(shards):
+        spawn(shard)
+
+    try:
+        while True:
+            time.sleep(1)
+            for shard, p in list(procs.items()):
+                if not p.is_alive():
+                    print(f"❌ Worker shard {shard} o‘ldi (exit {p.exitcode}), qayta ishga tushadi")
+                    time.sleep(RESTART_DELAY_SECONDS)
+                    spawn(shard)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in procs.values():
+            if p.is_alive():
+                p.terminate()
+        for p in procs.values():
+            p.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Esse tekshiruvchi worker processlar")
+    parser.add_argument("--shard", type=int, help="faqat shu shard (0..shards-1)")
+    parser.add_argument("--shards", type=int, default=ESSAY_WORKER_SHARDS)
+    args = parser.parse_args()
+
+    if args.shards < 1:
+        parser.error("--shards >= 1 bo‘lishi kerak")
+
+    if args.shard is not None:
+        if not 0 <= args.shard < args.shards:
+            parser.error("--shard 0..shards-1 oralig‘ida bo‘lishi kerak")
+        _run_shard(args.shard, args.shards)
+    else:
+        _supervise(args.shards)
+
+
+if __name__ == "__main__":
+    main()
@@ -165,3 +165,278 @@ CREATE TABLE IF NOT EXISTS essay_reviews (
 CREATE INDEX IF NOT EXISTS idx_essay_reviews_user_id ON essay_reviews(user_id);
 CREATE INDEX IF NOT EXISTS idx_essay_reviews_status ON essay_reviews(status);
 CREATE INDEX IF NOT EXISTS idx_essay_reviews_admin_msg ON essay_reviews(admin_chat_id, admin_msg_id);
+
+-- =========================
+-- GRADING CACHE (bir xil esse qayta yuborilsa OpenAI chaqirilmaydi)
+-- =========================
+CREATE TABLE IF NOT EXISTS grading_cache (
+    -- sha256(mavzu + esse + model + prompt versiyasi)
+    cache_key       TEXT PRIMARY KEY,
+    model           TEXT NOT NULL,
+    prompt_version  TEXT NOT NULL,
+    ai_result       TEXT NOT NULL,
+
+    hits            INTEGER NOT NULL DEFAULT 0,
+    created_at      TIMESTAMPTZ DEFAULT now(),
+    last_hit_at     TIMESTAMPTZ,
+    expires_at      TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_grading_cache_expires_at ON grading_cache(expires_at);
+
+-- =========================
+-- ESSAY JOBS (durable queue: workerlar FOR UPDATE SKIP LOCKED bilan oladi)
+-- =========================
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'essay_job_status') THEN
+        CREATE TYPE essay_job_status AS ENUM ('queued', 'running', 'done', 'failed');
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS essay_jobs (
+    job_id          BIGSERIAL PRIMARY KEY,
+    essay_id        TEXT NOT NULL UNIQUE,
+
+    user_id         BIGINT NOT NULL
+        REFERENCES users(user_id) ON DELETE CASCADE,
+    chat_id         BIGINT NOT NULL,
+
+    topic           TEXT NOT NULL,
+    essay_text      TEXT NOT NULL,
+    bypass_cache    BOOLEAN NOT NULL DEFAULT false,
+
+    status          essay_job_status NOT NULL DEFAULT 'queued',
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    max_attempts    INTEGER NOT NULL DEFAULT 3,
+
+    -- job qachondan olinishi mumkin (retry backoff)
+    run_after       TIMESTAMPTZ NOT NULL DEFAULT now(),
+    -- AI natija adminga qachondan ko‘rsatiladi
+    reveal_at       TIMESTAMPTZ NOT NULL DEFAULT now(),
+
+    -- visibility timeout: worker o‘lsa job shu vaqtdan keyin qayta olinadi
+    locked_until    TIMESTAMPTZ,
+    locked_by       TEXT,
+    last_error      TEXT,
+
+    created_at      TIMESTAMPTZ DEFAULT now(),
+    updated_at      TIMESTAMPTZ DEFAULT now(),
+    finished_at     TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_essay_jobs_ready
+    ON essay_jobs(run_after) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS idx_essay_jobs_user_id ON essay_jobs(user_id);
+
+-- =========================
+-- VOICE DELIVERY (yuborish vaqti DBda — restartdan keyin tiklanadi)
+-- =========================
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS voice_due_at TIMESTAMPTZ;
+
+-- eski 'voice_scheduled' qatorlar uchun
+UPDATE essay_reviews
+SET voice_due_at = COALESCE(voiced_at, now()) + interval '30 minutes'
+WHERE status = 'voice_scheduled'
+  AND voice_due_at IS NULL;
+
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS voice_attempts INTEGER NOT NULL DEFAULT 0;
+
+-- sweeper: faqat vaqti kelgan 'voice_scheduled' qatorlar
+CREATE INDEX IF NOT EXISTS idx_essay_reviews_voice_due
+    ON essay_reviews(voice_due_at) WHERE status = 'voice_scheduled';
+
+-- =========================
+-- USER LOCKS (lease: bir nechta bot process uchun umumiy)
+-- =========================
+CREATE TABLE IF NOT EXISTS user_locks (
+    user_id         BIGINT PRIMARY KEY,
+    owner           TEXT NOT NULL,
+    acquired_at     TIMESTAMPTZ NOT NULL DEFAULT now(),
+    heartbeat_at    TIMESTAMPTZ NOT NULL DEFAULT now(),
+    expires_at      TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_locks_owner ON user_locks(owner);
+
+-- =========================
+-- RECONCILER
+-- =========================
+-- refund qilingan yakuniy xato job'lar (ikki marta refund bo‘lmasligi uchun)
+ALTER TABLE essay_jobs ADD COLUMN IF NOT EXISTS refunded_at TIMESTAMPTZ;
+CREATE INDEX IF NOT EXISTS idx_essay_jobs_unrefunded
+    ON essay_jobs(finished_at) WHERE status = 'failed' AND refunded_at IS NULL;
+
+-- admin /cancel yoki voice yuborib bo‘lmaganda user lock'dan chiqarilgan
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS user_unlocked_at TIMESTAMPTZ;
+
+-- =========================
+-- BALANCE LEDGER (append-only; idempotency_key takroriy yechish/refundni to‘sadi)
+-- =========================
+CREATE TABLE IF NOT EXISTS balance_ledger (
+    entry_id         BIGSERIAL PRIMARY KEY,
+    -- charge:<essay_id> / refund:<essay_id> / payment:<payment_id> / free:<user_id>
+    idempotency_key  TEXT NOT NULL UNIQUE,
+    user_id          BIGINT NOT NULL
+        REFERENCES users(user_id),
+    delta            INTEGER NOT NULL,
+    reason           TEXT NOT NULL,
+    ref              TEXT,
+    created_at       TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_balance_ledger_user_id ON balance_ledger(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_balance_ledger_reason ON balance_ledger(reason, created_at);
+
+-- append-only
+CREATE OR REPLACE FUNCTION balance_ledger_append_only() RETURNS trigger AS $$
+BEGIN
+    RAISE EXCEPTION 'balance_ledger is append-only';
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_balance_ledger_append_only ON balance_ledger;
+CREATE TRIGGER trg_balance_ledger_append_only
+    BEFORE UPDATE OR DELETE ON balance_ledger
+    FOR EACH ROW EXECUTE FUNCTION balance_ledger_append_only();
+
+-- =========================
+-- FSM STATES (aiogram storage; restart va replikalar o‘rtasida umumiy)
+-- =========================
+CREATE TABLE IF NOT EXISTS fsm_states (
+    -- bot_id:chat_id:user_id:thread_id:business_connection_id:destiny
+    key         TEXT PRIMARY KEY,
+    state       TEXT,
+    data        JSONB NOT NULL DEFAULT '{}'::jsonb,
+    updated_at  TIMESTAMPTZ DEFAULT now(),
+    expires_at  TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_fsm_states_expires_at ON fsm_states(expires_at);
+
+-- =========================
+-- NEAR-DUPLICATE INDEX (MinHash imzolar; bot/services/duplicates.py)
+-- =========================
+CREATE TABLE IF NOT EXISTS essay_signatures (
+    essay_id    TEXT PRIMARY KEY
+        REFERENCES essay_reviews(essay_id) ON DELETE CASCADE,
+    -- processlar xotiradagi indeksni shu bo‘yicha yangilaydi
+    seq         BIGSERIAL,
+    user_id     BIGINT NOT NULL,
+    -- 64 x uint64 (one-permutation MinHash)
+    minhash     BYTEA NOT NULL,
+    created_at  TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_essay_signatures_seq ON essay_signatures(seq);
+
+-- tekshiruvdan oldin topilgan eng o‘xshash avvalgi esse (boshqa userniki)
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS duplicate_of TEXT;
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS duplicate_score REAL;
+
+-- =========================
+-- PARSED SCORES (ai_result dan; yangi esselar INSERT da, eskilari backfill bilan)
+-- python -m bot.tools.backfill_scores
+-- =========================
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS stop_reason TEXT;
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS score_total NUMERIC(3,1);
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS score_75 SMALLINT;
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS score_publitsistik_uslub NUMERIC(2,1);
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS score_qarashlar NUMERIC(2,1);
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS score_dalillash NUMERIC(2,1);
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS score_tuzilma NUMERIC(2,1);
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS score_xatboshilar NUMERIC(2,1);
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS score_izchillik NUMERIC(2,1);
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS score_imlo NUMERIC(2,1);
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS score_punktuatsiya NUMERIC(2,1);
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS score_qoshimcha NUMERIC(2,1);
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS score_soz_qollash NUMERIC(2,1);
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS score_leksik_boylik NUMERIC(2,1);
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS score_nutq_sofligi NUMERIC(2,1);
+-- NULL — hali parse qilinmagan (ajratib bo‘lmagan hisobot ham belgilanadi)
+ALTER TABLE essay_reviews ADD COLUMN IF NOT EXISTS scores_parsed_at TIMESTAMPTZ;
+
+-- userning natijalari dinamikasi
+CREATE INDEX IF NOT EXISTS idx_essay_reviews_user_scores
+    ON essay_reviews(user_id, created_at) INCLUDE (score_total, score_75);
+-- ballar taqsimoti
+CREATE INDEX IF NOT EXISTS idx_essay_reviews_score_75
+    ON essay_reviews(score_75) WHERE score_75 IS NOT NULL;
+-- backfill navbati
+CREATE INDEX IF NOT EXISTS idx_essay_reviews_unparsed
+    ON essay_reviews(essay_id) WHERE scores_parsed_at IS NULL;
+
+-- =========================
+-- GRADING CALLS (har bir OpenAI chaqiruvi: bosqich, vaqt, tokenlar)
+-- =========================
+CREATE TABLE IF NOT EXISTS grading_calls (
+    call_id         BIGSERIAL PRIMARY KEY,
+    essay_id        TEXT NOT NULL,
+    -- triage / rubric
+    stage           TEXT NOT NULL,
+    model           TEXT NOT NULL,
+    -- triage: stop / pass
+    outcome         TEXT,
+    queue_wait_ms   INTEGER NOT NULL DEFAULT 0,
+    latency_ms      INTEGER NOT NULL DEFAULT 0,
+    input_tokens    INTEGER NOT NULL DEFAULT 0,
+    output_tokens   INTEGER NOT NULL DEFAULT 0,
+    created_at      TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_grading_calls_created_at ON grading_calls(created_at);
+CREATE INDEX IF NOT EXISTS idx_grading_calls_essay_id ON grading_calls(essay_id);
+
+-- prompt-prefix cache va narx hisobi
+ALTER TABLE grading_calls ADD COLUMN IF NOT EXISTS cached_tokens INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE grading_calls ADD COLUMN IF NOT EXISTS reasoning_tokens INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE grading_calls ADD COLUMN IF NOT EXISTS cost_usd NUMERIC(12,6);
+
+-- 429 / 5xx / timeout dan keyingi qayta urinishlar
+ALTER TABLE grading_calls ADD COLUMN IF NOT EXISTS retries INTEGER NOT NULL DEFAULT 0;
+
+-- =========================
+-- BOT SETTINGS (admin buyruqlari: /grading_mode va h.k.)
+-- =========================
+CREATE TABLE IF NOT EXISTS bot_settings (
+    key         TEXT PRIMARY KEY,
+    value       TEXT NOT NULL,
+    updated_at  TIMESTAMPTZ DEFAULT now()
+);
+
+-- =========================
+-- BATCH GRADING (OpenAI Batch API)
+-- =========================
+CREATE TABLE IF NOT EXISTS grading_batches (
+    batch_id        TEXT PRIMARY KEY,
+    input_file_id   TEXT,
+    output_file_id  TEXT,
+    error_file_id   TEXT,
+    -- validating / in_progress / finalizing / completed / failed / expired / cancelled
+    status          TEXT NOT NULL,
+    essay_count     INTEGER NOT NULL DEFAULT 0,
+    completed_count INTEGER NOT NULL DEFAULT 0,
+    failed_count    INTEGER NOT NULL DEFAULT 0,
+    created_at      TIMESTAMPTZ DEFAULT now(),
+    updated_at      TIMESTAMPTZ DEFAULT now(),
+    finished_at     TIMESTAMPTZ
+);
+
+-- realtime / batch (realtime workerlar faqat 'realtime' job'larni oladi)
+ALTER TABLE essay_jobs ADD COLUMN IF NOT EXISTS grading_mode TEXT NOT NULL DEFAULT 'realtime';
+ALTER TABLE essay_jobs ADD COLUMN IF NOT EXISTS batch_id TEXT;
+-- batch natijasi: worker OpenAI'siz yetkazadi
+ALTER TABLE essay_jobs ADD COLUMN IF NOT EXISTS ai_result TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_essay_jobs_batch_pending
+    ON essay_jobs(job_id) WHERE status = 'queued' AND grading_mode = 'batch' AND batch_id IS NULL;
+CREATE INDEX IF NOT EXISTS idx_essay_jobs_batch_id
+    ON essay_jobs(batch_id) WHERE batch_id IS NOT NULL;
+
+-- =========================
+-- /nocache <user_id> (bir martalik; barcha processlar / replicalar ko‘radi)
+-- =========================
+CREATE TABLE IF NOT EXISTS grading_cache_bypass (
+    user_id    BIGINT PRIMARY KEY,
+    created_at TIMESTAMPTZ DEFAULT now()
+);